@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the text normalization of the added lines: the former chain of re.sub and maybe_normalize calls,
+against the compiled passes of normalize.py. It also reports the paragraphs normalized differently.
+The former chain uses a frozen copy of maybe_normalize as it was before the compiled passes (a loop over the rules,
+then the roman numerals replaced one by one), so that the comparison doesn't change with utils.maybe_normalize.
+
+    $ python3 benchmarks/bench_normalize.py --lang fr --repeat 20
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+
+from utils import mapping_normalization
+from normalize import get_normalizer
+from wikitext import wikitext_to_plain
+from mock_api import SyntheticWiki
+from bench_roman import former_convert_roman_numbers
+
+#the former mapping_specific of cleaning.py
+mapping_specific = [
+  [ u'(', u''],
+  [ u')', u''],
+  [ re.compile(r'\. $'), u'.' ],
+  [ re.compile(r' \.'), u'.' ],
+  [ u' ,  ', u', ' ],
+  [ u' , ', u', ' ],
+  [ u'  ', u' ' ],
+]
+
+
+def former_maybe_normalize(value, mapping=mapping_normalization):
+    """utils.maybe_normalize before the compiled passes (without printing the invalid roman numerals)"""
+    for norm in mapping:
+        if isinstance(norm[0], str):
+            value = value.replace(norm[0], norm[1])
+        else:
+            value = norm[0].sub(norm[1], value)
+    return former_convert_roman_numbers(value)
+
+
+def former_chain(text):
+    text = text.replace("\xa0", " ")
+    text = re.sub(r' \([^)]+\)', '', text)
+    text = re.sub(r'\([^)]+\)', '', text)
+    text = former_maybe_normalize(text)
+    text = former_maybe_normalize(text, mapping=mapping_specific)
+    text = re.sub(r'(\d)\s+(\d)', r'\1\2', text)
+    text = re.sub(r'\[[0-9]+\]', '', text)
+    return text
+
+
+def paragraphs(lang):
+    """Plain text paragraphs: the golden set of wikitext.py, and the lines of a synthetic wiki"""
+    golden_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wikitext_golden.json")
+    with open(golden_path, "r", encoding="utf-8") as f:
+        texts = [sample["plain"] for sample in json.load(f)]
+    wiki = SyntheticWiki(lang=lang, users=2, contributions=50)
+    for history in wiki.pages.values():
+        texts += [wikitext_to_plain(line) for line in wiki.wikitext(history[-1]).splitlines() if line.strip()]
+    return [text for text in texts if text]
+
+
+def measure(function, texts, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        results = [function(text) for text in texts]
+    return time.time() - start, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the text normalization")
+    parser.add_argument('--lang', type=str, default="fr", help="Language of the rule table (former chain: always French)")
+    parser.add_argument('--repeat', type=int, default=20, help='Number of times each paragraph is normalized')
+    args = parser.parse_args()
+    texts = paragraphs(args.lang)
+    normalizer = get_normalizer(args.lang)
+    former_time, former_results = measure(former_chain, texts, args.repeat)
+    compiled_time, compiled_results = measure(normalizer, texts, args.repeat)
+    different = [(text, first, second) for text, first, second in zip(texts, former_results, compiled_results) if first != second]
+    for text, first, second in different[:10]:
+        print("DIFF", repr(text), "\n  former  ", repr(first), "\n  compiled", repr(second))
+    print("{count} paragraphs x {repeat}: former chain {former:.3f}s, compiled passes {compiled:.3f}s ({speedup:.1f}x), {different} different outputs".format(
+        count=len(texts), repeat=args.repeat, former=former_time, compiled=compiled_time,
+        speedup=former_time / compiled_time, different=len(different)))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the roman numeral conversion (utils.convert_roman_numbers): the former character walk of
+utils.getRomanNumbers followed by a str.replace per numeral, against the single regex scan. The golden set is the
+paragraphs of the benchmark fixtures (see make_fixtures.py), plus paragraphs with many numerals; the outputs
+should be identical (without a language, so that the English "I" is converted like before). The long texts are
+the paragraphs joined together, on which the former conversion is quadratic.
+
+    $ python3 benchmarks/bench_roman.py --repeat 3
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "python"))
+
+import roman
+from utils import getRomanNumbers, convert_roman_numbers
+
+CONTEXTS = ["Louis {0}, roi de France.", "Au {0}e siècle,", "le chapitre {0} ; ", "(tome {0})", "Henri {0} et",
+            "la {0}e République.", "Pie {0}. ", "World War {0}. ", "the {0}th century, "]
+NUMERALS = ["I", "II", "III", "IV", "V", "VI", "IX", "X", "XI", "XIV", "XIX", "XX", "XXI", "IIII", "VX", "IIV"]
+
+
+def former_convert_roman_numbers(value):
+    """utils.convert_roman_numbers before the single scan (without printing the invalid numerals)"""
+    for ro_before, ro_after, ro in getRomanNumbers(value):
+        try:
+            value = value.replace(ro_before + ro + ro_after, ro_before + str(roman.fromRoman(ro)) + ro_after)
+        except roman.InvalidRomanNumeralError:
+            pass
+    return value
+
+
+def golden_set(count=500, seed=1):
+    texts = []
+    for lang in ["fr", "en", "cy"]:
+        with open(os.path.join(BENCHMARKS_DIR, "fixtures", lang + ".json"), "r", encoding="utf-8") as f:
+            texts += json.load(f)["paragraphs"]
+    rng = random.Random(seed)
+    for _ in range(count):
+        texts.append(" ".join(rng.choice(CONTEXTS).format(rng.choice(NUMERALS)) for _ in range(rng.randint(1, 8))))
+    return texts
+
+
+def measure(function, texts, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        results = [function(text) for text in texts]
+    return time.time() - start, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the roman numeral conversion")
+    parser.add_argument('--repeat', type=int, default=3, help='Number of times each text is converted')
+    parser.add_argument('--long', type=int, default=200, help='Number of paragraphs joined in each long text')
+    args = parser.parse_args()
+    texts = golden_set()
+    long_texts = [" ".join(texts[i:i + args.long]) for i in range(0, len(texts), args.long)]
+    for name, corpus in [("paragraphs", texts), ("long texts", long_texts)]:
+        former_time, former_results = measure(former_convert_roman_numbers, corpus, args.repeat)
+        scan_time, scan_results = measure(convert_roman_numbers, corpus, args.repeat)
+        different = [(text, first, second) for text, first, second in zip(corpus, former_results, scan_results) if first != second]
+        for text, first, second in different[:5]:
+            print("DIFF", repr(text[:200]), "\n  former", repr(first[:200]), "\n  scan  ", repr(second[:200]))
+        print("{count} {name} x {repeat}: former conversion {former:.3f}s, single scan {scan:.3f}s ({speedup:.1f}x), {different} different outputs".format(
+            count=len(corpus), name=name, repeat=args.repeat, former=former_time, scan=scan_time,
+            speedup=former_time / scan_time, different=len(different)))
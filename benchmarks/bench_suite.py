@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the text-processing hot paths, on the fixture corpora of benchmarks/fixtures (see make_fixtures.py).
+
+Each path is timed separately, for each language, and its throughput (paragraphs/s, lines/s or sentences/s) and its
+peak memory (Python allocations, measured by tracemalloc in a separate run) are reported:
+    * clean_article_html: the paragraph cleaning of the article revisions (get_article_texts),
+    * added_lines: the conversion of the lines added by a revision, from the diff html (get_added_content),
+    * maybe_normalize, filter_numbers and is_garbage: on the plain text paragraphs,
+    * filter_numbers_dense: filter_numbers on number-dense paragraphs (see bench_verbalize.py),
+    * extract_sentences: the sentence segmentation, with the "wikipedia" filter profile (only if spaCy is installed),
+    * extract_sentences_theatre: the same with the "theatre" profile, which computes the most common nouns and
+      collocations of the text first (only if spaCy, nltk and its tokenizer data are installed),
+    * validate: Validate.main on the sentences of the paragraphs.
+
+With --check, the results are compared to the baseline (benchmarks/baseline.json), and the suite fails if a path is
+more than --threshold slower, or uses more than --threshold more memory, or if a path which ran has no baseline (e.g.
+a path skipped when the baseline was recorded: record it with --update-baseline). The baseline throughputs are scaled by the
+speed of the machine, measured by a fixed calibration workload run between the timed runs of each path, so that the
+baseline can be recorded on another machine, and that a busy machine doesn't fail the checks (the scaling is
+approximate: prefer a baseline recorded on the machine running the checks).
+
+    $ python3 benchmarks/bench_suite.py                      #prints the results
+    $ python3 benchmarks/bench_suite.py --check              #fails on a regression (see "make bench")
+    $ python3 benchmarks/bench_suite.py --update-baseline    #records the current results as the baseline
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "python"))
+
+from langident import get_language_filter
+from cleaning import clean_article_html, clean_added_lines, added_lines_from_diff, is_garbage
+from utils import maybe_normalize, filter_numbers, extract_sentences
+import Validate
+from bench_verbalize import number_paragraphs
+
+LANGUAGES = ["fr", "en", "cy"]
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, "baseline.json")
+#peak memory increases below this size (in bytes) are never regressions
+MEMORY_SLACK = 1024 * 1024
+
+
+class Skipped(Exception):
+    """Raised when a path can't be benchmarked here, e.g. because of a missing dependency"""
+
+
+def load_fixture(lang):
+    with open(os.path.join(BENCHMARKS_DIR, "fixtures", lang + ".json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def sentences_of(paragraphs):
+    return [sentence.strip() for paragraph in paragraphs for sentence in paragraph.split(". ") if sentence.strip()]
+
+
+def clear_language_cache(lang):
+    """Empties the cache of the language identification, so that every run identifies the paragraphs again"""
+    get_language_filter(lang)._cache.clear()
+
+
+#Each benchmark takes the fixture and the language, and returns a function running the workload once, and the
+#number of units (e.g. paragraphs) it processes.
+
+def bench_clean_article_html(data, lang):
+    count = sum(article.count("<p>") for article in data["articles"])
+    def run():
+        clear_language_cache(lang)
+        for article in data["articles"]:
+            clean_article_html(article, lang)
+    return run, count, "paragraphs"
+
+
+def bench_added_lines(data, lang):
+    count = sum(len(added_lines_from_diff(diff) or []) for diff in data["diffs"])
+    def run():
+        clear_language_cache(lang)
+        for diff in data["diffs"]:
+            lines = added_lines_from_diff(diff)
+            if lines is not None:
+                clean_added_lines(lines, lang)
+    return run, count, "lines"
+
+
+def bench_maybe_normalize(data, lang):
+    def run():
+        for paragraph in data["paragraphs"]:
+            maybe_normalize(paragraph)
+    return run, len(data["paragraphs"]), "paragraphs"
+
+
+def bench_filter_numbers(data, lang):
+    def run():
+        for paragraph in data["paragraphs"]:
+            try:
+                filter_numbers(paragraph, lang=lang)
+            except Exception:
+                pass #like clean_added_line
+    return run, len(data["paragraphs"]), "paragraphs"
+
+
+def bench_filter_numbers_dense(data, lang):
+    paragraphs = number_paragraphs(lang)
+    def run():
+        for paragraph in paragraphs:
+            try:
+                filter_numbers(paragraph, lang=lang)
+            except Exception:
+                pass
+    return run, len(paragraphs), "paragraphs"
+
+
+def bench_is_garbage(data, lang):
+    def run():
+        for paragraph in data["paragraphs"]:
+            is_garbage(paragraph, lang)
+    return run, len(data["paragraphs"]), "paragraphs"
+
+
+def segmentation(data, lang, profile):
+    try:
+        import spacy
+        if profile == "theatre":
+            import nltk
+            nltk.word_tokenize("Le tokenizer est-il installé ?") #needs the "punkt" (or "punkt_tab") data
+    except ImportError as e:
+        raise Skipped(str(e))
+    except LookupError:
+        raise Skipped("the tokenizer data of nltk is missing, see nltk.download")
+    #a blank model with the rule-based sentencizer: the statistical models aren't part of the fixtures
+    try:
+        nlp = spacy.blank(lang)
+    except ImportError: #e.g. Welsh, which spaCy doesn't support: its multi-language tokenizer is used instead
+        nlp = spacy.blank("xx")
+    try:
+        nlp.add_pipe("sentencizer") #spaCy >= 3
+    except ValueError:
+        nlp.add_pipe(nlp.create_pipe("sentencizer"))
+    count = len(list(extract_sentences(data["paragraphs"], 3, 15, nlp, profile=profile)))
+    def run():
+        list(extract_sentences(data["paragraphs"], 3, 15, nlp, profile=profile))
+    return run, count, "sentences"
+
+
+def bench_extract_sentences(data, lang):
+    return segmentation(data, lang, "wikipedia")
+
+
+def bench_extract_sentences_theatre(data, lang):
+    return segmentation(data, lang, "theatre")
+
+
+def bench_validate(data, lang):
+    directory = tempfile.mkdtemp()
+    in_path = os.path.join(directory, "sentences.txt")
+    sentences = sentences_of(data["paragraphs"])
+    with open(in_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(sentences) + "\n")
+    def run():
+        Validate.main(in_path, os.path.join(directory, "accepted.txt"), os.path.join(directory, "rejected.txt"))
+    return run, len(sentences), "sentences"
+
+
+BENCHMARKS = [("clean_article_html", bench_clean_article_html),
+              ("added_lines", bench_added_lines),
+              ("maybe_normalize", bench_maybe_normalize),
+              ("filter_numbers", bench_filter_numbers),
+              ("filter_numbers_dense", bench_filter_numbers_dense),
+              ("is_garbage", bench_is_garbage),
+              ("extract_sentences", bench_extract_sentences),
+              ("extract_sentences_theatre", bench_extract_sentences_theatre),
+              ("validate", bench_validate)]
+
+
+def calibration():
+    """Returns the time of a fixed pure Python workload, measuring the current speed of the machine"""
+    start = time.perf_counter()
+    counts = {}
+    for i in range(100000):
+        word = "w" + str(i % 1000)
+        counts[word] = counts.get(word, 0) + len(word.upper())
+    return time.perf_counter() - start
+
+
+def measure(run, repeat):
+    """
+    Returns the best time of "repeat" runs (after a warm-up run, which loads the models), the best time of the
+    calibration workload, run between them (so that both are measured under the same load of the machine), and the
+    peak memory of a run
+    """
+    run()
+    times, calibration_times = [], []
+    for _ in range(repeat):
+        calibration_times.append(calibration())
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    calibration_times.append(calibration())
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), min(calibration_times), peak
+
+
+def run_suite(languages, names, repeat):
+    results = {}
+    for lang in languages:
+        data = load_fixture(lang)
+        for name, benchmark in BENCHMARKS:
+            if names and name not in names:
+                continue
+            key = lang + "/" + name
+            try:
+                run, count, unit = benchmark(data, lang)
+            except Skipped as e:
+                print("{key:<28} skipped ({reason})".format(key=key, reason=e))
+                continue
+            seconds, calibration_time, peak = measure(run, repeat)
+            results[key] = {"throughput": count / seconds, "unit": unit + "/s", "peak_memory": peak,
+                            "calibration": calibration_time}
+            print("{key:<28} {throughput:>12.1f} {unit:<14} peak {memory:>8.0f} kB".format(
+                key=key, throughput=count / seconds, unit=unit + "/s", memory=peak / 1024))
+    return results
+
+
+def check(results, baseline, threshold):
+    """Returns the list of the regressions, comparing the results to the baseline, scaled by the speed of the machine"""
+    regressions = []
+    for key, result in sorted(results.items()):
+        if key not in baseline["results"]:
+            regressions.append("{key}: no baseline (record it with --update-baseline)".format(key=key))
+            continue
+        expected = baseline["results"][key]
+        expected_throughput = expected["throughput"] * expected["calibration"] / result["calibration"]
+        if result["throughput"] < expected_throughput * (1 - threshold):
+            regressions.append("{key}: {throughput:.1f} {unit} (baseline {expected:.1f}, {change:+.0%})".format(
+                key=key, throughput=result["throughput"], unit=result["unit"], expected=expected_throughput,
+                change=result["throughput"] / expected_throughput - 1))
+        if result["peak_memory"] > expected["peak_memory"] * (1 + threshold) + MEMORY_SLACK:
+            regressions.append("{key}: peak memory {memory:.0f} kB (baseline {expected:.0f} kB)".format(
+                key=key, memory=result["peak_memory"] / 1024, expected=expected["peak_memory"] / 1024))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the text-processing hot paths")
+    parser.add_argument('--lang', type=lambda value: value.split(","), default=LANGUAGES, help="Comma-separated list of the languages, e.g. 'fr,cy'")
+    parser.add_argument('--path', type=lambda value: value.split(","), default=None, help="Comma-separated list of the paths to benchmark (all by default): " + ", ".join(name for name, _ in BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs of each path (the best one is kept)')
+    parser.add_argument('--baseline', type=str, default=BASELINE_PATH, help='Baseline JSON file')
+    parser.add_argument('--check', action='store_true', help='Fail if a path regressed compared to the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Tolerated regression, e.g. 0.25 for 25%% slower or 25%% more memory')
+    parser.add_argument('--update-baseline', action='store_true', help='Record the results as the baseline')
+    args = parser.parse_args()
+    results = run_suite(args.lang, args.path, args.repeat)
+    if args.update_baseline:
+        baseline = {"results": {}}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline["results"].update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("Baseline written to", args.baseline)
+    if args.check:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = check(results, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+        print("No regression (threshold {threshold:.0%})".format(threshold=args.threshold))
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the number verbalization (utils.filter_numbers): the former conversion of each fragment of
+utils.getNumbers, against the cached single scan of verbalize.py, on number-dense paragraphs (dates, counts,
+measures, ordinals). It also reports the paragraphs converted differently, which should be none except in Welsh
+(whose thousands separators, ordinals and unsupported numbers are handled by verbalize.py).
+
+    $ python3 benchmarks/bench_verbalize.py --lang fr --repeat 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+
+from num2words import num2words
+from utils import getNumbers, filter_numbers
+from verbalize import ORDINAL_REGEX, number_to_words
+
+#the words around the numbers: they don't matter much, the paragraphs are mostly numbers
+WORDS = {"fr": "en la ville compte habitants le siècle de pour mètres et kilomètres depuis où".split(),
+         "en": "in the town has inhabitants century of for metres and kilometres since where".split(),
+         "cy": "yn y dref mae trigolion ganrif o ar gyfer metr a cilometr ers lle".split()}
+#the suffixes of the ordinals and of the measures following the numbers
+SUFFIXES = {"fr": ["e", "er", "ère", "ème", "km", "m", "", "", ""],
+            "en": ["th", "st", "nd", "km", "m", "", "", ""],
+            "cy": ["af", "il", "ydd", "ed", "fed", "km", "", "", ""]}
+
+
+def former_filter_numbers(inp, lang="fr"):
+    """utils.filter_numbers before verbalize.py"""
+    finalinp = ''
+    for e in getNumbers(inp):
+        if not e:
+            continue
+        newinp = e
+        try:
+            ee = ''.join(e.split())
+            if int(e) > 0:
+                newinp = num2words(int(ee), lang=lang)
+        except ValueError:
+            try:
+                ee = ''.join(e.replace(',', '.').split())
+                if float(ee):
+                    newinp = num2words(float(ee), lang=lang)
+            except ValueError:
+                matches = ORDINAL_REGEX.match(e)
+                if matches:
+                    newinp = num2words(int(matches.group(1)), ordinal=True, lang=lang)
+        finalinp += newinp
+    return finalinp
+
+
+def number(rng, lang):
+    kind = rng.random()
+    if kind < 0.4:
+        return str(rng.randint(1500, 2020)) #years, repeated a lot
+    if kind < 0.6:
+        return str(rng.randint(1, 30)) + rng.choice(SUFFIXES[lang])
+    if kind < 0.75:
+        return "{0},{1}".format(rng.randint(0, 99), rng.randint(0, 999))
+    if kind < 0.85:
+        return "{0} {1:03d}".format(rng.randint(1, 99), rng.randint(0, 999))
+    return str(rng.randint(0, 100000))
+
+
+def number_paragraphs(lang, count=300, seed=1):
+    """Paragraphs where about one word in two is a number"""
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(count):
+        tokens = [number(rng, lang) if rng.random() < 0.5 else rng.choice(WORDS[lang]) for _ in range(rng.randint(10, 40))]
+        paragraphs.append(" ".join(tokens) + ".")
+    return paragraphs
+
+
+def safe(function, text, lang):
+    """The callers of filter_numbers (see cleaning.clean_added_line) keep the text as is if it fails"""
+    try:
+        return function(text, lang=lang)
+    except Exception:
+        return text
+
+
+def measure(function, texts, lang, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        results = [safe(function, text, lang) for text in texts]
+    return time.time() - start, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the number verbalization")
+    parser.add_argument('--lang', type=str, default="fr", help="Language of the paragraphs")
+    parser.add_argument('--repeat', type=int, default=5, help='Number of times each paragraph is converted')
+    args = parser.parse_args()
+    texts = number_paragraphs(args.lang)
+    former_time, former_results = measure(former_filter_numbers, texts, args.lang, args.repeat)
+    number_to_words.cache_clear()
+    verbalizer_time, verbalizer_results = measure(filter_numbers, texts, args.lang, args.repeat)
+    different = [(text, first, second) for text, first, second in zip(texts, former_results, verbalizer_results) if first != second]
+    for text, first, second in different[:5]:
+        print("DIFF", repr(text), "\n  former    ", repr(first), "\n  verbalizer", repr(second))
+    print("{count} paragraphs x {repeat}: former conversion {former:.3f}s, verbalizer {verbalizer:.3f}s ({speedup:.1f}x), {different} different outputs, cache {cache}".format(
+        count=len(texts), repeat=args.repeat, former=former_time, verbalizer=verbalizer_time,
+        speedup=former_time / verbalizer_time, different=len(different), cache=number_to_words.cache_info()))
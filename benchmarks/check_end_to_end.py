@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end checks of the extractor: each scenario runs Wikipedia_CC0.py from start to finish against the Mediawiki
+API stand-in (see mock_api.py), or against the same synthetic wiki written as a dump (--dump), and fails if no
+sentence is written, or if most of the paragraphs are rejected.
+
+The sentence segmentation needs spaCy and its French model (fr_core_news_md): without them, the checks are skipped.
+
+    $ python3 benchmarks/check_end_to_end.py
+    $ python3 benchmarks/check_end_to_end.py --scenario batch
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PYTHON_DIR = os.path.join(BENCHMARKS_DIR, "..", "python")
+sys.path.insert(0, PYTHON_DIR)
+
+from mock_api import SyntheticWiki, serve
+
+#the options of each scenario ("{dump}" is the path of the synthetic dump). Two users are processed concurrently,
+#which skips the 30 seconds rest between users
+SCENARIOS = [("parse", ["--type", "creation", "--fetch", "parse"]),
+             ("batch", ["--type", "creation", "--fetch", "batch"]),
+             ("dump", ["--type", "creation", "--dump", "{dump}"]),
+             ("pipeline", ["--type", "creation", "--pipeline", "--clean-workers", "2"]),
+             ("all_content", ["--type", "all_content"]),
+             ("pipeline_all_content", ["--type", "all_content", "--pipeline", "--clean-workers", "2"])]
+#the share of the paragraphs which may be rejected: the synthetic paragraphs are all relevant, but some are too short,
+#or not identified as French, and in all_content mode, the blank lines added between the paragraphs are rejected too
+MAX_REJECTED = 0.75
+
+
+def missing_dependency():
+    """Returns the name of the missing module needed by the sentence segmentation, if any"""
+    for module in ["spacy", "fr_core_news_md"]:
+        if importlib.util.find_spec(module) is None:
+            return module
+    return None
+
+
+def count_sentences(directory):
+    """Returns the number of sentences of the output files (the dot files are the checkpoints and the files being written)"""
+    count = 0
+    for name in os.listdir(directory):
+        if name.endswith(".txt") and not name.startswith("."):
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                count += sum(1 for line in f if line.strip())
+    return count
+
+
+def counter_total(summary, name):
+    return sum(entry["value"] for entry in summary["counters"].get(name, []))
+
+
+def run_extractor(options, output, api_url=None):
+    """Runs Wikipedia_CC0.py, and returns its exit status, its output and its metrics (see metrics.py)"""
+    metrics_path = os.path.join(output, "metrics.json")
+    command = [sys.executable, os.path.join(PYTHON_DIR, "Wikipedia_CC0.py"), "--concurrent-users", "2", "--metrics", metrics_path]
+    if api_url is not None:
+        command += ["--api-url", api_url]
+    process = subprocess.run(command + options + ["fr", output], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                             universal_newlines=True)
+    summary = {"counters": {}}
+    if os.path.isfile(metrics_path):
+        with open(metrics_path, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+    return process.returncode, process.stdout, summary
+
+
+def check_scenario(name, options, api_url, dump):
+    """Returns the list of the failures of a scenario"""
+    output = tempfile.mkdtemp(prefix="wikicc0-" + name + "-")
+    options = [option.format(dump=dump) for option in options]
+    status, log, summary = run_extractor(options, output, api_url=api_url)
+    sentences = count_sentences(output)
+    paragraphs = counter_total(summary, "paragraphs_total")
+    rejected = counter_total(summary, "paragraphs_rejected_total")
+    failures = []
+    if status != 0:
+        failures.append("exit status {0}:\n{1}".format(status, log[-2000:]))
+    if sentences == 0:
+        failures.append("no sentence written")
+    if paragraphs == 0 or rejected > paragraphs * MAX_REJECTED:
+        failures.append("{0} of {1} paragraphs rejected".format(rejected, paragraphs))
+    print("{status:<4} {name}: {sentences} sentences, {rejected} of {paragraphs} paragraphs rejected".format(
+        status="FAIL" if failures else "OK", name=name, sentences=sentences, rejected=rejected, paragraphs=paragraphs))
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the extractor from start to finish against the Mediawiki API stand-in")
+    parser.add_argument('--scenario', type=lambda value: value.split(","), default=None, help="Comma-separated list of the scenarios (all by default): " + ", ".join(name for name, _ in SCENARIOS))
+    parser.add_argument('--port', type=int, default=8089, help='Port of the Mediawiki API stand-in')
+    args = parser.parse_args()
+    missing = missing_dependency()
+    if missing is not None:
+        print("SKIP the sentence segmentation needs", missing)
+        sys.exit(0)
+    wiki = SyntheticWiki(lang="fr", users=2, contributions=40)
+    dump = os.path.join(tempfile.mkdtemp(prefix="wikicc0-dump-"), "synthetic-pages-meta-history.xml")
+    wiki.write_dump(dump)
+    server = serve(wiki, port=args.port)
+    api_url = "http://localhost:{0}/w/api.php".format(args.port)
+    failures = []
+    try:
+        for name, options in SCENARIOS:
+            if args.scenario and name not in args.scenario:
+                continue
+            failures += ["{0}: {1}".format(name, failure) for failure in check_scenario(name, options, api_url, dump)]
+    finally:
+        server.shutdown()
+    for failure in failures:
+        print("FAIL", failure)
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Startup time budget: checks that the modules import, and that the scripts start ("--help"), within their budget,
+i.e. that no heavy dependency (nltk, language_check, spaCy, langid's model, etc.) is loaded at import time
+(see python/lazy.py). Exits with an error if a budget is exceeded.
+
+    $ python3 benchmarks/check_import_time.py
+
+The import times are measured with "python -X importtime" (Python >= 3.7), which also lists the slowest imports.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+PYTHON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python")
+
+#budgets in seconds
+MODULE_BUDGETS = {"utils": 0.1,
+                  "cleaning": 0.2,
+                  "langident": 0.1,
+                  "normalize": 0.1,
+                  "wikitext": 0.1}
+SCRIPT_BUDGETS = {"Validate.py": 0.3,
+                  "Wikipedia_CC0.py": 0.5}
+
+
+def import_time(module):
+    """Returns the cumulative import time of a module in seconds, and the slowest imports it triggers"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module], cwd=PYTHON_DIR,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((int(cumulative) / 1000000, name.strip()))
+    total = [seconds for seconds, name in timings if name == module][-1]
+    slowest = sorted((timing for timing in timings if timing[1] != module), reverse=True)[:5]
+    return total, slowest
+
+
+def startup_time(script, repeat=3):
+    """Returns the best wall-clock time of "python script --help", in seconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        subprocess.run([sys.executable, script, "--help"], cwd=PYTHON_DIR, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.time() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks the import and startup time budgets")
+    parser.add_argument('--factor', type=float, default=1.0, help='Multiplies all the budgets, e.g. 2 on a slow machine')
+    args = parser.parse_args()
+    failures = []
+    for module, budget in sorted(MODULE_BUDGETS.items()):
+        seconds, slowest = import_time(module)
+        ok = seconds <= budget * args.factor
+        print("{status} import {module}: {seconds:.3f}s (budget {budget:.2f}s)".format(
+            status="OK  " if ok else "FAIL", module=module, seconds=seconds, budget=budget * args.factor))
+        if not ok:
+            failures.append(module)
+            for slow_seconds, name in slowest:
+                print("       {seconds:.3f}s {name}".format(seconds=slow_seconds, name=name))
+    for script, budget in sorted(SCRIPT_BUDGETS.items()):
+        seconds = startup_time(script)
+        ok = seconds <= budget * args.factor
+        print("{status} {script} --help: {seconds:.3f}s (budget {budget:.2f}s)".format(
+            status="OK  " if ok else "FAIL", script=script, seconds=seconds, budget=budget * args.factor))
+        if not ok:
+            failures.append(script)
+    if failures:
+        sys.exit(1)
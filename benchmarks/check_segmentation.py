@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Regression checks of the sentence segmentation (see utils.extract_sentences and utils.extract_sentences_stream):
+each case segments a few paragraphs, and fails if the sentences aren't the expected ones.
+
+The checks use the French model (fr_core_news_md) if it's installed, and a blank French pipeline otherwise: the
+custom sentence boundaries are the same. Without spaCy, the checks are skipped.
+
+    $ python3 benchmarks/check_segmentation.py
+"""
+
+import importlib.util
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+
+from utils import extract_sentences, extract_sentences_stream, set_custom_boundaries
+
+#(name, paragraphs, expected sentences), with 3 to 15 words per sentence
+CASES = [("list without verb", ["Paris Londres Berlin Rome Madrid"], ["Paris Londres Berlin Rome Madrid"]),
+         ("list among sentences", ["Le chat dort sur le tapis du salon.", "Paris Londres Berlin Rome Madrid",
+                                   "Il fait beau aujourd'hui dans la ville."],
+          ["Le chat dort sur le tapis du salon.", "Paris Londres Berlin Rome Madrid",
+           "Il fait beau aujourd'hui dans la ville."]),
+         ("two sentences", ["Le chat dort sur le tapis du salon. Il fait beau aujourd'hui dans la ville."],
+          ["Le chat dort sur le tapis du salon.", "Il fait beau aujourd'hui dans la ville."])]
+
+
+def load_nlp():
+    """Returns the French pipeline with the custom sentence boundaries, as Wikipedia_CC0.load_nlp does"""
+    import spacy
+    if importlib.util.find_spec("fr_core_news_md") is not None:
+        import fr_core_news_md
+        nlp = fr_core_news_md.load()
+    else:
+        nlp = spacy.blank("fr")
+    try:
+        nlp.add_pipe(set_custom_boundaries, before='parser' if 'parser' in nlp.pipe_names else None) #spaCy 2
+    except ValueError: #spaCy >= 3 only adds the components registered by name
+        from spacy.language import Language
+        if set_custom_boundaries.__name__ not in Language.factories:
+            Language.component(set_custom_boundaries.__name__, func=set_custom_boundaries)
+        nlp.add_pipe(set_custom_boundaries.__name__, before='parser' if 'parser' in nlp.pipe_names else None)
+    return nlp
+
+
+def check_case(nlp, name, paragraphs, expected):
+    """Returns the list of the failures of a case, with the streaming and the whole-text segmentations"""
+    failures = []
+    for function, segment in [("extract_sentences_stream", lambda: list(extract_sentences_stream(paragraphs, 3, 15, nlp, profile="wikipedia"))),
+                              ("extract_sentences", lambda: list(extract_sentences(paragraphs, 3, 15, nlp, profile="wikipedia")))]:
+        if function == "extract_sentences" and len(paragraphs) > 1:
+            continue #the paragraphs are joined into a single text, so the boundaries between them are lost
+        try:
+            sentences = segment()
+        except ValueError as e:
+            failures.append("{0}: {1}".format(function, e))
+            continue
+        if sentences != expected:
+            failures.append("{0}: {1} instead of {2}".format(function, sentences, expected))
+    print("{status:<4} {name}".format(status="FAIL" if failures else "OK", name=name))
+    return failures
+
+
+if __name__ == "__main__":
+    if importlib.util.find_spec("spacy") is None:
+        print("SKIP the sentence segmentation needs spacy")
+        sys.exit(0)
+    nlp = load_nlp()
+    failures = []
+    for name, paragraphs, expected in CASES:
+        failures += ["{0}: {1}".format(name, failure) for failure in check_case(nlp, name, paragraphs, expected)]
+    for failure in failures:
+        print("FAIL", failure)
+    if failures:
+        sys.exit(1)
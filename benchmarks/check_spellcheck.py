@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Checks the batching and the caching of spellcheck.SpellChecker against a stand-in of LanguageTool (no Java needed).
+
+    $ python3 benchmarks/check_spellcheck.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+
+from spellcheck import SpellChecker, StandInChecker
+
+CORRECTIONS = {"recu": "reçu", "chateau": "château", "ete": "été", "batiment": "bâtiment"}
+
+SENTENCES = ["Le chateau a ete construit au seizième siècle.",
+             "Il a recu le nom de son fondateur.",
+             "Le batiment principal est classé.",
+             "Cette phrase est correcte.",
+             "Le chateau a ete construit au seizième siècle."]
+
+EXPECTED = ["Le château a été construit au seizième siècle.",
+            "Il a reçu le nom de son fondateur.",
+            "Le bâtiment principal est classé.",
+            "Cette phrase est correcte.",
+            "Le château a été construit au seizième siècle."]
+
+
+if __name__ == "__main__":
+    stand_in = StandInChecker(CORRECTIONS)
+    checker = SpellChecker("fr", factory=lambda lang: stand_in)
+    failures = 0
+    corrected = list(checker.correct_stream(SENTENCES, batch_size=len(SENTENCES)))
+    if corrected != EXPECTED:
+        failures += 1
+        print("FAIL corrections:", corrected)
+    #a first round with corrections, a second one checking them
+    if stand_in.requests != 2:
+        failures += 1
+        print("FAIL", stand_in.requests, "requests for a batch instead of 2")
+    requests = stand_in.requests
+    if checker.correct_batch(SENTENCES) != EXPECTED or stand_in.requests != requests or checker.hits != len(SENTENCES):
+        failures += 1
+        print("FAIL the corrections weren't cached")
+    print("{status}: {count} sentences corrected with {requests} requests, {hits} cache hits".format(
+        status="FAIL" if failures else "OK", count=len(SENTENCES), requests=stand_in.requests, hits=checker.hits))
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Generates the fixture corpora of the benchmark suite (see bench_suite.py), one JSON file per language in
+benchmarks/fixtures/:
+    * "articles": the rendered html of article revisions, as returned by action=parse,
+    * "diffs": the html diff tables of revisions, as returned by action=compare,
+    * "paragraphs": plain text paragraphs.
+The articles and diffs come from the synthetic wiki of mock_api.py, and the French paragraphs also include the golden
+set of wikitext.py. The fixtures are committed, so that every run of the suite measures the same corpora: they only
+need to be generated again if the benchmarked paths change their input.
+
+    $ python3 benchmarks/make_fixtures.py
+"""
+
+import argparse
+import json
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "python"))
+
+from mock_api import SyntheticWiki
+from wikitext import wikitext_to_plain
+
+LANGUAGES = ["fr", "en", "cy"]
+
+
+def fixture(lang, pages):
+    wiki = SyntheticWiki(lang=lang, users=3, contributions=60, seed=1)
+    articles, diffs, paragraphs = [], [], []
+    for title in sorted(wiki.pages)[:pages]:
+        history = wiki.pages[title]
+        articles.append(wiki.html(history[0]))
+        for previous, revision in zip(history, history[1:]):
+            diffs.append(wiki.diff(previous, revision))
+        paragraphs += [wikitext_to_plain(line) for line in wiki.wikitext(history[-1]).split("\n\n") if line.strip()]
+    if lang == "fr":
+        with open(os.path.join(BENCHMARKS_DIR, "wikitext_golden.json"), "r", encoding="utf-8") as f:
+            paragraphs += [sample["plain"] for sample in json.load(f)]
+    return {"articles": articles, "diffs": [diff for diff in diffs if diff], "paragraphs": [text for text in paragraphs if text]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates the fixture corpora of the benchmark suite")
+    parser.add_argument('--pages', type=int, default=30, help='Number of pages per language')
+    args = parser.parse_args()
+    directory = os.path.join(BENCHMARKS_DIR, "fixtures")
+    if not os.path.isdir(directory):
+        os.mkdir(directory)
+    for lang in LANGUAGES:
+        data = fixture(lang, args.pages)
+        with open(os.path.join(directory, lang + ".json"), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=0)
+        print(lang, ", ".join("{count} {name}".format(count=len(items), name=name) for name, items in sorted(data.items())))
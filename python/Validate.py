@@ -1,100 +1,137 @@
 # -*- coding: utf-8 -*-
 import os
-import re
+import glob
+import time
 import argparse
-
-MIN_WORDS=1
-MAX_WORDS=15
-
-NUMBERS_REGEX=re.compile(r"[0-9]+")
-SYMBOL_REGEX=re.compile(r"[<>\+\*\\#@\^\[\]\(\)\/]")
-ABBREVIATION_REGEX=re.compile(r"[A-Z]{2,}|[A-Z]+\.*[A-Z]+")
-
-APOSTRAPHE=r"'\u2018\u2019\u02BC"
-SEPARATOR = r",.?!\";|`"
-
-valid_letters = 'aáàâäbcdeéèêëfghiíìîïjklmnoóòôöpqrstuúùûüvwẃẁŵẅyýỳŷÿz'
-ALPHABET_REGEX = re.compile(r"[" + valid_letters + valid_letters.upper() + "]")
-
-sentences_seen = set()
-
-def tokenize(string):
-    s = string
-    s = re.sub('\t', " ", s)
-    s = re.sub(r"[" + SEPARATOR + "]", " ", s)
-    s = re.sub(r"[" + APOSTRAPHE + "]", " ", s)
-    return s.strip().split()
-
-
-def filterNumbers(string):
-    return not NUMBERS_REGEX.findall(string)
-
-
-def filterSymbols(string):
-    return not SYMBOL_REGEX.findall(string)
-   
-
-def filterAbbreviations(string):
-    return not ABBREVIATION_REGEX.findall(string)
-
-
-def filterAlphabet(string):
-    return ALPHABET_REGEX.findall(string)
-
-
-
-def main(in_filepath, out_filepath, rejected_filepath):
+import itertools
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from validation import get_validator
+
+#the lines written in the rejects file for each reason
+REJECT_FORMATS = {"NUMBERS": "NUMBERS: %s ",
+                  "SYMBOLS": "SYMBOLS: %s ",
+                  "ABBREVIATION": "ABBREVIATION: %s ",
+                  "OUT OF ALPHABET": "OUT OF ALPHABET: %s",
+                  "TOO LONG": "TOO LONG: %s ",
+                  "LANGUAGE": "LANGUAGE: %s"}
+
+
+def validate_chunk(lines, lang=None, candidates=None):
+    """
+    Returns the list of the (sentence, reason) tuples of a chunk of lines, the reason being None for the accepted
+    sentences (see validation.py). The language of the sentences which passed the other rules is checked in a single batch.
+    """
+    return list(zip(lines, get_validator(lang, candidates).check_batch(lines)))
+
+
+def read_chunks(paths, chunk_size):
+    """Yields the lines of the files by chunks of at most "chunk_size" lines"""
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as infile:
+            while True:
+                chunk = list(itertools.islice(infile, chunk_size))
+                if not chunk:
+                    break
+                yield chunk
+
+
+def validated_chunks(chunks, lang=None, candidates=None, workers=1):
+    """Yields the results of validate_chunk for each chunk, in order, validating them in "workers" processes"""
+    if workers <= 1:
+        for chunk in chunks:
+            yield validate_chunk(chunk, lang, candidates)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        #only a bounded window of chunks is scheduled ahead, so that the files aren't loaded in memory at once
+        window = deque()
+        for chunk in chunks:
+            window.append(pool.submit(validate_chunk, chunk, lang, candidates))
+            if len(window) >= 2 * workers:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def input_paths(pattern):
+    """Returns the sorted list of the files to validate: a file, the .txt files of a directory, or the files matching a glob"""
+    if os.path.isdir(pattern):
+        return sorted(glob.glob(os.path.join(pattern, "*.txt")))
+    if os.path.isfile(pattern):
+        return [pattern]
+    return sorted(glob.glob(pattern))
+
+
+def validate_files(in_filepaths, out_filepath, rejected_filepath, lang=None, candidates=None, workers=1, chunk_size=10000, dedup=None):
+    """
+    Validates the files in order, and writes the accepted and rejected sentences of all of them in the same two files.
+    Returns a Counter of the rejection reasons, also counting the "ACCEPTED" sentences and the "DUPLICATE" ones.
+    The optional "dedup" parameter is a dedup.DedupIndex: the sentences already in the index (e.g. validated by a
+    previous run) are rejected, and the accepted ones are added to it. Without it, the duplicates are found by keeping
+    the accepted sentences of the files in memory.
+    """
     outfile = open(out_filepath, 'w', encoding='utf-8')
     rejectfile = open(rejected_filepath, 'w', encoding='utf-8')
-
-    with open(in_filepath, 'r', encoding='utf-8') as infile:
-        for sentence in infile:
-            if sentence in sentences_seen:
-                continue
- 
-            if not filterNumbers(sentence):
-                rejectfile.write("NUMBERS: %s " % sentence)
-                continue
-
-            if not filterSymbols(sentence):
-                rejectfile.write("SYMBOLS: %s " % sentence)
-                continue
-
-            if not filterAbbreviations(sentence):
-                rejectfile.write("ABBREVIATION: %s " % sentence)
-                continue
-
-            tokenized = tokenize(sentence)
-            if (len(tokenized) > MIN_WORDS and len(tokenized) < MAX_WORDS):
-                outOfAlphabet = False
-                for word in tokenized:
-                    if not filterAlphabet(word):
-                        outOfAlphabet = True
-                        break
-
-                if outOfAlphabet:
-                    rejectfile.write("OUT OF ALPHABET: %s" % sentence)
-                    continue
-
-            else:
-                rejectfile.write("TOO LONG: %s " % sentence)
-                continue
-           
-            sentences_seen.add(sentence)          
-            outfile.write(sentence)
-
+    counts = Counter()
+    #the index keeps fingerprints of the sentences instead, so the sentences themselves aren't kept
+    sentences_seen = set() if dedup is None else None
+    for results in validated_chunks(read_chunks(in_filepaths, chunk_size), lang, candidates, workers):
+        for sentence, reason in results:
+            if reason is None and sentences_seen is not None and sentence in sentences_seen:
+                reason = "DUPLICATE" #not written in the rejects file
+            elif reason is None and dedup is not None:
+                reason = dedup.add(sentence.strip())
+                if reason is not None:
+                    rejectfile.write("%s: %s" % (reason, sentence))
+            elif reason is not None:
+                rejectfile.write(REJECT_FORMATS[reason] % sentence)
+            if reason is None:
+                if sentences_seen is not None:
+                    sentences_seen.add(sentence)
+                outfile.write(sentence)
+            counts[reason or "ACCEPTED"] += 1
     outfile.close()
     rejectfile.close() 
+    if dedup is not None:
+        dedup.flush()
+    return counts
+
+
+def main(in_filepath, out_filepath, rejected_filepath, lang=None, candidates=None, workers=1, chunk_size=10000, dedup=None):
+    """Validates a file, a directory (its .txt files) or the files matching a glob, see validate_files"""
+    return validate_files(input_paths(in_filepath), out_filepath, rejected_filepath, lang, candidates, workers, chunk_size, dedup)
 
 
+def print_summary(counts, seconds):
+    total = sum(counts.values())
+    print("{total} sentences in {seconds:.1f}s ({rate:.0f} sentences/s): {accepted} accepted".format(
+        total=total, seconds=seconds, rate=total / seconds if seconds > 0 else 0, accepted=counts["ACCEPTED"]))
+    for reason, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        if reason != "ACCEPTED":
+            print("  {reason}: {count} ({ratio:.1%})".format(reason=reason, count=count, ratio=count / total))
+
  
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("-i", "--in-file", required=True )
+    parser.add_argument("-i", "--in-file", required=True, help="File to validate, or a directory (all its .txt files), or a glob, e.g. 'output/*_CC0.txt'")
     parser.add_argument("-o", "--out-file", required=True)
     parser.add_argument("-r", "--rejects-file", required=True)
+    parser.add_argument("-l", "--lang", default=None, help="Reject the sentences which aren't in this language (e.g. 'cy')")
+    parser.add_argument("--lang-candidates", type=lambda value: value.split(","), default=None, help="Comma-separated list of the languages scored by the language identification (see langident.py)")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="Number of processes validating the sentences")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Number of lines read and validated at once")
+    parser.add_argument("--dedup-index", default=None, help="Persistent index of the sentences already accepted, shared with the other runs (see dedup.py; not the index of the extractor). Only the sentences of the input files are deduplicated by default")
+    parser.add_argument("--near-duplicates", action="store_true", help="With --dedup-index, also reject the sentences very similar to an accepted one")
     args = parser.parse_args()
 
-    main(args.in_file, args.out_file, args.rejects_file)
-
+    dedup = None
+    if args.dedup_index is not None:
+        from dedup import DedupIndex
+        dedup = DedupIndex(args.dedup_index, near_duplicates=args.near_duplicates)
+    start = time.time()
+    counts = main(args.in_file, args.out_file, args.rejects_file, args.lang, args.lang_candidates, args.workers, args.chunk_size, dedup=dedup)
+    print_summary(counts, time.time() - start)
+    if dedup is not None:
+        dedup.close()
@@ -39,21 +39,33 @@ Room for improvement:
     * Making the script avaible for other versions of Wikipedia. It requires that some contributors publish their content under CC0).
     * Improving the quality of collected sentences (automatically correcting spelling mistakes, removing irrelevant sentences extracted from Wikipedia maintenance templates and categories)
     * using the script on contributors using a "public domain" template on their userpage.
-    * Making the script incremental (e.g. making the script able to stop and relaunch where it stopped). When we retrieve some content by a user, if we relaunch the script later we shouldn't try to retrieve content previously retrieved.
+    * Making the script incremental. The --resume option allows relaunching the script where it stopped, but if we relaunch the script later on the same users we still retrieve content previously retrieved.
     * Test and improve the "per user" option, to retrieve content from a specific user (see the --user option)
     * Removing sentences that are not in the target language (for example, on the English Wikipedia, some quotes are cited in their original language -Italian, French, etc.). There are several python libraries doing that. Currently, the script uses "langid" for that, but maybe there are most efficient libraries.
 """
 
-import requests
 import time
 import os
-import re
-from lxml import html
-from utils import filter_numbers, maybe_normalize, extract_sentences, check_output_dir, set_custom_boundaries, correct_sentence
-import spacy
-import pypandoc
+import threading
+from functools import partial
+from collections import Counter
+from api import ApiClient, ApiError, API_URL, MAX_REVIDS_PER_QUERY, raise_for_error
+from cache import ResponseCache
+from checkpoint import CheckpointStore
+from dump import DumpReader
+from history import HistoryIndex
+from translations import TranslationChecker, TranslationStore
+from pipeline import Pipeline, keep_context, start_cleaners
+from crawl import UserCrawler
+from utils import extract_sentences_stream, check_output_dir, set_custom_boundaries, FILTER_PROFILES
+from spellcheck import get_checker
+from cleaning import clean_article_html, wikitext_to_html, clean_added_lines, added_lines_from_diff
+from lazy import Lazy
+from output import SentenceSink, FORMATS, COMPRESSIONS
+from dedup import DedupIndex
+from validation import SentenceValidator
+from metrics import metrics, PeriodicExport
 import argparse
-import langid
 
 parser = argparse.ArgumentParser(description='Wikipedia CC0 text content extraction for Common Voice')
 parser.add_argument('--min-words', type=int, default=3, help='Minimum number of words to accept a sentence')
@@ -61,201 +73,221 @@ parser.add_argument('--max-words', type=int, default=15, help='Maximum number of
 #☺--type "creation" will retrieve only articles created by the user in their first version. On the other hand, --type "all_content" will retrieve any unique content the user added. The Wikipedia API makes it difficult to retrieve this second type of contributions, which explain why it takes so long to complete in the current version of this script.
 parser.add_argument('--type', type=str, default="creation", help="Fetching article creation ('creation'), or all kind of content added by the contributor ('all_content'). Currently, the 'all_content' option can take more than 10 hours to complete; it's recommended to first try the 'creation' option, and if it doesn't return satisfying results, then you may try the 'all_content' option.")
 parser.add_argument('--user', type=str, default=None, help="Retrieve content for a specific user, e.g. 'User:Mx. Granger'")
+parser.add_argument('--concurrency', type=int, default=4, help='Maximum number of Mediawiki API requests in flight at the same time')
+parser.add_argument('--max-rate', type=float, default=None, help='Maximum number of Mediawiki API requests sent per second, all users together. No limit by default')
+parser.add_argument('--concurrent-users', type=int, default=1, help='Number of users processed at the same time, each in a thread of its own (see crawl.py). With more than one user, the 30 seconds rest between users is skipped: the requests are only limited by --concurrency and --max-rate')
+parser.add_argument('--fetch', type=str, default="parse", choices=["parse", "batch"], help="With --type 'creation', fetching the rendered html of each revision with one request per revision ('parse'), or fetching the wikitext of up to 50 revisions per request and converting it locally ('batch')")
+parser.add_argument('--cache', type=str, default=None, help="SQLite file caching the API responses about immutable revisions across runs (e.g. '/data/cache.sqlite'). No cache by default")
+parser.add_argument('--cache-size', type=int, default=1024, help='Maximum size of the cache, in MB. The least recently used responses are evicted beyond it')
+parser.add_argument('--resume', action='store_true', help='Skip the users already processed by a previous run, and continue the interrupted user where it stopped (see --checkpoint)')
+parser.add_argument('--checkpoint', type=str, default=None, help="Checkpoint file recording the crawl progress. Defaults to '.checkpoint.json' in the output directory")
+parser.add_argument('--api-url', type=str, default=API_URL, help="URL of the Mediawiki API, e.g. 'http://localhost:8080/w/api.php' to run against mock_api.py. '{lang}' is replaced by the language code")
+parser.add_argument('--dump', type=str, default=None, help="Read the contributions from a local pages-meta-history XML dump (e.g. 'cywiki-latest-pages-meta-history.xml.bz2') instead of the Mediawiki API")
+parser.add_argument('--pipeline', action='store_true', help='Overlap the fetching, the cleaning (in a process pool) and the sentence segmentation of the contributions, instead of running them one after the other')
+parser.add_argument('--clean-workers', type=int, default=max(1, (os.cpu_count() or 2) - 1), help='With --pipeline, number of processes cleaning the retrieved texts')
+parser.add_argument('--wikitext-engine', type=str, default="native", choices=["native", "pandoc"], help="With --type 'all_content', converting the added wikitext lines to plain text in-process ('native'), or with two pandoc calls per line ('pandoc', the former and much slower conversion, kept for comparison)")
+parser.add_argument('--lang-candidates', type=lambda value: value.split(","), default=None, help="Comma-separated list of the languages scored by the language identification, e.g. 'cy,en,ga'. Defaults to the languages usually mixed with the processed one (see langident.py)")
+parser.add_argument('--spellcheck', action='store_true', help='Correct the extracted sentences with LanguageTool (requires language_check and Java; not available for Welsh)')
+parser.add_argument('--spellcheck-batch-size', type=int, default=64, help='Number of sentences checked by LanguageTool in a single request')
+parser.add_argument('--output-format', type=str, default="txt", choices=FORMATS, help="Writing one sentence per line ('txt'), or one JSON object per sentence recording its user, licence, language, revision, page title and position ('jsonl'), see output.py")
+parser.add_argument('--compression', type=str, default="none", choices=sorted(COMPRESSIONS), help="Compression of the output files ('zstd' requires the zstandard package)")
+parser.add_argument('--validate', action='store_true', help="Apply the rules of Validate.py (numbers, symbols, abbreviations, length, alphabet) to the sentences before writing them, instead of validating the output files afterwards (see validation.py)")
+parser.add_argument('--dedup-index', type=str, default=None, help="Persistent index of the sentences already written, shared across users and runs (see dedup.py). The sentences already in it are skipped")
+parser.add_argument('--near-duplicates', action='store_true', help='With --dedup-index, also skip the sentences very similar to a sentence already written')
+parser.add_argument('--spacy-batch-size', type=int, default=64, help='Number of paragraphs segmented together by spaCy')
+parser.add_argument('--filter-profile', type=str, default="wikipedia", choices=sorted(FILTER_PROFILES), help="Filter applied to the segmented sentences: 'wikipedia' only cleans them up, 'theatre' also removes the stage directions and character names of plays, spotted with the most common nouns and collocations of the texts (slower, see utils.py)")
+parser.add_argument('--spacy-processes', type=int, default=1, help='Number of processes used by spaCy for the sentence segmentation')
+parser.add_argument('--verbose', action='store_true', help='Print every retrieved revision and paragraph')
+parser.add_argument('--metrics', type=str, default=None, help="JSON file the run metrics are written to (API requests, filtered contributions, rejected paragraphs, time per stage, etc., see metrics.py), e.g. '/data/metrics.json'")
+parser.add_argument('--metrics-prom', type=str, default=None, help="Prometheus textfile the run metrics are written to, e.g. '/var/lib/node_exporter/wikicc0.prom'")
+parser.add_argument('--metrics-interval', type=float, default=60, help='Number of seconds between two exports of the metrics during the run')
+parser.add_argument('--profile-stages', type=lambda value: value.split(","), default=[], help="Comma-separated list of the stages profiled with cProfile, among 'contributions', 'fetch', 'clean' and 'segment'. The profiles are written as '<stage>.prof' files (see --profile-dir)")
+parser.add_argument('--profile-dir', type=str, default=None, help='Directory of the profiles of --profile-stages. Defaults to the output directory')
 parser.add_argument('lang', type=str, help="The Wikipedia version we want to retrieve data from (e.g. 'fr' for French, 'en' for English, etc.")
 parser.add_argument('output', type=str, help='Output directory')
 
 args = parser.parse_args()
 check_output_dir(args.output)
+#the processes cleaning the texts of --pipeline are forked before any thread is started (see pipeline.py)
+cleaners = start_cleaners(args.clean_workers) if args.pipeline else None
+cache = ResponseCache(args.cache, max_size=args.cache_size * 1024 * 1024) if args.cache else None
+api = ApiClient(args.lang, concurrency=args.concurrency, url=args.api_url, cache=cache, max_rate=args.max_rate)
+#the page histories used to detect the reverts (all_content mode)
+histories = HistoryIndex(api)
+checkpoints = CheckpointStore(args.checkpoint or os.path.join(args.output, ".checkpoint.json"), resume=args.resume)
+#the paragraphs were already checked by the language identification, so the validator doesn't check it again
+validator = SentenceValidator() if args.validate else None
+dedup = DedupIndex(args.dedup_index, near_duplicates=args.near_duplicates) if args.dedup_index else None
+#the verdicts of the translation check are kept across users and runs, in the --cache file or in the output directory.
+#A dump lists the translated articles itself (see DumpReader.scan_metadata)
+translation_store = TranslationStore(args.cache or os.path.join(args.output, ".translations.sqlite")) if args.dump is None else None
+metrics.configure_profiling(args.profile_stages, args.profile_dir or args.output)
+exporter = PeriodicExport(metrics, args.metrics, args.metrics_prom, interval=args.metrics_interval) if args.metrics or args.metrics_prom else None
+
+
+def log(*values):
+    """Prints the details of the extraction, only with the --verbose option"""
+    if args.verbose:
+        print(*values)
 
 #TODO: internationalize spacy & nlp imports
 spacy_models = {"fr":"fr_core_news_md",
                 "en":"en_core_web_md"}
-try:
-    if args.lang == "fr":
-        import fr_core_news_md #if it doesn't work, an alternative is: nlp = spacy.load('fr_core_news_sm') https://spacy.io/models/fr. See also line nlp = fr_core_news_sm.load(), at the bottom of the page
-        nlp = fr_core_news_md.load()   #if it doesn't work, try: nlp = spacy.load('fr_core_news_sm'). See  imports, and https://spacy.io/models/fr, https://spacy.io/models/fr, etc.
-    #elif args.lang == "en":
-    else:
-        import en_core_web_md
-        nlp = en_core_web_md.load()
-        
-except ImportError:
-    from spacy.cli import download as spacy_model_download
-    spacy_model_download(spacy_models['en'])  #[args.lang])
-    nlp = spacy.load(spacy_models['en'])#args.lang])
-    import nltk
-    nltk.download('punkt')
-
-
-nlp.add_pipe(set_custom_boundaries, before='parser') 
+
+
+def load_nlp():
+    """Loads the spaCy model. It takes a few seconds, so it's only done when the first sentences are segmented (see lazy.py)"""
+    import spacy
+    try:
+        if args.lang == "fr":
+            import fr_core_news_md #if it doesn't work, an alternative is: nlp = spacy.load('fr_core_news_sm') https://spacy.io/models/fr. See also line nlp = fr_core_news_sm.load(), at the bottom of the page
+            nlp = fr_core_news_md.load()   #if it doesn't work, try: nlp = spacy.load('fr_core_news_sm'). See  imports, and https://spacy.io/models/fr, https://spacy.io/models/fr, etc.
+        #elif args.lang == "en":
+        else:
+            import en_core_web_md
+            nlp = en_core_web_md.load()
+            
+    except ImportError:
+        from spacy.cli import download as spacy_model_download
+        spacy_model_download(spacy_models['en'])  #[args.lang])
+        nlp = spacy.load(spacy_models['en'])#args.lang])
+        import nltk
+        nltk.download('punkt')
+
+    try:
+        nlp.add_pipe(set_custom_boundaries, before='parser') #spaCy 2
+    except ValueError: #spaCy >= 3 only adds the components registered by name
+        from spacy.language import Language
+        if set_custom_boundaries.__name__ not in Language.factories:
+            Language.component(set_custom_boundaries.__name__, func=set_custom_boundaries)
+        nlp.add_pipe(set_custom_boundaries.__name__, before='parser')
+    return nlp
+
+
+nlp = Lazy(load_nlp)
 #tool = language_check.LanguageTool('fr-FR') #TODO for later
-mapping_specific = [
-  [ u'(', u''],
-  [ u')', u''],
-  [ re.compile('\. $'), u'.' ],
-  [ re.compile(' \.'), u'.' ],
-  [ u' ,  ', u', ' ],
-  [ u' , ', u', ' ],
-  [ u'  ', u' ' ],
-]
-
-#measure_units = {
-#        "mm": "millimètre",
-#        "°": "degré",
-#        "cm":"centimètre",
-#        "m.":"mètre",
-#        "km":"kilomètre",
-#             
-#        }
 
 mapping_lang_template = {"fr":{"template_name":"Modèle:Utilisateur_CC0", 
                                "user_prefix":"Utilisateur:",
-                               "talk_prefix":"Discussion:"},
+                               "talk_prefix":"Discussion:",
+                               "template_prefix":"Modèle:"},
                          "en":{"template_name":"Template:CC-0 Release", 
                                "user_prefix":"User:",
-                               "talk_prefix":"Talk:"},
+                               "talk_prefix":"Talk:",
+                               "template_prefix":"Template:"},
                          "cy":{"template_name":"Templed:Trwydded CC-0",
                                "user_prefix":"Defnyddiwr:",
-                               "talk_prefix":"Trafodaeth"},
+                               "talk_prefix":"Sgwrs:",
+                               "template_prefix":"Nodyn:"},
                          }
 #useful to check if the page is a translation
 translation_templates = ["traduit de", "traduit par", "Translated page"]
-#from https://github.com/rcompton/ryancompton.net/blob/master/assets/praw_drugs/urlmarker.py
-WEB_URL_REGEX = r"""(?i)\b((?:https?:(?:/{1,3}|[a-z0-9%])|[a-z0-9.\-]+[.](?:com|net|org|edu|gov|mil|aero|asia|biz|cat|coop|info|int|jobs|mobi|museum|name|post|pro|tel|travel|xxx|ac|ad|ae|af|ag|ai|al|am|an|ao|aq|ar|as|at|au|aw|ax|az|ba|bb|bd|be|bf|bg|bh|bi|bj|bm|bn|bo|br|bs|bt|bv|bw|by|bz|ca|cc|cd|cf|cg|ch|ci|ck|cl|cm|cn|co|cr|cs|cu|cv|cx|cy|cz|dd|de|dj|dk|dm|do|dz|ec|ee|eg|eh|er|es|et|eu|fi|fj|fk|fm|fo|fr|ga|gb|gd|ge|gf|gg|gh|gi|gl|gm|gn|gp|gq|gr|gs|gt|gu|gw|gy|hk|hm|hn|hr|ht|hu|id|ie|il|im|in|io|iq|ir|is|it|je|jm|jo|jp|ke|kg|kh|ki|km|kn|kp|kr|kw|ky|kz|la|lb|lc|li|lk|lr|ls|lt|lu|lv|ly|ma|mc|md|me|mg|mh|mk|ml|mm|mn|mo|mp|mq|mr|ms|mt|mu|mv|mw|mx|my|mz|na|nc|ne|nf|ng|ni|nl|no|np|nr|nu|nz|om|pa|pe|pf|pg|ph|pk|pl|pm|pn|pr|ps|pt|pw|py|qa|re|ro|rs|ru|rw|sa|sb|sc|sd|se|sg|sh|si|sj|Ja|sk|sl|sm|sn|so|sr|ss|st|su|sv|sx|sy|sz|tc|td|tf|tg|th|tj|tk|tl|tm|tn|to|tp|tr|tt|tv|tw|tz|ua|ug|uk|us|uy|uz|va|vc|ve|vg|vi|vn|vu|wf|ws|ye|yt|yu|za|zm|zw)/)(?:[^\s()<>{}\[\]]+|\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\))+(?:\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\)|[^\s`!()\[\]{};:'".,<>?«»“”‘’])|(?:(?<!@)[a-z0-9]+(?:[.\-][a-z0-9]+)*[.](?:com|net|org|edu|gov|mil|aero|asia|biz|cat|coop|info|int|jobs|mobi|museum|name|post|pro|tel|travel|xxx|ac|ad|ae|af|ag|ai|al|am|an|ao|aq|ar|as|at|au|aw|ax|az|ba|bb|bd|be|bf|bg|bh|bi|bj|bm|bn|bo|br|bs|bt|bv|bw|by|bz|ca|cc|cd|cf|cg|ch|ci|ck|cl|cm|cn|co|cr|cs|cu|cv|cx|cy|cz|dd|de|dj|dk|dm|do|dz|ec|ee|eg|eh|er|es|et|eu|fi|fj|fk|fm|fo|fr|ga|gb|gd|ge|gf|gg|gh|gi|gl|gm|gn|gp|gq|gr|gs|gt|gu|gw|gy|hk|hm|hn|hr|ht|hu|id|ie|il|im|in|io|iq|ir|is|it|je|jm|jo|jp|ke|kg|kh|ki|km|kn|kp|kr|kw|ky|kz|la|lb|lc|li|lk|lr|ls|lt|lu|lv|ly|ma|mc|md|me|mg|mh|mk|ml|mm|mn|mo|mp|mq|mr|ms|mt|mu|mv|mw|mx|my|mz|na|nc|ne|nf|ng|ni|nl|no|np|nr|nu|nz|om|pa|pe|pf|pg|ph|pk|pl|pm|pn|pr|ps|pt|pw|py|qa|re|ro|rs|ru|rw|sa|sb|sc|sd|se|sg|sh|si|sj|Ja|sk|sl|sm|sn|so|sr|ss|st|su|sv|sx|sy|sz|tc|td|tf|tg|th|tj|tk|tl|tm|tn|to|tp|tr|tt|tv|tw|tz|ua|ug|uk|us|uy|uz|va|vc|ve|vg|vi|vn|vu|wf|ws|ye|yt|yu|za|zm|zw)\b/?(?!@)))"""
-
-def is_garbage(sentence, lang_code):
-    #To avoidspam on Common Voice
-    if len(re.findall(WEB_URL_REGEX,sentence)) > 0:
-        return True
-    #to check if the sentence is in the correct language
-    
-    #check if the sentence isn't an artifact from Wikipedia templates and other maintenance stuff
-    for garbage in ["Fichier:", "Image:", "File:", "Catégorie:", "|", "!!"]:
-        if garbage in sentence:
-            return True
-    return False
-
-
-
-
-
-def convert_abbreviations(text, lang_code):
-    measure_units = {"fr": {
-                        "mm": "millimètre",
-                        "°": "degré",
-                        "cm":"centimètre",
-                        "m.":"mètre",
-                        "km":"kilomètre",
-             
-                        }
-                    }
-    coordinate_units = {"fr": {"degree":"degré",
-                               "minute": "minute",
-                               "second": "seconde"
-                                }
-                        }
-    text = re.sub(r'([0-9]+) ?°([0-9]+) ?\'([0-9]+) ?\"', r"\1 {degree} \2 {minute} \3 {second}".format(degree=coordinate_units[lang_code]["degree"],minute=coordinate_units[lang_code]["minute"],second=coordinate_units[lang_code]["second"]), text)
-    text = re.sub(r'-(\d*\.\d+|\d+)', "moins \1", text)
-    #TODO: need to treat differently singular and plural. The only library doing that for a variety of languages is "pattern", which apparently is not compatible yet with Python 3 (but should soon)
-    for measure in measure_units[lang_code]:
-        #singular
-        text = re.sub(r'(\[0-1]\[,.]\d+|\[0-1]) ?{measure}'.format(measure=measure), r"\1 {full_name}".format(full_name=measure_units[lang_code][measure]), text)
-        #plural
-        text = re.sub(r'(\d*\[,.]\d+|\d+) ?{measure}'.format(measure=measure), r"\1 {full_name}".format(full_name=measure_units[lang_code][measure]), text)
-
-    return text
-
-
-def get_article_texts(lang, revid_list):
-    """Retrieves revisions specified in the "revid_lisst".
-    The "lang" parameter specifies the Wikipedia version, e.g. "fr"
-    To be used only with the first revision of articles originally created by the contributor.
-    """
-    url = "https://{lang}.wikipedia.org/w/api.php".format(lang=lang)
-    query = {"action":"parse",
-             "format":"json"
-             }
-    text_list = []
-    print (len(revid_list))
-    text_sofar_file = open("Wiki-CC0-text-sofar.txt",'w',encoding='utf-8')
-
-    for revid in revid_list:
-        time.sleep(1)
-        print (revid)
-        query["oldid"] = revid
-        try:
-            response = requests.post(url, data=query)
-        except:
-            time.sleep(30)
-            response = requests.post(url, data=query)
-
-        try:
-            response = response.json()
-        except:
+if translation_store is not None:
+    translation_checker = TranslationChecker(api, mapping_lang_template[args.lang]["talk_prefix"], mapping_lang_template[args.lang]["template_prefix"],
+                                             translation_templates, store=translation_store)
+
+
+def fetch_parsed_revisions(revid_list):
+    """Yields (revid, title, html) tuples, retrieving the rendered html of each revision with one "action=parse" request per revision."""
+    queries = ({"action":"parse",
+                "format":"json",
+                "oldid":revid
+                } for revid in revid_list)
+    #the revisions are fetched concurrently, see the --concurrency option
+    for revid, response in zip(revid_list, api.map(queries)):
+        if response is None:
             continue
-
         if "parse" not in response.keys(): #it's possible that the revision was since deleted, in this case there's nothing to parse
             continue
+        yield revid, response["parse"]["title"], response["parse"]["text"]["*"]
 
-        raw_html = response["parse"]["text"]["*"]
-        document = html.document_fromstring(raw_html)
-        all_p = document.xpath("//p")
-        for p in all_p:
-            text = p.text_content()
-            text = text.replace("\xa0", " ")
-            #replacing by a space rather than by nothing, to ease the further string cleanup
-            text = re.sub(r' \([^)]+\)', '', text) 
-            text = re.sub(r'\([^)]+\)', '', text) 
-            #text = maybe_normalize(text)
-            #text = maybe_normalize(text, mapping=mapping_specific)
-            text = re.sub(r'(\d)\s+(\d)', r'\1\2', text) #In French, there's a space separation between thousand units. It isn't taken into account by num2words, so just let's remove those spaces.
-            #TODO: need to internationalize this part below
-            #converting latlon coordinates
-#            text = re.sub(r'([0-9]+) ?°([0-9]+) ?\'([0-9]+) ?\"', r"\1 degrés \2 minutes \3 secondes", text)
-##            text = re.sub(r'-(\d*\.\d+|\d+)', "moins \1", text)
-#            for measure in measure_units:
-#                text = re.sub(r'(\[0-1]\[,.]\d+|\[0-1]) ?{measure}'.format(measure=measure), r"\1 {full_name}".format(full_name=measure_units[measure]), text)
-#                text = re.sub(r'(\d*\[,.]\d+|\d+) ?{measure}'.format(measure=measure), r"\1 {full_name}s".format(full_name=measure_units[measure]), text)
-#                
-#            text = re.sub(r'(\[0-1]\[,.]\d+|\[0-1]) ?°', r"\1 degré", text)
-#            text = re.sub(r'(\d*\[,.]\d+|\d+) ?°', r"\1 degrés", text)
-#            text = re.sub(r'(\d*\[,.]\d+|\d+) ?mm', r"\1 millimètres", text)
-#            text = re.sub(r'(\d*\[,.]\d+|\d+) ?cm', r"\1 centimètres", text)
-#            text = re.sub(r'(\d*\[,.]\d+|\d+) ?m[^a-z]', r"\1 mètres ", text)
-#            text = re.sub(r'(\d*\[,.]\d+|\d+) ?km', r"\1 kilomètres", text)
-#            text = text.replace(" ?%", r" pour cent") 
-            #remove references between brackets
-            text = re.sub(r'\[[0-9]+\]', '', text) #r'\[[0-9]+*\]'
-            #Transforming numbers in letters
-            #text = filter_numbers(text, lang=lang)
-            text = text.strip()
-#        text= " ".join([p.text_content().replace("\xa0", " ") for p in all_p])
-            
 
-            if "\n" in text or is_garbage(text, lang) == True:                
-                text = ""
-            if langid.classify(text)[0] != lang:                
-                text = ""
-
-#            text = correct_sentence(text, lang) #TODO: uncomment
-#            text = text.replace("%", "pour cent") 
-
-            if len(text.split()) > 3:
-                #TODO: check content spelling
-#                try:
-#                    matches = tool.check(text)
-#                    text = language_check.correct(text, matches)
-#                except Exception as e:
-#                    print(text)
-#                    print("erreur correction : ", str(e))
-#                    print(revid)
-#                    print("*"*20)
-                print (text)
-                text_sofar_file.write(text.rstrip() + '\n')
-                text_list.append(text)
+def fetch_revision_batch(revid_batch):
+    """Returns a {revid: (title, wikitext)} dictionary for a batch of at most MAX_REVIDS_PER_QUERY revisions."""
+    query = {"action":"query",
+             "prop":"revisions",
+             "revids":"|".join(str(revid) for revid in revid_batch),
+             "rvprop":"ids|content",
+             "rvslots":"main",
+             "format":"json"
+             }
+    wikitexts = {}
+    while True:
+        response = api.post(query)
+        if response is None or "query" not in response.keys():
+            break
+        #revisions deleted since are listed in "badrevids", and simply missing from the pages
+        for page in response["query"].get("pages", {}).values():
+            for revision in page.get("revisions", []):
+                content = revision["slots"]["main"] if "slots" in revision.keys() else revision
+                if "*" in content.keys():
+                    wikitexts[str(revision["revid"])] = (page["title"], content["*"])
+        #when the batch is too big to be sent in one response, the API asks us to continue
+        if "continue" in response.keys() and "rvcontinue" in response["continue"].keys():
+            query["rvcontinue"] = response["continue"]["rvcontinue"]
+        else:
+            break
+    return wikitexts
+
+
+def fetch_batched_revisions(revid_list):
+    """Yields (revid, title, html) tuples, retrieving the wikitext of the revisions by batches of MAX_REVIDS_PER_QUERY, and converting it to html locally."""
+    batches = [revid_list[i:i + MAX_REVIDS_PER_QUERY] for i in range(0, len(revid_list), MAX_REVIDS_PER_QUERY)]
+    for revid_batch, wikitexts in zip(batches, api.map(batches, fetch=fetch_revision_batch)):
+        for revid in revid_batch:
+            if str(revid) not in wikitexts.keys():
+                continue
+            title, wikitext = wikitexts[str(revid)]
+            raw_html = wikitext_to_html(wikitext)
+            if raw_html is not None:
+                yield revid, title, raw_html
+
+
+def fetch_article_html(revid_list):
+    """
+    Yields (context, html) tuples for the revisions, fetched according to the --fetch option (see paragraph_context).
+    Used by get_article_texts, and by the fetch stage of --pipeline.
+    """
+    if args.fetch == "batch":
+        revisions = fetch_batched_revisions(revid_list)
+    else:
+        revisions = fetch_parsed_revisions(revid_list)
+    for revid, title, raw_html in revisions:
+        log(revid)
+        yield {"revid": int(revid), "title": title}, raw_html
+
+
+def paragraph_context(revid, title, paragraph=0):
+    """Returns the provenance of a paragraph, recorded with its sentences in the jsonl output format (see output.py)"""
+    return {"revid": int(revid), "title": title, "paragraph": paragraph}
+
+
+def sofar_path(user, licence):
+    """Returns the path of the file listing the texts retrieved so far for a user, to follow the progress of the extraction"""
+    return os.path.join(args.output, "." + "_".join([str(user), str(licence)]) + ".sofar.txt")
+
+
+def get_article_texts(lang, user, revid_list, sofar=None):
+    """Retrieves revisions specified in the "revid_lisst", and records the (paragraph, context) tuples (see paragraph_context) in the user's checkpoint.
+    The "lang" parameter specifies the Wikipedia version, e.g. "fr"
+    The revisions already processed by an interrupted run are skipped (see --resume), and the texts are read back with checkpoints.texts.
+    The optional "sofar" parameter is the path of a file the paragraphs are appended to as they are retrieved (see sofar_path).
+    To be used only with the first revision of articles originally created by the contributor.
+    """
+    processed = set(checkpoints.user_state(user)["processed"])
+    revid_list = [revid for revid in revid_list if revid not in processed]
+    log(len(revid_list), "revisions to retrieve")
+    text_sofar_file = open(sofar or os.devnull,'a',encoding='utf-8')
+
+    for context, raw_html in metrics.timed("fetch", fetch_article_html(revid_list)):
+        with metrics.stage("clean"):
+            paragraphs = clean_article_html(raw_html, lang, candidates=args.lang_candidates)
+        for text in paragraphs:
+            log(text)
+            text_sofar_file.write(text.rstrip() + '\n')
+        #the revids are listed as strings in creation mode
+        checkpoints.record(user, str(context["revid"]), [(text, dict(context, paragraph=i)) for i, text in enumerate(paragraphs)])
     text_sofar_file.close()
-    
-    return text_list
 
 
 def get_user_list(lang, template_name):
@@ -264,8 +296,7 @@ def get_user_list(lang, template_name):
     The "lang" parameter specifies the Wikipedia version, e.g. "en".
     The "template name" specifies the template name, e.g. "Template:CC0"
     """
-    url = "https://{lang}.wikipedia.org/w/api.php".format(lang=lang) 
-    print (url)
+    log(api.url)
     user_list = []
     eicontinue = None
     query = {"action":"query",
@@ -277,10 +308,10 @@ def get_user_list(lang, template_name):
     while True:
         if eicontinue != None: #=2|9655949
             query["eicontinue"] = eicontinue 
-        print(url, query)
-        r = requests.post(url, data=query)
-        #r = requests.get(url, params=query)
-        response = r.json()
+        log(api.url, query)
+        response = api.post(query)
+        #without the user list, there's nothing to do
+        raise_for_error(response)
         for page in response["query"]["embeddedin"]:
             name = page["title"].replace(mapping_lang_template[args.lang]["user_prefix"], "")
             if "/" not in name: #if there's a slash, the template in embedded in a subpage, so it's not obvious that the user publishes her contribution under CC0
@@ -293,13 +324,10 @@ def get_user_list(lang, template_name):
     return user_list
 
 
-def get_added_content(url, revid, lang):
+def fetch_added_lines(revid):
     """
-    Retrieves all content created by the contributor, except minor edits and derivative works like translations, 
-    content mixed with other contributors, or reverts
-    The "url" parameter specifies the API's base url.
+    Returns the title of the page and the lines of wikitext added by a revision, or None if the revision is a derivative work (e.g. a revert) or a redirection.
     The "revid" parameter specifies the ID of the revision to check and retrieve.
-    The "lang" parameter specifies the code of the processed language (e.g. "en", "fr", etc.)
     """
     #We want to compare the revision to the previous one, to see the content the contributor added (or not)
     compare_query = {"action":"compare",
@@ -308,126 +336,130 @@ def get_added_content(url, revid, lang):
                      "prop":"rel|diffsize|size|diff|title",
                      "format":"json"}
 #    print(compare_query)
-    response = requests.post(url, params=compare_query).json()
-    if "compare" not in response.keys():
+    response = api.post(compare_query)
+    if response is None or "compare" not in response.keys():
         return None
-    revid_size = response["compare"]["tosize"]
 
-        
     if "prev" in response["compare"].keys(): #If there are previous revisions, we need to check if the current revision isn't a derivative work (i.e. a revert)
-        #Check if it's a revert
-        rvcontinue = None
-        revid_size = 0
         current_size = response["compare"]["tosize"]
         previous_size = response["compare"]["fromsize"]
         if previous_size > current_size:
+            metrics.incr("contributions_filtered_total", rule="removal")
+            return None
+        #Check if it's a revert, with the history of the page (fetched once for all the revisions of the page, see history.py)
+        if histories.is_revert(response["compare"]["totitle"], revid):
+            metrics.incr("contributions_filtered_total", rule="revert")
             return None
-        while True:
-            #Let's compare the current and previous revisions of the page
-            pr_query = {"action":"query", "prop":"revisions", 
-                    "rvprop":"ids|tags|size", "format":"json",
-#                    "revids":previous_revision_id 
-                    "rvendid":revid,
-                    "titles":response["compare"]["totitle"]
-                    } #for retrieving a list of previous revisions until the current one            
-            if rvcontinue != None:
-                pr_query["rvcontinue"] = rvcontinue
-            pr_response = requests.post(url, pr_query).json()
-            for page in pr_response["query"]["pages"]:
-                #Check if the current revision is a revert.
-                for revision in pr_response["query"]["pages"][page]["revisions"]:
-#                    print(revision.keys())
-                    if revision["revid"] == revid:                        
-                        revid_tags = revision["tags"]
-                        if "mw-rollback" in revid_tags: #Here, we're sure it's a revert
-                            return None
-                        continue
-                    #If this previous revision has the same size of the current revision, maybe the revision we want to retrieve is a revert. Let's be conservative, and consider it is.
-                    if revision["size"] == revid_size: 
-                        return None
-            if "continue" in pr_response.keys():
-                rvcontinue = pr_response["continue"]["rvcontinue"]
-            else:
-                break
     #Now, let's retrieve the revision content!
-    raw_html = response["compare"]["*"]
-    document = html.document_fromstring(raw_html)
-    added_lines = document.xpath("//td[@class='diff-addedline']")
-#        deleted_lines = document.xpath("//td[@class='diff-deletedline']")
-    text_list = []
-    for td in added_lines:
-        for div in td:
-            if len(div.getchildren()) > 0: #if there are children tags, it's because this is an inline modification, and not an addition -> skip it                
-                continue
-            else:
-                text = div.text_content()
-                if "#REDIRECT" in text:  
-                    return None
-                
-                try:       
-                    #TODO: convert scales (1/25000, etc.)
-                    text = pypandoc.convert_text(text, to="plain", format="html").replace("\r\n", " ")
-                    #to avoid removing relevant content in the {{lien}} template (French wikipedia)
-                    text = re.sub(r"{{lien\|([^}]+)}}", r"\1", text)
-                    text = pypandoc.convert_text(text, to="html", format="mediawiki").replace("\r\n", " ")
-                    #and we retrieve the real plain text
-                    #TODO: add cleaning up of (), [], etc.
-                    text = html.document_fromstring(text)
-                    text = text.text_content()
-                    text = text.replace("\xa0", " ")
-                    #replacing by a space rather than by nothing, to ease the further string cleanup
-                    text = re.sub(r' \([^)]+\)', '', text) 
-                    text = re.sub(r'\([^)]+\)', '', text) 
-                    text = maybe_normalize(text)
-                    text = maybe_normalize(text, mapping=mapping_specific)
-                    text = re.sub(r'(\d)\s+(\d)', r'\1\2', text) #In French, there's a space separation between thousand units. It isn't taken into account by num2words, so just let's remove those spaces.
-                    #TODO: need to internationalize this part below
-                    #converting latlon coordinates
-#                    text = re.sub(r'([0-9]+) ?°([0-9]+) ?\'([0-9]+) ?\"', r"\1 degrés \2 minutes \3 secondes", text)
-        #            text = re.sub(r'-(\d*\.\d+|\d+)', "moins \1", text)
-#                    for measure in measure_units:
-#                        text = re.sub(r'(\[0-1]\[,.]\d+|\[0-1]) ?{measure}'.format(measure=measure), r"\1 {full_name}".format(full_name=measure_units[measure]), text)
-#                        text = re.sub(r'(\d*\[,.]\d+|\d+) ?{measure}'.format(measure=measure), r"\1 {full_name}s".format(full_name=measure_units[measure]), text)
-#                    text = text.replace(" ?%", r" pour cent") 
-                    #remove references between brackets
-                    text = re.sub(r'\[[0-9]+\]', '', text) #r'\[[0-9]+*\]'
-                    detected_lang = langid.classify(text)[0]
-                    
-                    if  detected_lang != lang:
-                        continue
-                    #Transforming numbers in letters
-                    try:
-                        text = filter_numbers(text, lang=lang)
-                    except:
-                        pass
-                    text = text.strip()
-                                        
-                        
-                    if is_garbage(text, lang) == True:
-#                        print("garbage:", text)
-                        continue
-#                    text = correct_sentence(text, lang) #TODO: uncomment
-                except:
-                    continue #if pandoc cannot convert wikicode, there's a problem, and we don't want to retrieve malformed text
-                if len(text.split()) > 3: #Let's not retrieve too short text
-                    text_list.append(text)
-    return " ".join(text_list)
+    lines = added_lines_from_diff(response["compare"]["*"])
+    if lines is None:
+        metrics.incr("contributions_filtered_total", rule="redirect")
+        return None
+    return response["compare"]["totitle"], lines
 
 
-print("Retrieving CC0 user list")
-if args.user == None:
-    #generate a list of tuples (user, licence), if later we want to retrieve other licences than CC0
-    CC0_user_list = [(user, "CC0") for user in get_user_list(args.lang, mapping_lang_template[args.lang]["template_name"])]
-else:
-    CC0_user_list = [(user, "CC0") for user in args.user.split(";")]
-print("User list retrieved")
-translations = {}
-for user, licence in CC0_user_list:
-    revid_list = []
-    uccontinue = None
-    text_list = []
+def fetch_added_revisions(revid_list):
+    """Yields (context, lines) tuples for the lines added by the revisions (see fetch_added_lines), fetched concurrently"""
+    for revid, added in zip(revid_list, api.map(revid_list, fetch=fetch_added_lines)):
+        if added is not None:
+            title, lines = added
+            yield paragraph_context(revid, title), lines
+
+
+def get_added_content(revid, lang):
+    """
+    Retrieves all content created by the contributor, except minor edits and derivative works like translations, 
+    content mixed with other contributors, or reverts
+    The "revid" parameter specifies the ID of the revision to check and retrieve.
+    The "lang" parameter specifies the code of the processed language (e.g. "en", "fr", etc.)
+    """
+    with metrics.stage("fetch"):
+        added = fetch_added_lines(revid)
+    if added is None:
+        return None
+    title, lines = added
+    with metrics.stage("clean"):
+        return clean_added_lines(lines, lang, engine=args.wikitext_engine, candidates=args.lang_candidates)
+
+
+#the spaCy model segments the texts of one user at a time (see --concurrent-users)
+segment_lock = threading.Lock()
+
+
+def write_sentences(user, licence, text_list):
+    """
+    Extracts the sentences from the texts retrieved for a user, and writes them in a file named after the user, see output.py.
+    The "text_list" parameter is an iterable of (text, context) tuples (see paragraph_context), e.g. checkpoints.texts(user).
+    """
+    with segment_lock, metrics.stage("segment"):
+        _write_sentences(user, licence, text_list)
+
+
+def _write_sentences(user, licence, text_list):
+    print("Extracting sentences")
+    extracted_sentences = extract_sentences_stream(text_list, args.min_words, args.max_words, nlp.get(), as_tuples=True,
+                                                   batch_size=args.spacy_batch_size, n_process=args.spacy_processes,
+                                                   profile=args.filter_profile)
+    if args.spellcheck:
+        extracted_sentences = get_checker(args.lang).correct_stream(extracted_sentences, batch_size=args.spellcheck_batch_size, as_tuples=True)
+    rejected = Counter()
+    #the sentences are only recorded in the dedup index once the file is complete: if it's aborted, they're not
+    #written anywhere, so they mustn't become duplicates
+    if dedup is not None:
+        dedup.begin()
+    try:
+        #the sentences are written as soon as they are segmented, and the file only gets its final name once complete
+        with SentenceSink(args.output, user, licence, args.lang, output_format=args.output_format, compression=args.compression) as sink:
+            for sentence, context in extracted_sentences:
+                if validator is not None:
+                    reason = validator.check_text(sentence)
+                    if reason is not None:
+                        rejected[reason] += 1
+                        continue
+                if dedup is not None and dedup.add(sentence) is not None:
+                    rejected["DUPLICATE"] += 1
+                    continue
+                sink.write(sentence, context)
+    except BaseException:
+        if dedup is not None:
+            dedup.rollback()
+        raise
+    if dedup is not None:
+        dedup.commit()
+        dedup.flush()
+    metrics.incr("sentences_written_total", sink.count)
+    for reason, count in rejected.items():
+        metrics.incr("sentences_rejected_total", count, reason=reason)
+    metrics.incr("users_total")
+    print(sink.count, "sentences retrieved")
+    if rejected:
+        print("Rejected:", ", ".join("{reason} {count}".format(reason=reason, count=count) for reason, count in sorted(rejected.items())))
+
+
+def contribution_filter(contrib):
+    """Returns the rule excluding a contribution listed by list=usercontribs, or None if its content may be retrieved"""
+    if "minor" in contrib.keys():
+        return "minor"
+    #the tags and the comment may be hidden, in which case we can't check the contribution
+    if "tags" not in contrib.keys() or "comment" not in contrib.keys():
+        return "hidden"
+    if "mw-new-redirect" in contrib["tags"] or "redirect" in contrib["comment"]:
+        return "redirect"
+    if "contenttranslation" in contrib["tags"]:
+        return "translation"
+    return None
+
+
+def process_user(user, licence):
+    """Retrieves the contributions of a user through the Mediawiki API, and writes the extracted sentences."""
+    #the state is restored from the checkpoint if the user was interrupted (see --resume), and empty otherwise
+    state = checkpoints.user_state(user)
+    revid_list = state["revid_list"]
+    uccontinue = state["uccontinue"]
+    #the revids are listed as strings in creation mode, and as integers in all_content mode
+    processed = set(str(revid) for revid in state["processed"])
     print("Processing user", user, "license", licence, "(https://{lang}.wikipedia.org/wiki/{prefix}{user})...".format(lang=args.lang, prefix=mapping_lang_template[args.lang]["user_prefix"], user=user))    
-    while True:
+    while not state["contribs_done"]:
         time.sleep(1) #Let's give Wikimedia servers a rest
         query = {"action":"query",
                  "list":"usercontribs",
@@ -439,85 +471,168 @@ for user, licence in CC0_user_list:
                  }
         if uccontinue != None:
             query["uccontinue"] = uccontinue        
-        url = "https://{lang}.wikipedia.org/w/api.php".format(lang=args.lang)
-        r = requests.post(url, data=query)      
-        try:
-            my_json = r.json()        
-        except: 
-            try:
-                time.sleep(10)
-                r = requests.post(url, data=query)
-                my_json = r.json()        
-            except:
+        with metrics.stage("contributions"):
+            my_json = api.post(query)
+            if my_json is None:
                 continue
-#            break
-        #TODO: exclude reverts
-        for contrib in my_json["query"]["usercontribs"]:                    
-            if "minor" not in contrib.keys() and ("tags" in contrib.keys() and "mw-new-redirect" not in contrib["tags"] and "contenttranslation" not in contrib["tags"]) and ("comment" in contrib.keys() and "redirect" not in contrib["comment"]):
+            #e.g. an unknown user: the user is skipped (see the main loop), and retried with --resume
+            raise_for_error(my_json)
             #Let's exclude : minor edits, redirections, and translations (not under CC0 licence)
-                #Let's double check if it's not a translation:
-                discussion_page_title = mapping_lang_template[args.lang]["talk_prefix"] + contrib["title"]                
-                if discussion_page_title not in translations.keys():                                      
-                    #check if the page is a translation
-                    discussion_query = {"action":"query", "prop":"revisions", 
-                        "rvprop":"content", "format":"json",
-                        "titles":discussion_page_title }
-                    try:
-                        discussion_response = requests.post(url, data=discussion_query).json()["query"]["pages"]
-                    except:
-                        print("error:", url, discussion_query)
-                        time.sleep(10)
-                        try:
-                            discussion_response = requests.post(url, data=discussion_query).json()["query"]["pages"]
-                        except:
-                            print("error:", url, discussion_query)
-                            continue
-                    translation = False
-                    translations[discussion_page_title] = False
-                    #Check if there's a template "translated from" in the discussion page. If so, the extrated data is maybe not under a CC0 license.
-                    for page in discussion_response:
-                        if "revisions" in discussion_response[page].keys():
-                            discussion_content = discussion_response[page]["revisions"][0]["*"]
-                            for template_name in translation_templates:
-                                if "{{"+template_name in discussion_content:
-                                    translation = True
-                                    translations[discussion_page_title] = True
-                                    print("Translation from", contrib["title"], "excluded")
-                        #not "else" here, because the discusion page may be inexistant
-                if translations[discussion_page_title] == True:
-                        continue
-                elif translations[discussion_page_title] == False: #There's a chance the content is a translation, and therefore not under a CC0 licence. Let's be conservative, and don't retrieve the content
-                    #if we want to retrieve any kind of contribution
-                    if args.type == "all_content": 
-                        try:                        
-                            text_list.append(get_added_content(url, contrib["revid"], args.lang))
-                            text_list.append()
-                        except:
-                            continue
-                    #if we want to retrieve only page creations (faster)
-                    elif args.type == "creation" and "new" in contrib.keys(): 
-                        revid_list.append(str(contrib["revid"]))                        
+            contribs = []
+            for contrib in my_json["query"]["usercontribs"]:
+                if str(contrib["revid"]) in processed: #already retrieved before an interruption
+                    continue
+                metrics.incr("contributions_total")
+                rule = contribution_filter(contrib)
+                if rule is not None:
+                    metrics.incr("contributions_filtered_total", rule=rule)
+                    continue
+                contribs.append(contrib)
+            #Let's double check if it's not a translation: if there's a template "translated from" in the discussion page, the extracted data is maybe not under a CC0 license.
+            #The discussion pages are checked by batches (see translations.py)
+            translated = translation_checker.check([contrib["title"] for contrib in contribs])
+        for contrib in contribs:
+            if translated[contrib["title"]]: #There's a chance the content is a translation, and therefore not under a CC0 licence. Let's be conservative, and don't retrieve the content
+                metrics.incr("contributions_filtered_total", rule="translation")
+                continue
+            #if we want to retrieve any kind of contribution
+            if args.type == "all_content" and args.pipeline:
+                revid_list.append(contrib["revid"])
+            elif args.type == "all_content": 
+                try:                        
+                    text = get_added_content(contrib["revid"], args.lang)
+                except:
+                    text = None
+                checkpoints.record(user, contrib["revid"], [(text, paragraph_context(contrib["revid"], contrib["title"]))])
+            #if we want to retrieve only page creations (faster)
+            elif args.type == "creation" and "new" in contrib.keys(): 
+                revid_list.append(str(contrib["revid"]))                        
+            elif args.type == "creation":
+                metrics.incr("contributions_filtered_total", rule="not_creation")
         #Retrieving the uccontinue value to go to the next page of contributions        
-        if "continue" in my_json.keys():
-            try:
-                uccontinue = my_json["continue"]["uccontinue"]
-            except:
-                break                        
+        if "continue" in my_json.keys() and "uccontinue" in my_json["continue"].keys():
+            uccontinue = my_json["continue"]["uccontinue"]
         else:
-            break
-    time.sleep(30) #Gives Wikimedia servers a rest
-    print("Extracting sentences")
+            state["contribs_done"] = True
+        state["uccontinue"] = uccontinue
+        checkpoints.save()
+    if args.concurrent_users <= 1:
+        time.sleep(30) #Gives Wikimedia servers a rest
+    if args.pipeline:
+        #the texts are fetched, cleaned and segmented in the background, see finish_user
+        pipeline.submit((user, licence, state), [revid for revid in revid_list if str(revid) not in processed])
+        return
     if args.type == "creation":       
-        text_list = get_article_texts(args.lang, revid_list)    
+        get_article_texts(args.lang, user, revid_list, sofar=sofar_path(user, licence))
+    write_sentences(user, licence, checkpoints.texts(user))
+    checkpoints.finish(user)
+    if os.path.isfile(sofar_path(user, licence)):
+        os.remove(sofar_path(user, licence))
+    print(user, "'s contributions retrieved")
+
+
+def record_texts(key, result):
+    """
+    Records the texts of a revision cleaned by the pipeline (see the --pipeline option) in the user's checkpoint state,
+    so that --resume doesn't retrieve it again
+    """
+    user, licence, state = key
+    #the result is a (context, result) tuple of keep_context, and the texts are listed as (text, context) tuples
+    context, cleaned = result
+    if args.type == "creation":
+        texts = [(text, dict(context, paragraph=i)) for i, text in enumerate(cleaned)]
+        revid = str(context["revid"])
     else:
-        text_list = list(filter(None, text_list))
-    extracted_sentences = list(extract_sentences(text_list,args.min_words, args.max_words,nlp=nlp))
-    print(len(extracted_sentences), "sentences retrieved")
-    if len(extracted_sentences) > 0: #If we extrated at least one sentence...
-        with open(os.path.join(args.output, "_".join([str(user), str(licence)]) + ".txt" ), "wb") as f:
-            for sentence in extracted_sentences:
-                f.write(str(sentence + " \n").encode("utf8"))
+        texts = [(cleaned, context)]
+        revid = context["revid"]
+    checkpoints.record(user, revid, texts)
+
+
+def finish_user(key):
+    """
+    Last stage of the pipeline (see the --pipeline option): writes the sentences of a user from the texts recorded by
+    record_texts, the only copy of the cleaned texts
+    """
+    user, licence, state = key
+    write_sentences(user, licence, checkpoints.texts(user))
+    checkpoints.finish(user)
     print(user, "'s contributions retrieved")
-print("Done.")
 
 
+def process_dump(reader, CC0_user_list, translated_titles):
+    """Retrieves the contributions of the users from a local dump (see the --dump option), and writes the extracted sentences."""
+    text_lists = {user: [] for user, licence in CC0_user_list}
+    for contrib in reader.iter_contributions(set(text_lists.keys()), translated_titles, args.type):
+        log(contrib.user, contrib.revid, contrib.title)
+        if args.type == "creation":
+            raw_html = wikitext_to_html("\n".join(contrib.lines))
+            if raw_html is not None:
+                text_lists[contrib.user] += [(text, paragraph_context(contrib.revid, contrib.title, i))
+                                             for i, text in enumerate(clean_article_html(raw_html, args.lang, candidates=args.lang_candidates))]
+        else:
+            text_lists[contrib.user].append((clean_added_lines(contrib.lines, args.lang, engine=args.wikitext_engine, candidates=args.lang_candidates),
+                                             paragraph_context(contrib.revid, contrib.title)))
+    for user, licence in CC0_user_list:
+        write_sentences(user, licence, [item for item in text_lists[user] if item[0]])
+        print(user, "'s contributions retrieved")
+
+
+print("Retrieving CC0 user list")
+if args.dump != None:
+    reader = DumpReader(args.dump)
+    #the first pass over the dump lists the CC0 users, and the translated articles
+    dump_users, translated_titles = reader.scan_metadata(mapping_lang_template[args.lang]["template_name"], translation_templates)
+if args.user != None:
+    CC0_user_list = [(user, "CC0") for user in args.user.split(";")]
+elif args.dump != None:
+    CC0_user_list = [(user, "CC0") for user in sorted(dump_users)]
+else:
+    #generate a list of tuples (user, licence), if later we want to retrieve other licences than CC0
+    CC0_user_list = [(user, "CC0") for user in get_user_list(args.lang, mapping_lang_template[args.lang]["template_name"])]
+print("User list retrieved")
+if args.pipeline:
+    if args.type == "creation":
+        pipeline = Pipeline(fetch_article_html, partial(keep_context, partial(clean_article_html, lang=args.lang, candidates=args.lang_candidates)),
+                            record_texts, finish_user, cleaners=cleaners)
+    else:
+        pipeline = Pipeline(fetch_added_revisions, partial(keep_context, partial(clean_added_lines, lang=args.lang, engine=args.wikitext_engine, candidates=args.lang_candidates)),
+                            record_texts, finish_user, cleaners=cleaners)
+failed_users = []
+if args.dump != None:
+    process_dump(reader, CC0_user_list, translated_titles)
+else:
+    pending_users = []
+    for user, licence in CC0_user_list:
+        if checkpoints.is_finished(user):
+            print("Skipping user", user, "(already processed)")
+            continue
+        pending_users.append((user, licence))
+    if args.concurrent_users > 1:
+        failed_users += UserCrawler(process_user, concurrency=args.concurrent_users).run(pending_users)
+    else:
+        for user, licence in pending_users:
+            try:
+                process_user(user, licence)
+            except ApiError as e:
+                print("Skipping user", user, "(API error {error})".format(error=e))
+                failed_users.append(user)
+if args.pipeline:
+    pipeline.close()
+    #the users whose texts couldn't all be fetched or cleaned aren't marked as finished (see finish_user)
+    failed_users += [user for user, licence, state in pipeline.failed]
+if failed_users:
+    print("Failed users (relaunch with --resume to retry them):", ", ".join(failed_users))
+api.close()
+if translation_store is not None:
+    translation_store.close()
+if dedup is not None:
+    dedup.close()
+if exporter is not None:
+    exporter.close()
+elif args.profile_stages:
+    metrics.export()
+print("{users} users, {sentences} sentences written, {requests} API requests ({megabytes:.1f} MB), {filtered} of {contributions} contributions filtered, {rejected} of {paragraphs} paragraphs rejected".format(
+    users=metrics.total("users_total"), sentences=metrics.total("sentences_written_total"), requests=metrics.total("api_requests_total"),
+    megabytes=metrics.total("api_response_bytes_total") / 1e6, filtered=metrics.total("contributions_filtered_total"),
+    contributions=metrics.total("contributions_total"), rejected=metrics.total("paragraphs_rejected_total"), paragraphs=metrics.total("paragraphs_total")))
+print("Done.")
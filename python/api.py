@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Shared HTTP client for the Mediawiki API.
+
+Every API call of the extractor goes through a single ApiClient, so that:
+    * TCP/TLS connections are kept alive and reused (connection pooling),
+    * responses are gzip-compressed,
+    * the number of requests in flight is capped, whatever the number of threads sending them,
+    * the request rate can be capped as well (max_rate),
+    * the failed requests, and the API errors telling us to slow down (e.g. "maxlag"), are retried,
+    * the requests, their latency and the bytes downloaded are counted per endpoint (see metrics.py).
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import query_endpoint
+from metrics import metrics
+
+API_URL = "https://{lang}.wikipedia.org/w/api.php"
+USER_AGENT = "wiki-cc0-scraper (https://github.com/techiaith/wikipedia-extractor)"
+#maximum number of revids (or titles) the API accepts in one query for non-bot users
+MAX_REVIDS_PER_QUERY = 50
+#the codes of the API errors which go away by waiting: the database servers are lagging, we are sending too many
+#requests, or the wiki is temporarily read-only
+RETRYABLE_ERRORS = ["maxlag", "ratelimited", "readonly"]
+
+
+class ApiError(Exception):
+    """Raised when the API answers a query with an error which can't be retried (e.g. an invalid parameter)"""
+
+    def __init__(self, code, info):
+        Exception.__init__(self, "{0}: {1}".format(code, info))
+        self.code = code
+        self.info = info
+
+
+def raise_for_error(response):
+    """Raises an ApiError if the response of a query (see ApiClient.post) is an API error, or missing"""
+    if response is None:
+        raise ApiError("noresponse", "the request kept failing")
+    if "error" in response:
+        raise ApiError(response["error"].get("code", "unknown"), response["error"].get("info", ""))
+
+
+def retry_delay(response, error, default):
+    """Returns the seconds to wait before retrying, as requested by the Retry-After header or by the lag of a maxlag error"""
+    delays = []
+    for value in [response.headers.get("Retry-After"), error.get("lag")]:
+        try:
+            delays.append(float(value))
+        except (TypeError, ValueError): #missing, or a date
+            pass
+    return max(delays) if delays else default
+
+
+class ApiClient(object):
+    """
+    The "lang" parameter specifies the Wikipedia version, e.g. "fr".
+    The "concurrency" parameter is the maximum number of requests in flight.
+    Failed requests, and the RETRYABLE_ERRORS, are retried "retries" times, waiting "backoff" seconds between attempts
+    (or the delay requested by the API). The other API errors are returned as is (see raise_for_error).
+    The optional "cache" parameter is a cache.ResponseCache, used for the queries targeting immutable revisions.
+    The optional "max_rate" parameter is the maximum number of requests sent per second, by all the threads together.
+    """
+
+    def __init__(self, lang, concurrency=4, retries=2, backoff=10, timeout=60, url=API_URL, cache=None, max_rate=None):
+        self.lang = lang
+        self.url = url.format(lang=lang)
+        self.cache = cache
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_rate = max_rate
+        self._next_request = 0
+        self._rate_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip",
+                                     "User-Agent": USER_AGENT})
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def post(self, query):
+        """Sends the query to the API, and returns the decoded JSON response (None if the request keeps failing, or the API keeps asking to wait)"""
+        if self.cache is not None:
+            response = self.cache.get(self.lang, query)
+            if response is not None:
+                metrics.incr("api_cache_hits_total", endpoint=query_endpoint(query))
+                return response
+        response = self._send(query)
+        if response is not None and self.cache is not None:
+            self.cache.put(self.lang, query, response)
+        return response
+
+    def _send(self, query):
+        endpoint = query_endpoint(query)
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(delay) #Let's give Wikimedia servers a rest
+            delay = self.backoff
+            with self._slots:
+                self._wait_turn()
+                metrics.incr("api_requests_total", endpoint=endpoint)
+                start = time.perf_counter()
+                response = None
+                try:
+                    response = self.session.post(self.url, data=query, timeout=self.timeout)
+                    metrics.incr("api_response_bytes_total", len(response.content), endpoint=endpoint)
+                    result = response.json()
+                    error = result.get("error") if isinstance(result, dict) else None
+                    if error is None or error.get("code") not in RETRYABLE_ERRORS:
+                        return result
+                    metrics.incr("api_errors_total", endpoint=endpoint)
+                    print("error:", self.url, query, error.get("code"), error.get("info", ""))
+                    delay = retry_delay(response, error, self.backoff)
+                except (requests.RequestException, ValueError) as e:
+                    metrics.incr("api_errors_total", endpoint=endpoint)
+                    print("error:", self.url, query, str(e))
+                    if response is not None: #e.g. an HTTP 503, which may have a Retry-After header
+                        delay = retry_delay(response, {}, self.backoff)
+                finally:
+                    metrics.observe("api_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+        return None
+
+    def _wait_turn(self):
+        """Spaces out the requests, so that at most max_rate requests are sent per second"""
+        if not self.max_rate:
+            return
+        with self._rate_lock:
+            now = time.time()
+            turn = max(now, self._next_request)
+            self._next_request = turn + 1.0 / self.max_rate
+        if turn > now:
+            time.sleep(turn - now)
+
+    def map(self, queries, fetch=None):
+        """
+        Sends the queries concurrently, and yields their responses in the same order.
+        Only a bounded window of requests is scheduled ahead, so that a slow consumer doesn't pile up responses in memory.
+        The optional "fetch" function replaces self.post, e.g. to follow the continuation of each query.
+        """
+        fetch = fetch or self.post
+        window = deque()
+        for query in queries:
+            window.append(self._executor.submit(fetch, query))
+            if len(window) >= 2 * self.concurrency:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+        if self.cache is not None:
+            print(self.cache.summary())
+            self.cache.close()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache for Mediawiki API responses.
+
+Revisions are immutable, so the responses to queries targeting a given revision (action=parse&oldid=...,
+action=compare&fromrev=..., prop=revisions&revids=...) can be stored once and reused on every later run.
+The responses are stored zlib-compressed in a SQLite database, and the least recently used ones are evicted
+when the database exceeds its size cap.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+
+
+def query_endpoint(query):
+    """Returns a short name for the API endpoint targeted by the query, e.g. "parse" or "query:revisions"."""
+    action = query.get("action", "")
+    if action == "query":
+        return "query:" + query.get("prop", query.get("list", ""))
+    return action
+
+
+def is_immutable(query):
+    """Checks if the response to the query only depends on immutable revisions, and therefore can be cached."""
+    action = query.get("action")
+    if action == "parse":
+        return "oldid" in query
+    if action == "compare":
+        return "fromrev" in query and "torelative" in query
+    if action == "query":
+        return query.get("prop") == "revisions" and "revids" in query
+    return False
+
+
+class ResponseCache(object):
+    """
+    The "path" parameter is the SQLite database file.
+    The "max_size" parameter is the maximum size of the stored (compressed) payloads, in bytes.
+    """
+
+    def __init__(self, path, max_size=1024 * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                lang TEXT,
+                                endpoint TEXT,
+                                payload BLOB,
+                                size INTEGER,
+                                accessed REAL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(lang, query):
+        serialized = json.dumps(query, sort_keys=True, default=str)
+        return lang + ":" + hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+    def get(self, lang, query):
+        """Returns the cached response to the query, or None"""
+        if not is_immutable(query):
+            return None
+        key = self.key(lang, query)
+        with self._lock:
+            row = self._db.execute("SELECT payload FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses[query_endpoint(query)] += 1
+                return None
+            self.hits[query_endpoint(query)] += 1
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, lang, query, response):
+        if not is_immutable(query) or "error" in response.keys():
+            return
+        key = self.key(lang, query)
+        payload = zlib.compress(json.dumps(response).encode("utf-8"))
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if previous is not None:
+                self._size -= previous[0]
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, lang, query_endpoint(query), sqlite3.Binary(payload), len(payload), time.time()))
+            self._size += len(payload)
+            if self._size > self.max_size:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Removes the least recently used responses until the cache fits in max_size (with 10% headroom, to avoid evicting on every insert)"""
+        target = self.max_size * 0.9
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def summary(self):
+        lines = ["Cache {path}: {size:.1f} MB".format(path=self.path, size=self._size / 1024 / 1024)]
+        for endpoint in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits[endpoint], self.misses[endpoint]
+            lines.append("  {endpoint}: {hits} hits, {misses} misses ({ratio:.0%} hit ratio)".format(
+                endpoint=endpoint, hits=hits, misses=misses, ratio=hits / (hits + misses)))
+        return "\n".join(lines)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Durable crawl state, so that an interrupted extraction can be resumed (see the --resume option).
+
+The state is a JSON file recording:
+    * the users whose output file has been written,
+    * for the user being processed: the next usercontribs continuation token, the revisions selected so far,
+      the revisions whose content has already been retrieved, and the size of the user's texts file.
+(The translation templates of the talk pages are cached in translations.TranslationStore, not here.)
+The file is replaced atomically, so a crash while saving never leaves a corrupted checkpoint behind.
+
+The retrieved texts aren't in the JSON file, which is rewritten on each save: they're appended to a JSON lines file
+per user, in the "<checkpoint>.texts" directory, and synced before the state is saved. A resumed run truncates this
+file to the size recorded in the state, i.e. drops the texts of the revisions not recorded as processed yet.
+"""
+
+import json
+import os
+import threading
+import time
+from urllib.parse import quote
+
+
+class CheckpointStore(object):
+    """
+    The "path" parameter is the JSON checkpoint file.
+    If "resume" is False, any previous state is discarded.
+    Non-forced saves are throttled to one every "interval" seconds.
+    """
+
+    def __init__(self, path, resume=False, interval=30):
+        self.path = path
+        self.texts_dir = path + ".texts"
+        self.interval = interval
+        self._last_save = 0
+        #the state may be updated and saved from several threads (see pipeline.py)
+        self._lock = threading.RLock()
+        #the open texts files, by user
+        self._texts = {}
+        self.state = {"finished": [], "users": {}}
+        if resume and os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.state.update(json.load(f))
+            self.state.pop("translations", None) #written by the former versions, now in translations.TranslationStore
+            for user, user_state in self.state["users"].items():
+                self._restore_texts(user, user_state)
+            print("Resuming from", path, ":", len(self.state["finished"]), "users already processed")
+
+    def texts_path(self, user):
+        return os.path.join(self.texts_dir, quote(user, safe="") + ".jsonl")
+
+    def _restore_texts(self, user, user_state):
+        """Drops the texts appended after the last save of an interrupted run"""
+        if "text_list" in user_state: #the former versions recorded the texts in the JSON file, sometimes without their context
+            os.makedirs(self.texts_dir, exist_ok=True)
+            with open(self.texts_path(user), "wb") as f:
+                self._write_texts(f, [(item, None) if isinstance(item, str) else item for item in user_state.pop("text_list")])
+                user_state["texts_size"] = f.tell()
+        elif os.path.isfile(self.texts_path(user)):
+            os.truncate(self.texts_path(user), user_state["texts_size"])
+
+    def is_finished(self, user):
+        return user in self.state["finished"]
+
+    def user_state(self, user):
+        """Returns the (mutable) state of a user, creating an empty one if the user wasn't started yet"""
+        with self._lock:
+            if user not in self.state["users"]:
+                #the texts file of a former run, not resumed
+                if os.path.isfile(self.texts_path(user)):
+                    os.remove(self.texts_path(user))
+                self.state["users"][user] = {"uccontinue": None,
+                                             "contribs_done": False,
+                                             "revid_list": [],
+                                             "processed": [],
+                                             "texts_size": 0}
+            return self.state["users"][user]
+
+    def record(self, user, revid, texts):
+        """
+        Records the (text, context) tuples retrieved for a revision of a user (the empty texts are skipped), e.g. from
+        another thread, and saves the state if the last save is old enough
+        """
+        with self._lock:
+            f = self._texts.get(user)
+            if f is None:
+                os.makedirs(self.texts_dir, exist_ok=True)
+                f = self._texts[user] = open(self.texts_path(user), "ab")
+            self._write_texts(f, texts)
+            self.state["users"][user]["processed"].append(revid)
+            self.save(force=False)
+
+    @staticmethod
+    def _write_texts(f, texts):
+        for text, context in texts:
+            if text:
+                f.write((json.dumps([text, context], ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def texts(self, user):
+        """Yields the (text, context) tuples recorded for a user, in order"""
+        with self._lock:
+            if user in self._texts:
+                self._texts[user].flush()
+        if not os.path.isfile(self.texts_path(user)):
+            return
+        with open(self.texts_path(user), "r", encoding="utf-8") as f:
+            for line in f:
+                text, context = json.loads(line)
+                yield text, context
+
+    def finish(self, user):
+        with self._lock:
+            if user in self._texts:
+                self._texts.pop(user).close()
+            self.state["users"].pop(user, None)
+            if user not in self.state["finished"]:
+                self.state["finished"].append(user)
+            self.save()
+            if os.path.isfile(self.texts_path(user)):
+                os.remove(self.texts_path(user))
+
+    def save(self, force=True):
+        with self._lock:
+            if not force and time.time() - self._last_save < self.interval:
+                return
+            #the texts must be on disk before the state saying they are
+            for user, f in self._texts.items():
+                f.flush()
+                os.fsync(f.fileno())
+                self.state["users"][user]["texts_size"] = f.tell()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._last_save = time.time()
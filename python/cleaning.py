@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Text cleaning of the retrieved Wikipedia content: from rendered html or wikitext to clean paragraphs.
+
+These functions don't depend on the command line arguments or on the API client, so that they can run
+in worker processes (see pipeline.py).
+"""
+
+import re
+from collections import Counter
+from lxml import html
+from utils import filter_numbers
+from normalize import get_normalizer, get_abbreviation_normalizer
+from wikitext import convert, wikitext_to_plain_batch
+from langident import get_language_filter
+from metrics import metrics
+from lazy import lazy_import
+#only needed by wikitext_to_html
+pypandoc = lazy_import("pypandoc")
+
+#from https://github.com/rcompton/ryancompton.net/blob/master/assets/praw_drugs/urlmarker.py
+WEB_URL_REGEX = r"""(?i)\b((?:https?:(?:/{1,3}|[a-z0-9%])|[a-z0-9.\-]+[.](?:com|net|org|edu|gov|mil|aero|asia|biz|cat|coop|info|int|jobs|mobi|museum|name|post|pro|tel|travel|xxx|ac|ad|ae|af|ag|ai|al|am|an|ao|aq|ar|as|at|au|aw|ax|az|ba|bb|bd|be|bf|bg|bh|bi|bj|bm|bn|bo|br|bs|bt|bv|bw|by|bz|ca|cc|cd|cf|cg|ch|ci|ck|cl|cm|cn|co|cr|cs|cu|cv|cx|cy|cz|dd|de|dj|dk|dm|do|dz|ec|ee|eg|eh|er|es|et|eu|fi|fj|fk|fm|fo|fr|ga|gb|gd|ge|gf|gg|gh|gi|gl|gm|gn|gp|gq|gr|gs|gt|gu|gw|gy|hk|hm|hn|hr|ht|hu|id|ie|il|im|in|io|iq|ir|is|it|je|jm|jo|jp|ke|kg|kh|ki|km|kn|kp|kr|kw|ky|kz|la|lb|lc|li|lk|lr|ls|lt|lu|lv|ly|ma|mc|md|me|mg|mh|mk|ml|mm|mn|mo|mp|mq|mr|ms|mt|mu|mv|mw|mx|my|mz|na|nc|ne|nf|ng|ni|nl|no|np|nr|nu|nz|om|pa|pe|pf|pg|ph|pk|pl|pm|pn|pr|ps|pt|pw|py|qa|re|ro|rs|ru|rw|sa|sb|sc|sd|se|sg|sh|si|sj|Ja|sk|sl|sm|sn|so|sr|ss|st|su|sv|sx|sy|sz|tc|td|tf|tg|th|tj|tk|tl|tm|tn|to|tp|tr|tt|tv|tw|tz|ua|ug|uk|us|uy|uz|va|vc|ve|vg|vi|vn|vu|wf|ws|ye|yt|yu|za|zm|zw)/)(?:[^\s()<>{}\[\]]+|\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\))+(?:\([^\s()]*?\([^\s()]+\)[^\s()]*?\)|\([^\s]+?\)|[^\s`!()\[\]{};:'".,<>?«»“”‘’])|(?:(?<!@)[a-z0-9]+(?:[.\-][a-z0-9]+)*[.](?:com|net|org|edu|gov|mil|aero|asia|biz|cat|coop|info|int|jobs|mobi|museum|name|post|pro|tel|travel|xxx|ac|ad|ae|af|ag|ai|al|am|an|ao|aq|ar|as|at|au|aw|ax|az|ba|bb|bd|be|bf|bg|bh|bi|bj|bm|bn|bo|br|bs|bt|bv|bw|by|bz|ca|cc|cd|cf|cg|ch|ci|ck|cl|cm|cn|co|cr|cs|cu|cv|cx|cy|cz|dd|de|dj|dk|dm|do|dz|ec|ee|eg|eh|er|es|et|eu|fi|fj|fk|fm|fo|fr|ga|gb|gd|ge|gf|gg|gh|gi|gl|gm|gn|gp|gq|gr|gs|gt|gu|gw|gy|hk|hm|hn|hr|ht|hu|id|ie|il|im|in|io|iq|ir|is|it|je|jm|jo|jp|ke|kg|kh|ki|km|kn|kp|kr|kw|ky|kz|la|lb|lc|li|lk|lr|ls|lt|lu|lv|ly|ma|mc|md|me|mg|mh|mk|ml|mm|mn|mo|mp|mq|mr|ms|mt|mu|mv|mw|mx|my|mz|na|nc|ne|nf|ng|ni|nl|no|np|nr|nu|nz|om|pa|pe|pf|pg|ph|pk|pl|pm|pn|pr|ps|pt|pw|py|qa|re|ro|rs|ru|rw|sa|sb|sc|sd|se|sg|sh|si|sj|Ja|sk|sl|sm|sn|so|sr|ss|st|su|sv|sx|sy|sz|tc|td|tf|tg|th|tj|tk|tl|tm|tn|to|tp|tr|tt|tv|tw|tz|ua|ug|uk|us|uy|uz|va|vc|ve|vg|vi|vn|vu|wf|ws|ye|yt|yu|za|zm|zw)\b/?(?!@)))"""
+
+def is_garbage(sentence, lang_code):
+    #To avoidspam on Common Voice
+    if len(re.findall(WEB_URL_REGEX,sentence)) > 0:
+        return True
+    #to check if the sentence is in the correct language
+    
+    #check if the sentence isn't an artifact from Wikipedia templates and other maintenance stuff
+    for garbage in ["Fichier:", "Image:", "File:", "Catégorie:", "|", "!!"]:
+        if garbage in sentence:
+            return True
+    return False
+
+
+def convert_abbreviations(text, lang_code):
+    """Converts the coordinates and measure units of a text to words (the rules are compiled once per language, see normalize.py)"""
+    return get_abbreviation_normalizer(lang_code)(text)
+
+
+def clean_article_html(raw_html, lang, candidates=None):
+    """Returns the list of clean paragraphs of a rendered article revision.
+    The "lang" parameter specifies the Wikipedia version, e.g. "fr"
+    The "candidates" parameter is the list of languages scored by the language identification (see langident.py)
+    """
+    text_list = []
+    rejected = Counter()
+    normalizer = get_normalizer(lang, kind="article")
+    document = html.document_fromstring(raw_html)
+    all_p = document.xpath("//p")
+    for p in all_p:
+        text = p.text_content()
+        #non-breaking spaces, content between parentheses, spaces between thousand units, and references (see normalize.py)
+        text = normalizer(text)
+        text = text.strip()
+
+        if "\n" in text or is_garbage(text, lang) == True:                
+            rejected["garbage"] += 1
+            continue
+
+        if len(text.split()) > 3:
+            #TODO: check content spelling
+            text_list.append(text)
+        else:
+            rejected["length"] += 1
+    #the language of the paragraphs is checked all at once
+    verdicts = get_language_filter(lang, candidates).accepts_batch(text_list)
+    rejected["language"] = verdicts.count(False)
+    metrics.incr("paragraphs_total", len(all_p))
+    for reason, count in rejected.items():
+        metrics.incr("paragraphs_rejected_total", count, reason=reason)
+    return [text for text, verdict in zip(text_list, verdicts) if verdict]
+
+
+def added_lines_from_diff(raw_html):
+    """
+    Returns the lines of wikitext added by a revision, from the html diff table of action=compare,
+    or None if the revision is a redirection.
+    """
+    document = html.document_fromstring(raw_html)
+    added_lines = document.xpath("//td[@class='diff-addedline']")
+    lines = []
+    for td in added_lines:
+        for div in td:
+            if len(div.getchildren()) > 0: #if there are children tags, it's because this is an inline modification, and not an addition -> skip it                
+                continue
+            else:
+                text = div.text_content()
+                if "#REDIRECT" in text:  
+                    return None
+                lines.append(text)
+    return lines
+
+
+#the references of the wikitext: pandoc converts them to footnotes, whose numbers would be glued to the paragraphs' text
+REFERENCE_REGEX = re.compile(r"<ref[^>]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+
+
+def wikitext_to_html(wikitext):
+    """Converts the wikitext of a whole article to html, so that it can be cleaned like the html rendered by the API"""
+    wikitext = REFERENCE_REGEX.sub("", wikitext)
+    try:
+        #without --wrap=none, pandoc wraps the paragraphs at 72 columns, and clean_article_html rejects the paragraphs with line breaks
+        return pypandoc.convert_text(wikitext, to="html", format="mediawiki", extra_args=["--wrap=none"])
+    except:
+        return None #if pandoc cannot convert wikicode, there's a problem, and we don't want to retrieve malformed text
+
+
+def clean_added_line(text, lang, engine="native", plain=None, candidates=None):
+    """
+    Converts a line of wikitext added by the contributor to clean plain text.
+    Returns None if the line isn't relevant (e.g. too short, in another language, or an artifact from Wikipedia templates).
+    The "lang" parameter specifies the code of the processed language (e.g. "en", "fr", etc.)
+    The "engine" parameter is the wikitext converter (see wikitext.py). "plain" is the line already converted, if any.
+    The "candidates" parameter is the list of languages scored by the language identification (see langident.py)
+    """
+    metrics.incr("paragraphs_total")
+    try:       
+        #TODO: convert scales (1/25000, etc.)
+        if plain is None:
+            plain = convert(text, engine=engine)
+        if plain is None:
+            metrics.incr("paragraphs_rejected_total", reason="wikitext")
+            return None
+        #TODO: add cleaning up of (), [], etc.
+        #non-breaking spaces, content between parentheses, abbreviations, roman numbers, punctuation, spaces between
+        #thousand units, and references, in a few compiled passes (see normalize.py)
+        text = get_normalizer(lang)(plain)
+        if not get_language_filter(lang, candidates).accepts(text):
+            metrics.incr("paragraphs_rejected_total", reason="language")
+            return None
+        #Transforming numbers in letters
+        try:
+            text = filter_numbers(text, lang=lang)
+        except:
+            pass
+        text = text.strip()
+        if is_garbage(text, lang) == True:
+            metrics.incr("paragraphs_rejected_total", reason="garbage")
+            return None
+    except:
+        metrics.incr("paragraphs_rejected_total", reason="error")
+        return None
+    if len(text.split()) > 3: #Let's not retrieve too short text
+        return text
+    metrics.incr("paragraphs_rejected_total", reason="length")
+    return None
+
+
+def clean_added_lines(lines, lang, engine="native", candidates=None):
+    """Converts the lines of wikitext added by a contributor to clean plain text, and joins the relevant ones."""
+    if engine == "native":
+        text_list = [clean_added_line(line, lang, plain=plain, candidates=candidates) for line, plain in zip(lines, wikitext_to_plain_batch(lines))]
+    else:
+        text_list = [clean_added_line(line, lang, engine=engine, candidates=candidates) for line in lines]
+    return " ".join(text for text in text_list if text is not None)
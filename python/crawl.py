@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent crawl of the CC0 users (see the --concurrent-users option).
+
+Each user is processed in a thread of its own, listing the user's contributions, filtering them and fetching their
+texts, independently of the other users. At most "concurrency" users are processed at the same time: the number of
+threads of the executor is the only limit. All the threads share the same api.ApiClient, so the number of requests in
+flight (--concurrency) and the request rate (--max-rate) are global budgets, whatever the number of users being
+processed.
+"""
+
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class UserCrawler(object):
+    """
+    The "process" function takes a user and a licence, and writes the sentences of the user.
+    The "concurrency" parameter is the maximum number of users processed at the same time.
+    """
+
+    def __init__(self, process, concurrency=4):
+        self.process = process
+        self.concurrency = concurrency
+        self.failed = []
+
+    def run(self, users):
+        """Processes the (user, licence) tuples, and returns the list of the users whose processing failed"""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self.process, user, licence): user for user, licence in users}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception:
+                    #a failing user doesn't stop the others. It isn't marked as finished, so --resume retries it.
+                    traceback.print_exc()
+                    self.failed.append(futures[future])
+        return self.failed
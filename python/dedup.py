@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent index of the sentences already written, shared by the users and the runs of the extractor, or of Validate.py
+(see their --dedup-index option), so that a sentence is only sent once to Common Voice. The extractor and Validate.py
+need their own index: the sentences the extractor wrote would otherwise all be duplicates for Validate.py.
+
+The sentences are not stored, only a 64-bit fingerprint of each of them:
+    * the fingerprint is computed on a normalized form of the sentence (lower case, without punctuation, and with
+      single spaces), so that the sentences only differing by their whitespace or punctuation are duplicates,
+    * the fingerprints are kept in a sorted array of uint64 on disk, memory-mapped and searched by bisection,
+    * the new fingerprints are kept in memory, and appended to a log file when the index is flushed. Once there are
+      more than "buffer_size" of them, they are merged into the sorted array, chunk by chunk,
+    * the fingerprints may be added in a transaction (see begin): they are then only recorded in the index once
+      committed, e.g. once the output file of the sentences is complete, and discarded if the file is aborted.
+So the memory used is bounded by the buffer, whatever the number of sentences (8 bytes per sentence on disk, e.g.
+80 MB for 10 million sentences).
+
+The optional near-duplicate detection (see NearDuplicateIndex) uses MinHash signatures of the character shingles of
+the sentences, with locality-sensitive hashing: a sentence is a near-duplicate if one of its bands of the signature
+was already seen, i.e. it likely shares more than about 60% of its shingles with a previous sentence.
+"""
+
+import hashlib
+import os
+import re
+import unicodedata
+import zlib
+
+from lazy import lazy_import
+np = lazy_import("numpy")
+
+PUNCTUATION_REGEX = re.compile(r"[^\w\s]+")
+SPACES_REGEX = re.compile(r"\s+")
+
+
+def normalize_sentence(sentence):
+    """Returns the form of a sentence used for the deduplication: lower case, without punctuation, single spaces"""
+    sentence = unicodedata.normalize("NFC", sentence).casefold()
+    sentence = PUNCTUATION_REGEX.sub(" ", sentence)
+    return SPACES_REGEX.sub(" ", sentence).strip()
+
+
+def fingerprint(text):
+    """Returns the 64-bit fingerprint of a text"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class FingerprintIndex(object):
+    """
+    A persistent set of 64-bit fingerprints. The "path" parameter is the sorted array, and "path.log" the log of the
+    fingerprints added since the last merge.
+    At most "buffer_size" fingerprints are kept in memory before being merged into the sorted array, by chunks of
+    "chunk_size" fingerprints.
+    """
+
+    def __init__(self, path, buffer_size=500000, chunk_size=1048576):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.chunk_size = chunk_size
+        self._sorted = None
+        self._buffer = set()
+        self._logged = set()
+        self._pending = None #the fingerprints of the transaction in progress, if any
+        self._load()
+
+    def _load(self):
+        if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+            self._sorted = np.memmap(self.path, dtype="<u8", mode="r")
+        else:
+            self._sorted = np.zeros(0, dtype="<u8")
+        if os.path.isfile(self.path + ".log"):
+            log = np.fromfile(self.path + ".log", dtype="<u8")
+            self._buffer.update(int(value) for value in log)
+            self._logged = set(self._buffer)
+
+    def __len__(self):
+        return len(self._sorted) + len(self._buffer) + len(self._pending or ())
+
+    def __contains__(self, value):
+        if value in self._buffer or (self._pending is not None and value in self._pending):
+            return True
+        i = np.searchsorted(self._sorted, np.uint64(value))
+        return bool(i < len(self._sorted) and self._sorted[i] == value)
+
+    def add(self, value):
+        """Adds a fingerprint, and returns False if it was already in the index"""
+        if value in self:
+            return False
+        if self._pending is not None:
+            self._pending.add(value)
+            return True
+        self._buffer.add(value)
+        if len(self._buffer) >= self.buffer_size:
+            self.merge()
+        return True
+
+    def begin(self):
+        """Starts a transaction: the fingerprints added until commit or rollback are neither flushed nor merged"""
+        self._pending = set()
+
+    def commit(self):
+        """Records the fingerprints added since begin in the index"""
+        if self._pending is None:
+            return
+        self._buffer.update(self._pending)
+        self._pending = None
+        if len(self._buffer) >= self.buffer_size:
+            self.merge()
+
+    def rollback(self):
+        """Discards the fingerprints added since begin"""
+        self._pending = None
+
+    def flush(self):
+        """Appends the fingerprints added since the last flush to the log, so that they survive the process"""
+        new = self._buffer - self._logged
+        if not new:
+            return
+        with open(self.path + ".log", "ab") as f:
+            np.array(sorted(new), dtype="<u8").tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        self._logged.update(new)
+
+    def merge(self):
+        """
+        Merges the fingerprints in memory into the sorted array, which is replaced atomically.
+        The sorted array is read chunk by chunk, so that it's never loaded in memory as a whole.
+        """
+        if not self._buffer:
+            return
+        buffer = np.array(sorted(self._buffer), dtype="<u8")
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            start = 0 #the first fingerprint of the buffer not written yet
+            for offset in range(0, len(self._sorted), self.chunk_size):
+                chunk = np.asarray(self._sorted[offset:offset + self.chunk_size])
+                #the fingerprints of the buffer up to the last one of the chunk (a fingerprint of the log may already
+                #be in the array, if a former merge was interrupted before removing the log)
+                end = int(np.searchsorted(buffer, chunk[-1], side="right"))
+                np.union1d(chunk, buffer[start:end]).astype("<u8").tofile(f)
+                start = end
+            buffer[start:].tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        self._sorted = None #closes the memory map before replacing its file
+        os.replace(tmp_path, self.path)
+        if os.path.isfile(self.path + ".log"):
+            os.remove(self.path + ".log")
+        self._buffer = set()
+        self._logged = set()
+        self._sorted = np.memmap(self.path, dtype="<u8", mode="r")
+
+    def close(self):
+        self.flush()
+
+
+class NearDuplicateIndex(object):
+    """
+    MinHash near-duplicate detection, with "bands" bands of "rows" hash functions, on the character shingles of
+    "shingle_size" characters of the normalized sentences. The band keys are kept in a FingerprintIndex at "path".
+    """
+
+    def __init__(self, path, bands=8, rows=4, shingle_size=5, buffer_size=500000, seed=1):
+        self.bands = bands
+        self.rows = rows
+        self.shingle_size = shingle_size
+        self.keys = FingerprintIndex(path, buffer_size=buffer_size)
+        #the hash functions (a * x + b) mod PRIME, with a < 2^31 so that the products fit in 64 bits
+        self.prime = 4294967311
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 31, size=bands * rows).astype(np.uint64)
+        self._b = rng.randint(0, 2 ** 31, size=bands * rows).astype(np.uint64)
+
+    def shingles(self, text):
+        if len(text) <= self.shingle_size:
+            return {text}
+        return {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+
+    def signature(self, text):
+        """Returns the MinHash signature of a normalized text (an array of bands * rows values)"""
+        hashes = np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in self.shingles(text)], dtype=np.uint64)
+        return ((np.outer(hashes, self._a) + self._b) % np.uint64(self.prime)).min(axis=0)
+
+    def band_keys(self, text):
+        signature = self.signature(text).reshape(self.bands, self.rows)
+        return [fingerprint("{0}:{1}".format(band, ",".join(str(value) for value in values)))
+                for band, values in enumerate(signature)]
+
+    def add(self, text):
+        """Adds a normalized text, and returns False if it's a near-duplicate of a text already in the index"""
+        keys = self.band_keys(text)
+        seen = any(key in self.keys for key in keys)
+        for key in keys:
+            self.keys.add(key)
+        return not seen
+
+    def begin(self):
+        self.keys.begin()
+
+    def commit(self):
+        self.keys.commit()
+
+    def rollback(self):
+        self.keys.rollback()
+
+    def flush(self):
+        self.keys.flush()
+
+    def close(self):
+        self.keys.close()
+
+
+class DedupIndex(object):
+    """
+    The sentence index, stored in "path" (and "path.near" for the near-duplicate detection, if "near_duplicates").
+    """
+
+    def __init__(self, path, near_duplicates=False, buffer_size=500000):
+        self.exact = FingerprintIndex(path, buffer_size=buffer_size)
+        self.near = NearDuplicateIndex(path + ".near", buffer_size=buffer_size) if near_duplicates else None
+
+    def __contains__(self, sentence):
+        return fingerprint(normalize_sentence(sentence)) in self.exact
+
+    def add(self, sentence):
+        """Adds a sentence, and returns None if it's new, or the reason why it's rejected: "DUPLICATE" or "NEAR DUPLICATE" """
+        normalized = normalize_sentence(sentence)
+        value = fingerprint(normalized)
+        if value in self.exact:
+            return "DUPLICATE"
+        if self.near is not None and not self.near.add(normalized):
+            return "NEAR DUPLICATE"
+        self.exact.add(value)
+        return None
+
+    def begin(self):
+        """Starts a transaction, see FingerprintIndex.begin"""
+        self.exact.begin()
+        if self.near is not None:
+            self.near.begin()
+
+    def commit(self):
+        self.exact.commit()
+        if self.near is not None:
+            self.near.commit()
+
+    def rollback(self):
+        self.exact.rollback()
+        if self.near is not None:
+            self.near.rollback()
+
+    def flush(self):
+        self.exact.flush()
+        if self.near is not None:
+            self.near.flush()
+
+    def close(self):
+        self.exact.close()
+        if self.near is not None:
+            self.near.close()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Offline input backend: reads the contributions of CC0 users from a local "pages-meta-history" XML dump
+(e.g. cywiki-latest-pages-meta-history.xml.bz2, from https://dumps.wikimedia.org/), instead of the Mediawiki API.
+
+The dump is streamed with an incremental parser: only the revision being read and the text of the previous
+revision of the current page are kept in memory, whatever the size of the dump.
+
+The dump is read twice:
+    * a first pass lists the users using the CC0 template on their user page, and the talk pages using a
+      translation template (see Wikipedia_CC0.translation_templates),
+    * a second pass yields the contributions of these users to the articles which aren't translations.
+"""
+
+import bz2
+import gzip
+import re
+from collections import namedtuple
+from difflib import SequenceMatcher
+
+from lxml import etree
+
+REDIRECT_REGEX = re.compile(r"^\s*#\s*REDIRECT", re.IGNORECASE)
+
+#"lines" is the list of wikitext lines added by the contributor. For a page creation, it's the whole page.
+Contribution = namedtuple("Contribution", ["user", "revid", "title", "lines", "new"])
+
+
+def localname(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def template_regex(template_name):
+    """Returns a regex matching the use of a template in wikitext, e.g. "Modèle:Utilisateur_CC0" matches "{{utilisateur CC0}}"."""
+    name = template_name.split(":", 1)[-1]
+    parts = [re.escape(part) for part in re.split("[ _]", name[1:])]
+    first = "[" + re.escape(name[0].upper()) + re.escape(name[0].lower()) + "]"
+    return re.compile(r"\{\{\s*(?:[^{}|:]*:)?" + first + "[ _]".join(parts) + r"\s*[|}]")
+
+
+class DumpReader(object):
+    """
+    The "path" parameter is the dump file, compressed (.bz2, .gz) or not.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _open(self):
+        if self.path.endswith(".bz2"):
+            return bz2.open(self.path, "rb")
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, "rb")
+        return open(self.path, "rb")
+
+    def iter_revisions(self):
+        """Yields (page, revision) tuples of dictionaries, in the dump's order (i.e. chronologically within each page)."""
+        page = None
+        with self._open() as f:
+            for event, elem in etree.iterparse(f, events=("end",), huge_tree=True):
+                tag = localname(elem.tag)
+                parent = elem.getparent()
+                if tag in ("title", "ns", "id") and parent is not None and localname(parent.tag) == "page":
+                    if tag == "title":
+                        page = {"title": elem.text, "ns": None, "id": None}
+                    else:
+                        page[tag] = int(elem.text)
+                elif tag == "revision":
+                    revision = {"id": None, "parentid": None, "username": None, "minor": False,
+                                "comment": "", "text": "", "sha1": None}
+                    for child in elem:
+                        name = localname(child.tag)
+                        if name in ("id", "parentid"):
+                            revision[name] = int(child.text)
+                        elif name == "contributor":
+                            for field in child:
+                                if localname(field.tag) == "username":
+                                    revision["username"] = field.text
+                        elif name == "minor":
+                            revision["minor"] = True
+                        elif name in ("comment", "text", "sha1"):
+                            revision[name] = child.text or ""
+                    yield page, revision
+                    self._release(elem)
+                elif tag == "page":
+                    self._release(elem)
+
+    @staticmethod
+    def _release(elem):
+        """Frees the memory used by an element already processed, and by its preceding siblings"""
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+
+    def scan_metadata(self, user_template, translation_templates):
+        """
+        First pass over the dump.
+        Returns the set of users using the "user_template" template on their user page,
+        and the set of the titles of articles whose talk page uses one of the "translation_templates".
+        """
+        user_regex = template_regex(user_template)
+        users = set()
+        translated_titles = set()
+        last = {}
+        for page, revision in self.iter_revisions():
+            if page["ns"] not in (1, 2):
+                continue
+            if last and last["page"] is not page:
+                self._check_page(last, user_regex, translation_templates, users, translated_titles)
+            last = {"page": page, "text": revision["text"]}
+        if last:
+            self._check_page(last, user_regex, translation_templates, users, translated_titles)
+        return users, translated_titles
+
+    @staticmethod
+    def _check_page(last, user_regex, translation_templates, users, translated_titles):
+        """Checks the latest revision of a user page or a talk page"""
+        page, text = last["page"], last["text"]
+        name = page["title"].split(":", 1)[-1]
+        if page["ns"] == 2 and user_regex.search(text) and "/" not in name: #if there's a slash, the template in embedded in a subpage
+            users.add(name)
+        elif page["ns"] == 1:
+            for template_name in translation_templates:
+                if "{{" + template_name in text:
+                    translated_titles.add(name)
+
+    def iter_contributions(self, users, translated_titles, content_type="creation"):
+        """
+        Second pass over the dump.
+        Yields a Contribution for each relevant revision of the "users" in the main namespace: page creations only
+        if "content_type" is "creation", or any line the users added if it's "all_content".
+        Minor edits, redirections, reverts, revisions shrinking the page, and articles in "translated_titles" are excluded.
+        """
+        page = None
+        previous_text = ""
+        seen_sha1 = set()
+        for current_page, revision in self.iter_revisions():
+            if current_page["ns"] != 0:
+                continue
+            if current_page is not page:
+                page = current_page
+                previous_text = ""
+                seen_sha1 = set()
+            text = revision["text"]
+            is_new = revision["parentid"] is None or not seen_sha1
+            #a revision identical to a previous one is a revert
+            is_revert = revision["sha1"] in seen_sha1
+            seen_sha1.add(revision["sha1"])
+            if (revision["username"] in users
+                    and page["title"] not in translated_titles
+                    and not revision["minor"]
+                    and not is_revert
+                    and "redirect" not in revision["comment"]
+                    and not REDIRECT_REGEX.match(text)
+                    and (content_type != "creation" or is_new)
+                    and len(text) >= len(previous_text)):
+                if is_new:
+                    lines = text.splitlines()
+                else:
+                    lines = added_lines(previous_text, text)
+                if lines:
+                    yield Contribution(revision["username"], revision["id"], page["title"], lines, is_new)
+            previous_text = text
+
+
+def added_lines(previous_text, text):
+    """Returns the lines added between two versions of a wikitext, ignoring the modified lines (like the "diff-addedline" cells of action=compare)"""
+    previous_lines = previous_text.splitlines()
+    lines = text.splitlines()
+    added = []
+    for opcode, _, _, start, end in SequenceMatcher(None, previous_lines, lines, autojunk=False).get_opcodes():
+        if opcode == "insert":
+            added += lines[start:end]
+    return [line for line in added if line.strip()]
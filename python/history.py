@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Revision history of the pages, used to detect the reverts in the all_content mode.
+
+The history of a page is fetched once (ids, parent, size, sha1 and tags of every revision), and reused for all the
+revisions of the user on that page, instead of listing the page's revisions again for each revision. Checking a
+revision is then a dictionary lookup: a revision is a revert if it's tagged as such, or if its content (sha1) is
+the content of an earlier revision of the page.
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+#tags set by Mediawiki on the reverts ("mw-manual-revert" since Mediawiki 1.36)
+REVERT_TAGS = {"mw-rollback", "mw-undo", "mw-manual-revert"}
+
+#"sha1" is None if the content of the revision is hidden
+Revision = namedtuple("Revision", ["revid", "parentid", "size", "sha1", "tags"])
+
+
+class PageHistory(object):
+    """The "revisions" parameter lists the revisions of the page, the oldest first"""
+
+    def __init__(self, title, revisions):
+        self.title = title
+        self.revisions = {}
+        self._position = {}
+        #position of the first revision having each content
+        self._first_seen = {}
+        for position, revision in enumerate(revisions):
+            self.revisions[revision.revid] = revision
+            self._position[revision.revid] = position
+            if revision.sha1 is not None:
+                self._first_seen.setdefault(revision.sha1, position)
+
+    def __contains__(self, revid):
+        return revid in self.revisions
+
+    def __len__(self):
+        return len(self.revisions)
+
+    def is_revert(self, revid):
+        """
+        Returns True if the revision is a revert, i.e. it's tagged as a revert, or it restores the content of an earlier
+        revision. A revision whose content is hidden is considered a revert (let's be conservative).
+        """
+        revision = self.revisions[revid]
+        if REVERT_TAGS.intersection(revision.tags):
+            return True
+        if revision.sha1 is None:
+            return True
+        return self._first_seen[revision.sha1] < self._position[revid]
+
+    def parent_size(self, revid):
+        """Returns the size of the previous revision, or None for the first revision of the page"""
+        parent = self.revisions.get(self.revisions[revid].parentid)
+        return parent.size if parent is not None else None
+
+
+def to_revision(entry):
+    """Converts a revision of a prop=revisions response"""
+    return Revision(entry["revid"], entry.get("parentid", 0), entry.get("size", 0), entry.get("sha1"), entry.get("tags", []))
+
+
+def fetch_history(api, title):
+    """Returns the PageHistory of a page, fetched through the API (an api.ApiClient), or None if a request failed"""
+    query = {"action":"query", "prop":"revisions", "titles":title,
+             "rvprop":"ids|size|sha1|tags", "rvlimit":"max", "rvdir":"newer",
+             "format":"json"}
+    revisions = []
+    rvcontinue = None
+    while True:
+        if rvcontinue is not None:
+            query["rvcontinue"] = rvcontinue
+        response = api.post(dict(query))
+        if response is None or "query" not in response:
+            return None
+        for page in response["query"]["pages"].values():
+            revisions += [to_revision(entry) for entry in page.get("revisions", [])]
+        if "continue" in response and "rvcontinue" in response["continue"]:
+            rvcontinue = response["continue"]["rvcontinue"]
+        else:
+            break
+    return PageHistory(title, revisions)
+
+
+class HistoryIndex(object):
+    """
+    The histories of the pages, each fetched once through "api" (an api.ApiClient) and kept for the following revisions.
+    At most "max_pages" histories are kept, the least recently used being dropped.
+    """
+
+    def __init__(self, api, max_pages=1000):
+        self.api = api
+        self.max_pages = max_pages
+        self.fetches = 0
+        self._histories = OrderedDict()
+        #the revisions are checked from several threads (see ApiClient.map): a page is only fetched by one of them
+        self._lock = threading.Lock()
+        self._page_locks = {}
+
+    def history(self, title, revid=None):
+        """
+        Returns the PageHistory of a page, or None if it couldn't be fetched.
+        If "revid" isn't in the kept history (the page was edited since), the history is fetched again.
+        """
+        with self._lock:
+            page_lock = self._page_locks.setdefault(title, threading.Lock())
+        with page_lock:
+            with self._lock:
+                history = self._histories.get(title)
+            if history is None or (revid is not None and revid not in history):
+                history = fetch_history(self.api, title)
+                self.fetches += 1
+                if history is None:
+                    return None
+            with self._lock:
+                self._histories[title] = history
+                self._histories.move_to_end(title)
+                if len(self._histories) > self.max_pages:
+                    dropped, _ = self._histories.popitem(last=False)
+                    self._page_locks.pop(dropped, None)
+        return history
+
+    def is_revert(self, title, revid):
+        """Returns True if the revision is a revert (see PageHistory.is_revert), or if the history couldn't be fetched"""
+        history = self.history(title, revid)
+        if history is None or revid not in history:
+            return True
+        return history.is_revert(revid)
+
+    def clear(self):
+        with self._lock:
+            self._histories.clear()
+            self._page_locks.clear()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Language identification of the paragraphs: checks whether a text is in the processed language.
+
+Compared to calling langid.classify on each paragraph:
+    * the model only scores a small set of candidate languages (the processed language, and the languages its
+      paragraphs may be confused with, or quoted in), instead of the 97 languages of langid,
+    * the first characters of a long text are classified first, and the rest is only read when that verdict isn't
+      decisive (langid's cost is proportional to the length of the text),
+    * the verdicts are cached, for the strings repeated across revisions and users,
+    * a batch of texts is scored with a single matrix product.
+"""
+
+import threading
+from collections import OrderedDict
+
+from lazy import lazy_import
+#the model of langid is decoded on import, which takes a while: it's only imported by the first LanguageFilter
+np = lazy_import("numpy")
+langid_module = lazy_import("langid.langid")
+
+#the languages scored for each processed language. The other languages use DEFAULT_CANDIDATES.
+LANGUAGE_CANDIDATES = {"fr": ["fr", "en", "de", "es", "it", "pt", "nl", "ca", "oc", "br", "la"],
+                       "en": ["en", "fr", "de", "es", "it", "pt", "nl", "cy", "ga", "la"],
+                       "cy": ["cy", "en", "ga", "br", "fr", "de", "la"]}
+DEFAULT_CANDIDATES = ["en", "fr", "de", "es", "it", "pt", "la"]
+
+
+def candidate_languages(lang, candidates=None):
+    """Returns the candidate set of a language, always including the language itself"""
+    if candidates is None:
+        candidates = LANGUAGE_CANDIDATES.get(lang, DEFAULT_CANDIDATES)
+    return [lang] + [candidate for candidate in candidates if candidate != lang]
+
+
+class LanguageFilter(object):
+    """
+    The "lang" parameter is the processed language, and "candidates" the languages scored by the model
+    (see LANGUAGE_CANDIDATES).
+    A text longer than 2 * "prefix_size" characters is first classified on its first "prefix_size" characters,
+    and accepted or rejected right away if the probability of the best language is at least "confidence".
+    At most "cache_size" verdicts are kept.
+    """
+
+    def __init__(self, lang, candidates=None, prefix_size=200, confidence=0.9999, cache_size=100000):
+        self.lang = lang
+        self.prefix_size = prefix_size
+        self.confidence = confidence
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        #the filter may be shared by the threads processing several users (see crawl.py)
+        self._lock = threading.Lock()
+        self.shortcuts = 0
+        self.identifier = langid_module.LanguageIdentifier.from_modelstring(langid_module.model, norm_probs=True)
+        self.identifier.set_languages(candidate_languages(lang, candidates))
+
+    def _probabilities(self, texts):
+        """Returns the matrix of the probabilities of the candidate languages (columns) for each text (rows)"""
+        features = np.vstack([self.identifier.instance2fv(text) for text in texts])
+        log_probabilities = features.dot(self.identifier.nb_ptc) + self.identifier.nb_pc
+        #normalization of each row, like LanguageIdentifier.norm_probs
+        log_probabilities -= log_probabilities.max(axis=1)[:, np.newaxis]
+        probabilities = np.exp(log_probabilities)
+        return probabilities / probabilities.sum(axis=1)[:, np.newaxis]
+
+    def classify_batch(self, texts):
+        """Returns the list of the (language, probability) of each text, among the candidate languages"""
+        if not texts:
+            return []
+        probabilities = self._probabilities(texts)
+        best = probabilities.argmax(axis=1)
+        return [(self.identifier.nb_classes[column], float(probabilities[row, column])) for row, column in enumerate(best)]
+
+    def accepts_batch(self, texts):
+        """Returns the list of the verdicts (True if the text is in the processed language) of each text"""
+        with self._lock:
+            verdicts = [self._cache.get(text) for text in texts]
+        pending = [i for i, verdict in enumerate(verdicts) if verdict is None]
+        #short-circuit: the long texts are first classified on their prefix
+        long_texts = [i for i in pending if len(texts[i]) > 2 * self.prefix_size]
+        prefixes = self.classify_batch([texts[i][:self.prefix_size] for i in long_texts])
+        for i, (lang, probability) in zip(long_texts, prefixes):
+            if probability >= self.confidence:
+                verdicts[i] = lang == self.lang
+                self.shortcuts += 1
+        pending = [i for i in pending if verdicts[i] is None]
+        for i, (lang, probability) in zip(pending, self.classify_batch([texts[i] for i in pending])):
+            verdicts[i] = lang == self.lang
+        with self._lock:
+            for text, verdict in zip(texts, verdicts):
+                self._remember(text, verdict)
+        return verdicts
+
+    def accepts(self, text):
+        return self.accepts_batch([text])[0]
+
+    def _remember(self, text, verdict):
+        if text in self._cache:
+            self._cache.move_to_end(text)
+            return
+        self._cache[text] = verdict
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+_filters = {}
+_filters_lock = threading.Lock()
+
+
+def get_language_filter(lang, candidates=None):
+    """Returns the filter of a language, created on the first call (once per process, see pipeline.py)"""
+    key = (lang, tuple(candidates) if candidates else None)
+    with _filters_lock:
+        if key not in _filters:
+            _filters[key] = LanguageFilter(lang, candidates)
+        return _filters[key]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Lazy loading of the heavy dependencies (nltk, language_check, spaCy models, langid's model, etc.), so that they are
+only loaded when the stage needing them first runs, and "--help" or a short run starts quickly.
+
+    roman = lazy_import("roman")        #nothing is imported yet
+    roman.fromRoman("XIV")              #"roman" is imported here
+
+    nlp = Lazy(load_model)              #load_model isn't called yet
+    nlp.get()                           #load_model is called here, once
+
+See benchmarks/check_import_time.py for the startup time budget.
+"""
+
+import importlib
+import threading
+
+
+class LazyModule(object):
+    """A module imported on the first access to one of its attributes"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        return "<lazy module '{name}'{loaded}>".format(name=self._name, loaded="" if self._module is None else " (loaded)")
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+class Lazy(object):
+    """A value computed by "factory" on the first call to get(), e.g. a spaCy model"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._value = None
+        self._loaded = False
+        #the stages of the pipeline may ask for the value at the same time (see pipeline.py)
+        self._lock = threading.Lock()
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._value = self.factory()
+                    self._loaded = True
+        return self._value
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Run metrics of the extractor, so that a long unattended run can be monitored (see the --metrics, --metrics-prom and
+--profile-stages options).
+
+The metrics are recorded in the module-level "metrics" registry:
+    * counters, e.g. the API requests per endpoint, the bytes downloaded, the contributions filtered by each rule,
+      the paragraphs rejected by each check,
+    * histograms of durations, e.g. the latency of the API requests, the time spent in each stage,
+    * gauges, e.g. the time of the last update.
+Each series has a name and optional labels (e.g. endpoint="parse").
+
+The registry is exported as a JSON summary, and/or as a Prometheus textfile (to be read by the textfile collector of
+node_exporter), both written atomically, periodically during the run and once at its end.
+
+The stages (see Metrics.stage) can also be profiled with cProfile: the profiles of each stage are accumulated, and
+written as "<stage>.prof" files, to be read with pstats or snakeviz. Only the stages running in the main process are
+profiled (e.g. not the cleaning of --pipeline, which runs in worker processes).
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "wikicc0_"
+#upper bounds of the buckets of the duration histograms, in seconds
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+#the type and description of each metric, for the Prometheus textfile
+DESCRIPTIONS = {
+    "api_requests_total": ("counter", "Mediawiki API requests sent, per endpoint"),
+    "api_errors_total": ("counter", "Mediawiki API requests which failed, per endpoint"),
+    "api_cache_hits_total": ("counter", "Mediawiki API queries answered by the response cache, per endpoint"),
+    "api_response_bytes_total": ("counter", "Bytes of the Mediawiki API responses (decompressed), per endpoint"),
+    "api_request_seconds": ("histogram", "Latency of the Mediawiki API requests, per endpoint"),
+    "contributions_total": ("counter", "Contributions listed for the users"),
+    "contributions_filtered_total": ("counter", "Contributions skipped, per rule"),
+    "paragraphs_total": ("counter", "Paragraphs (or added lines) cleaned"),
+    "paragraphs_rejected_total": ("counter", "Paragraphs (or added lines) rejected, per reason"),
+    "sentences_written_total": ("counter", "Sentences written to the output files"),
+    "sentences_rejected_total": ("counter", "Sentences rejected by the validation or the deduplication, per reason"),
+    "users_total": ("counter", "Users whose sentences were written"),
+    "stage_seconds": ("histogram", "Time spent in each stage of the extraction"),
+    "start_time_seconds": ("gauge", "Unix time of the start of the run"),
+    "last_update_seconds": ("gauge", "Unix time of the last export of the metrics"),
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ""
+    return "{" + ",".join("{0}=\"{1}\"".format(name, _escape(value)) for name, value in labels) + "}"
+
+
+def _write_atomically(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class Metrics(object):
+    """
+    A thread-safe registry of counters, histograms and gauges.
+    The "profile_stages" parameter lists the stages profiled with cProfile, whose profiles are written in
+    "profile_dir" by export.
+    """
+
+    def __init__(self, profile_stages=(), profile_dir="."):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        #the stage being profiled: Python >= 3.12 allows a single active profiler, whatever the thread
+        self._profiling = threading.Lock()
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self._profiles = {}
+        self.set("start_time_seconds", time.time())
+
+    def configure_profiling(self, stages, directory="."):
+        self.profile_stages = set(stages)
+        self.profile_dir = directory
+
+    def incr(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, seconds, **labels):
+        """Records a duration in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                #the count of each bucket (not cumulative), the sum and the count of the durations
+                histogram = self._histograms[key] = [[0] * len(DURATION_BUCKETS), 0.0, 0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def get(self, name, **labels):
+        """Returns the value of a counter (0 if it was never incremented)"""
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def total(self, name):
+        """Returns the sum of a counter over all its labels"""
+        with self._lock:
+            return sum(value for (counter, labels), value in self._counters.items() if counter == name)
+
+    @contextmanager
+    def stage(self, name):
+        """Records the time spent in the "with" block in the stage_seconds histogram, and profiles it if requested"""
+        profile = None
+        #the stages entered while another stage is profiled (e.g. nested, or in another thread) aren't profiled
+        if name in self.profile_stages and self._profiling.acquire(blocking=False):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError: #another profiler is active, e.g. python -m cProfile
+                self._profiling.release()
+                profile = None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=name)
+            if profile is not None:
+                profile.disable()
+                self._profiling.release()
+                with self._lock:
+                    if name in self._profiles:
+                        self._profiles[name].add(profile)
+                    else:
+                        self._profiles[name] = pstats.Stats(profile)
+
+    def timed(self, name, iterable):
+        """Yields the items of an iterable (e.g. a generator sending API requests), timing each step as the stage "name" """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def drain(self):
+        """Returns the counters and histograms recorded so far, and resets them (see collect)"""
+        with self._lock:
+            recorded = (self._counters, self._histograms)
+            self._counters = {}
+            self._histograms = {}
+        return recorded
+
+    def merge(self, recorded):
+        """Adds the counters and histograms returned by drain, e.g. in another process"""
+        counters, histograms = recorded
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, (buckets, seconds, count) in histograms.items():
+                histogram = self._histograms.setdefault(key, [[0] * len(DURATION_BUCKETS), 0.0, 0])
+                histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                histogram[1] += seconds
+                histogram[2] += count
+
+    def summary(self):
+        """Returns the metrics as a JSON-serializable dictionary"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            gauges = sorted(self._gauges.items())
+        result = {"counters": {}, "histograms": {}, "gauges": {}}
+        for (name, labels), value in counters:
+            result["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+        for (name, labels), (buckets, seconds, count) in histograms:
+            result["histograms"].setdefault(name, []).append({"labels": dict(labels), "count": count, "sum": seconds,
+                                                             "mean": seconds / count if count else 0,
+                                                             "buckets": dict(zip([str(bound) for bound in DURATION_BUCKETS], buckets))})
+        for (name, labels), value in gauges:
+            result["gauges"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return result
+
+    def prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format"""
+        with self._lock:
+            series = {}
+            for (name, labels), value in self._counters.items():
+                series.setdefault(name, []).append((labels, value))
+            for (name, labels), value in self._gauges.items():
+                series.setdefault(name, []).append((labels, value))
+            for (name, labels), histogram in self._histograms.items():
+                series.setdefault(name, []).append((labels, (list(histogram[0]), histogram[1], histogram[2])))
+        lines = []
+        for name in sorted(series):
+            kind, description = DESCRIPTIONS.get(name, ("untyped", name))
+            lines.append("# HELP {0}{1} {2}".format(PREFIX, name, description))
+            lines.append("# TYPE {0}{1} {2}".format(PREFIX, name, kind))
+            for labels, value in sorted(series[name]):
+                if kind != "histogram":
+                    lines.append("{0}{1}{2} {3}".format(PREFIX, name, _format_labels(labels), value))
+                    continue
+                buckets, seconds, count = value
+                cumulated = 0
+                for bound, bucket in zip(DURATION_BUCKETS, buckets):
+                    cumulated += bucket
+                    lines.append("{0}{1}_bucket{2} {3}".format(PREFIX, name, _format_labels(labels, [("le", bound)]), cumulated))
+                lines.append("{0}{1}_bucket{2} {3}".format(PREFIX, name, _format_labels(labels, [("le", "+Inf")]), count))
+                lines.append("{0}{1}_sum{2} {3}".format(PREFIX, name, _format_labels(labels), seconds))
+                lines.append("{0}{1}_count{2} {3}".format(PREFIX, name, _format_labels(labels), count))
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_path=None, prometheus_path=None):
+        """Writes the JSON summary and/or the Prometheus textfile, and the profiles of the profiled stages"""
+        self.set("last_update_seconds", time.time())
+        if json_path:
+            _write_atomically(json_path, json.dumps(self.summary(), indent=2, sort_keys=True))
+        if prometheus_path:
+            _write_atomically(prometheus_path, self.prometheus())
+        with self._lock:
+            profiles = list(self._profiles.items())
+        for name, stats in profiles:
+            stats.dump_stats(os.path.join(self.profile_dir, name + ".prof"))
+
+
+class PeriodicExport(object):
+    """Exports the metrics (see Metrics.export) every "interval" seconds in a background thread, and once on close"""
+
+    def __init__(self, registry, json_path=None, prometheus_path=None, interval=60):
+        self.registry = registry
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.registry.export(self.json_path, self.prometheus_path)
+            except OSError as e:
+                print("error: metrics export:", str(e))
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.registry.export(self.json_path, self.prometheus_path)
+
+
+def collect(function, payload):
+    """
+    Runs function(payload) in a worker process, and returns the result and the metrics it recorded, to be merged
+    into the registry of the main process (see pipeline.py)
+    """
+    #a forked worker inherits the metrics of its parent: they are discarded, so that they aren't counted twice
+    metrics.drain()
+    with metrics.stage("clean"):
+        result = function(payload)
+    return result, metrics.drain()
+
+
+#the registry of the process
+metrics = Metrics()
@@ -0,0 +1,522 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the Mediawiki API, serving a synthetic wiki, to measure and regression-test the extractor
+without hitting the live Wikipedia.
+
+It implements the endpoints used by Wikipedia_CC0.py, with their continuation:
+    * action=query&list=embeddedin
+    * action=query&list=usercontribs
+    * action=query&prop=revisions (by revids, or the history/latest content of titles)
+    * action=query&prop=templates
+    * action=parse&oldid=...
+    * action=compare&fromrev=...&torelative=prev
+with a configurable latency, and error injection (HTTP 503, malformed JSON, API errors).
+
+The synthetic wiki is generated by SyntheticWiki: each CC0 user gets N contributions (page creations, edits
+adding paragraphs, minor edits, reverts, redirects, translations), interleaved with edits by other users.
+Only the metadata of the revisions are kept in memory; their wikitext and html are generated on request from
+the revision's seed, so a wiki 100 times bigger than our real data still fits in memory.
+
+The synthetic wiki can also be written as a pages-meta-history XML dump, for the --dump option of the extractor.
+
+Usage:
+    $ python3 mock_api.py --users 60 --contributions 2000 --latency 0.05 --error-rate 0.01 --port 8080
+    $ python3 Wikipedia_CC0.py --api-url http://localhost:8080/w/api.php fr /data
+    $ python3 mock_api.py --users 5 --dump /data/synthetic-pages-meta-history.xml
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import time
+from collections import Counter, namedtuple
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape as xml_escape
+
+NAMESPACES = {"fr": {"user": "Utilisateur:", "talk": "Discussion:", "template": "Modèle:"},
+              "en": {"user": "User:", "talk": "Talk:", "template": "Template:"},
+              "cy": {"user": "Defnyddiwr:", "talk": "Sgwrs:", "template": "Nodyn:"}}
+TRANSLATION_TEMPLATES = {"fr": "Traduit de", "en": "Translated page", "cy": "Translated page"}
+#the templates of the user pages of the CC0 users (see Wikipedia_CC0.mapping_lang_template), used in the dumps
+CC0_TEMPLATES = {"fr": "Utilisateur CC0", "en": "CC-0 Release", "cy": "Trwydded CC-0"}
+
+VOCABULARY = {"fr": ("le la les un une des du de et en dans sur pour par avec est sont était fut a ont ville rivière "
+                     "église village commune château région siècle guerre roi famille nom premier grand petite "
+                     "ancienne nouvelle située construite fondée devient reste pendant après avant depuis entre "
+                     "selon plusieurs nombreux habitants population territoire route pont musée école").split(),
+              "en": ("the a an of and in on for by with is are was were has have town river church village "
+                     "castle region century war king family name first great small old new located built "
+                     "founded became remains during after before since between according several many "
+                     "inhabitants population territory road bridge museum school").split(),
+              "cy": ("y yr a ac o i yn ar gyda mae oedd bydd wedi tref afon eglwys pentref castell ardal canrif "
+                     "rhyfel brenin teulu enw cyntaf mawr bach hen newydd adeiladwyd sefydlwyd daeth parhau yn "
+                     "ystod ar ôl cyn ers rhwng yn ôl sawl llawer trigolion poblogaeth tiriogaeth ffordd pont "
+                     "amgueddfa ysgol").split()}
+
+PARAGRAPH_SIZE = 400 #nominal size in bytes of a paragraph, used for the revisions' sizes
+
+Revision = namedtuple("Revision", ["revid", "parentid", "pageid", "title", "user", "timestamp", "comment",
+                                   "minor", "new", "tags", "paragraphs", "redirect", "sha1"])
+
+
+class SyntheticWiki(object):
+    """
+    The "users" parameter is the number of CC0 users, each making "contributions" revisions.
+    "other_edits" is the probability of an edit by another (non CC0) user between two contributions.
+    """
+
+    def __init__(self, lang="fr", users=5, contributions=200, other_edits=0.2, translation_rate=0.05, seed=0):
+        self.lang = lang
+        self.ns = NAMESPACES.get(lang, NAMESPACES["en"])
+        self.vocabulary = VOCABULARY.get(lang, VOCABULARY["en"])
+        self.seed = seed
+        self.users = ["CC0 user {0:04d}".format(i) for i in range(users)]
+        self.pages = {}         #title -> [Revision], oldest first
+        self.pageids = {}       #title -> pageid
+        self.revisions = {}     #revid -> Revision
+        self.contribs = {}      #user -> [Revision], newest first (once generated)
+        self.translated = set() #titles whose talk page uses a translation template
+        rng = random.Random(seed)
+        self._revid = 1000
+        self._timestamp = 1500000000
+        titles = []
+        for user in self.users:
+            user_pages = []
+            for k in range(contributions):
+                if rng.random() < other_edits and self.pages:
+                    self._edit(rng, "Other contributor", rng.choice(titles))
+                roll = rng.random()
+                if not user_pages or roll < 0.3:
+                    title = "Article {user}-{k}".format(user=user.split()[-1], k=k)
+                    redirect = rng.random() < 0.05
+                    self._add(title, user, comment="redirect" if redirect else "Nouvelle page",
+                              paragraphs=0 if redirect else rng.randint(2, 6),
+                              tags=["mw-new-redirect"] if redirect else (["contenttranslation"] if rng.random() < translation_rate else []),
+                              redirect=redirect)
+                    user_pages.append(title)
+                    titles.append(title)
+                    if rng.random() < translation_rate:
+                        self.translated.add(title)
+                else:
+                    self._edit(rng, user, rng.choice(user_pages))
+        for contribs in self.contribs.values():
+            contribs.reverse()
+
+    def _edit(self, rng, user, title):
+        last = self.pages[title][-1]
+        if last.redirect:
+            return
+        roll = rng.random()
+        if roll < 0.1:
+            self._add(title, user, comment="typo", paragraphs=last.paragraphs, minor=True)
+        elif roll < 0.15 and len(self.pages[title]) > 1:
+            previous = self.pages[title][-2]
+            self._add(title, user, comment="Revert", paragraphs=previous.paragraphs,
+                      tags=["mw-rollback"] if rng.random() < 0.5 else [], sha1=previous.sha1)
+        else:
+            self._add(title, user, comment="ajout", paragraphs=last.paragraphs + rng.randint(1, 3))
+
+    def _add(self, title, user, comment, paragraphs, minor=False, tags=(), redirect=False, sha1=None):
+        self._revid += 1
+        self._timestamp += 60
+        history = self.pages.setdefault(title, [])
+        pageid = self.pageids.setdefault(title, len(self.pageids) + 1)
+        if sha1 is None:
+            sha1 = hashlib.sha1("{0}|{1}|{2}".format(title, paragraphs, self._revid if minor else "").encode("utf-8")).hexdigest()
+        revision = Revision(self._revid, history[-1].revid if history else 0, pageid, title, user,
+                            time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self._timestamp)),
+                            comment, minor, not history, list(tags), paragraphs, redirect, sha1)
+        history.append(revision)
+        self.revisions[revision.revid] = revision
+        self.contribs.setdefault(user, []).append(revision)
+
+    def size(self, revision):
+        return 30 if revision.redirect else revision.paragraphs * PARAGRAPH_SIZE
+
+    def paragraph(self, title, i):
+        """Returns the i-th paragraph of a page as (wikitext, html). A paragraph never changes once added."""
+        rng = random.Random("{0}|{1}|{2}".format(self.seed, title, i))
+        sentences_wiki, sentences_html = [], []
+        for _ in range(rng.randint(2, 5)):
+            words = [rng.choice(self.vocabulary) for _ in range(rng.randint(5, 16))]
+            if rng.random() < 0.3:
+                words.insert(rng.randint(0, len(words)), str(rng.randint(1200, 2020)))
+            link = rng.randint(0, len(words) - 1)
+            sentence_wiki = " ".join(words[:link] + ["[[" + words[link] + "]]"] + words[link + 1:])
+            sentence_html = " ".join(words[:link] + ['<a href="/wiki/' + words[link] + '">' + words[link] + "</a>"] + words[link + 1:])
+            if rng.random() < 0.2:
+                sentence_wiki += " ({0})".format(rng.choice(self.vocabulary))
+                sentence_html += " ({0})".format(rng.choice(self.vocabulary))
+            sentences_wiki.append(sentence_wiki[0].upper() + sentence_wiki[1:] + ".")
+            sentences_html.append(sentence_html[0].upper() + sentence_html[1:] + ".")
+            if rng.random() < 0.2:
+                sentences_wiki[-1] += "<ref>Source {0}</ref>".format(rng.randint(1, 99))
+                sentences_html[-1] += '<sup class="reference"><a href="#cite_note-{0}">[{0}]</a></sup>'.format(len(sentences_html))
+        return " ".join(sentences_wiki), " ".join(sentences_html)
+
+    def wikitext(self, revision):
+        if revision.redirect:
+            return "#REDIRECT [[Accueil]]"
+        return "\n\n".join(self.paragraph(revision.title, i)[0] for i in range(revision.paragraphs))
+
+    def html(self, revision):
+        if revision.redirect:
+            return '<div class="redirectMsg"><p>Rediriger vers :</p><ul class="redirectText"><li><a href="/wiki/Accueil">Accueil</a></li></ul></div>'
+        paragraphs = ["<p>" + self.paragraph(revision.title, i)[1] + "</p>" for i in range(revision.paragraphs)]
+        infobox = '<table class="infobox"><tr><th>Nom</th><td>' + revision.title + "</td></tr></table>"
+        return '<div class="mw-parser-output">' + infobox + "\n".join(paragraphs) + "</div>"
+
+    def diff(self, previous, revision):
+        """Returns the html diff table of action=compare, with one "diff-addedline" cell per added line"""
+        start = previous.paragraphs if previous is not None else 0
+        rows = []
+        for i in range(start, revision.paragraphs):
+            rows.append('<tr><td class="diff-marker">+</td><td class="diff-addedline"><div></div></td></tr>')
+            rows.append('<tr><td class="diff-marker">+</td><td class="diff-addedline"><div>{0}</div></td></tr>'.format(
+                escape(self.paragraph(revision.title, i)[0])))
+        if revision.redirect:
+            rows.append('<tr><td class="diff-marker">+</td><td class="diff-addedline"><div>#REDIRECT [[Accueil]]</div></td></tr>')
+        return "".join(rows)
+
+    def write_dump(self, path):
+        """
+        Writes the wiki as a pages-meta-history XML dump (see dump.py): the articles with their whole history, the
+        user pages of the CC0 users, using the CC0 template, and the talk pages of the articles
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" xml:lang="{0}">\n'.format(self.lang))
+            template = "{{" + CC0_TEMPLATES.get(self.lang, CC0_TEMPLATES["en"]) + "}}"
+            for i, user in enumerate(self.users):
+                self._write_page(f, self.ns["user"] + user, 2, 20000000 + i,
+                                 [(30000000 + i, 0, user, self.timestamp(0), False, "", template)])
+            for title, history in self.pages.items():
+                self._write_page(f, title, 0, self.pageids[title],
+                                 [(r.revid, r.parentid, r.user, r.timestamp, r.minor, r.comment, self.wikitext(r)) for r in history])
+                self._write_page(f, self.ns["talk"] + title, 1, 10000000 + self.pageids[title],
+                                 [(10000000 + self.pageids[title], 0, "Other contributor", history[0].timestamp, False, "", self.talk_text(title))])
+            f.write("</mediawiki>\n")
+
+    @staticmethod
+    def timestamp(seconds):
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1500000000 + seconds))
+
+    @staticmethod
+    def _write_page(f, title, ns, pageid, revisions):
+        f.write("  <page>\n    <title>{0}</title>\n    <ns>{1}</ns>\n    <id>{2}</id>\n".format(xml_escape(title), ns, pageid))
+        for revid, parentid, user, timestamp, minor, comment, text in revisions:
+            f.write("    <revision>\n      <id>{0}</id>\n".format(revid))
+            if parentid:
+                f.write("      <parentid>{0}</parentid>\n".format(parentid))
+            f.write("      <timestamp>{0}</timestamp>\n      <contributor><username>{1}</username></contributor>\n".format(timestamp, xml_escape(user)))
+            if minor:
+                f.write("      <minor />\n")
+            f.write("      <comment>{0}</comment>\n".format(xml_escape(comment)))
+            f.write('      <text xml:space="preserve">{0}</text>\n'.format(xml_escape(text)))
+            f.write("      <sha1>{0}</sha1>\n    </revision>\n".format(hashlib.sha1(text.encode("utf-8")).hexdigest()))
+        f.write("  </page>\n")
+
+    def talk_text(self, title):
+        if title in self.translated:
+            return "{{" + TRANSLATION_TEMPLATES.get(self.lang, "Translated page") + "|en|Some article}}\n== Discussion ==\n"
+        return "== Discussion ==\nBla bla.\n"
+
+
+def escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+class MockApi(object):
+    """Answers the API queries (dictionaries of parameters) from a SyntheticWiki"""
+
+    def __init__(self, wiki, max_content=8 * 1024 * 1024):
+        self.wiki = wiki
+        self.max_content = max_content
+
+    def answer(self, params):
+        action = params.get("action")
+        if action == "parse":
+            return self.parse(params)
+        if action == "compare":
+            return self.compare(params)
+        if action == "query":
+            if params.get("list") == "embeddedin":
+                return self.embeddedin(params)
+            if params.get("list") == "usercontribs":
+                return self.usercontribs(params)
+            if params.get("prop") == "revisions":
+                return self.revisions(params)
+            if params.get("prop") == "templates":
+                return self.templates(params)
+        return {"error": {"code": "badvalue", "info": "Unsupported query: " + json.dumps(params)}}
+
+    @staticmethod
+    def _limit(params, name, default):
+        value = params.get(name, default)
+        return 500 if value == "max" else int(value)
+
+    def embeddedin(self, params):
+        entries = [{"pageid": i, "ns": 2, "title": self.wiki.ns["user"] + user} for i, user in enumerate(self.wiki.users)]
+        entries.append({"pageid": len(entries), "ns": 2, "title": self.wiki.ns["user"] + self.wiki.users[0] + "/Brouillon"})
+        offset = int(params.get("eicontinue", "2|0").split("|")[-1])
+        limit = self._limit(params, "eilimit", 10)
+        response = {"batchcomplete": "", "query": {"embeddedin": entries[offset:offset + limit]}}
+        if offset + limit < len(entries):
+            response["continue"] = {"eicontinue": "2|{0}".format(offset + limit), "continue": "-||"}
+        return response
+
+    def usercontribs(self, params):
+        contribs = self.wiki.contribs.get(params.get("ucuser"), [])
+        offset = int(params.get("uccontinue", "0|0").split("|")[-1])
+        limit = self._limit(params, "uclimit", 10)
+        entries = []
+        for revision in contribs[offset:offset + limit]:
+            entry = {"userid": 1, "user": revision.user, "pageid": revision.pageid, "revid": revision.revid,
+                     "parentid": revision.parentid, "ns": 0, "title": revision.title, "timestamp": revision.timestamp,
+                     "comment": revision.comment, "size": self.wiki.size(revision), "tags": revision.tags}
+            if revision.new:
+                entry["new"] = ""
+            if revision.minor:
+                entry["minor"] = ""
+            entries.append(entry)
+        response = {"batchcomplete": "", "query": {"usercontribs": entries}}
+        if offset + limit < len(contribs):
+            response["continue"] = {"uccontinue": "{0}|{1}".format(contribs[offset + limit].timestamp, offset + limit), "continue": "-||"}
+        return response
+
+    def _revision_entry(self, revision, params):
+        rvprop = params.get("rvprop", "ids|timestamp|flags|comment|user").split("|")
+        entry = {"revid": revision.revid, "parentid": revision.parentid}
+        if "size" in rvprop:
+            entry["size"] = self.wiki.size(revision)
+        if "sha1" in rvprop:
+            entry["sha1"] = revision.sha1
+        if "tags" in rvprop:
+            entry["tags"] = revision.tags
+        if "user" in rvprop:
+            entry["user"] = revision.user
+        if "timestamp" in rvprop:
+            entry["timestamp"] = revision.timestamp
+        if "comment" in rvprop:
+            entry["comment"] = revision.comment
+        if "flags" in rvprop and revision.minor:
+            entry["minor"] = ""
+        if "content" in rvprop:
+            content = {"contentmodel": "wikitext", "contentformat": "text/x-wiki", "*": self.wiki.wikitext(revision)}
+            if "rvslots" in params:
+                entry["slots"] = {"main": content}
+            else:
+                entry.update(content)
+        return entry
+
+    def _page(self, pages, title, pageid, ns=0):
+        return pages.setdefault(str(pageid), {"pageid": pageid, "ns": ns, "title": title})
+
+    def revisions(self, params):
+        if "revids" in params:
+            return self._revisions_by_ids(params)
+        pages = {}
+        response = {"batchcomplete": "", "query": {"pages": pages}}
+        titles = params.get("titles", "").split("|")
+        for missing, title in enumerate(titles, 1):
+            if title in self.wiki.pages:
+                page = self._page(pages, title, self.wiki.pageids[title])
+                history = self.wiki.pages[title]
+                if not any(name in params for name in ("rvlimit", "rvstartid", "rvendid", "rvdir", "rvcontinue")):
+                    page["revisions"] = [self._revision_entry(history[-1], params)]
+                    continue
+                #enumeration of the page's history
+                newer = params.get("rvdir", "older") == "newer"
+                ordered = history if newer else history[::-1]
+                if "rvcontinue" in params:
+                    resume = int(params["rvcontinue"].split("|")[-1])
+                    ordered = [r for r in ordered if (r.revid >= resume if newer else r.revid <= resume)]
+                if "rvstartid" in params:
+                    start = int(params["rvstartid"])
+                    ordered = [r for r in ordered if (r.revid >= start if newer else r.revid <= start)]
+                if "rvendid" in params:
+                    end = int(params["rvendid"])
+                    ordered = [r for r in ordered if (r.revid <= end if newer else r.revid >= end)]
+                limit = self._limit(params, "rvlimit", 10)
+                page["revisions"] = [self._revision_entry(r, params) for r in ordered[:limit]]
+                if len(ordered) > limit:
+                    response["continue"] = {"rvcontinue": "{0}|{1}".format(ordered[limit].timestamp, ordered[limit].revid), "continue": "||"}
+            elif title.startswith(self.wiki.ns["talk"]) and title[len(self.wiki.ns["talk"]):] in self.wiki.pages:
+                article = title[len(self.wiki.ns["talk"]):]
+                page = self._page(pages, title, 10000000 + self.wiki.pageids[article], ns=1)
+                content = {"contentmodel": "wikitext", "contentformat": "text/x-wiki", "*": self.wiki.talk_text(article)}
+                revision = {"revid": 10000000 + self.wiki.pageids[article], "parentid": 0}
+                if "rvslots" in params:
+                    revision["slots"] = {"main": content}
+                else:
+                    revision.update(content)
+                page["revisions"] = [revision]
+            else:
+                pages[str(-missing)] = {"ns": 0, "title": title, "missing": ""}
+        return response
+
+    def _revisions_by_ids(self, params):
+        pages = {}
+        response = {"batchcomplete": "", "query": {"pages": pages}}
+        revids = [int(revid) for revid in params["revids"].split("|")]
+        if "rvcontinue" in params:
+            resume = int(params["rvcontinue"])
+            revids = revids[revids.index(resume):] if resume in revids else []
+        budget = self.max_content
+        badrevids = {}
+        for i, revid in enumerate(revids):
+            revision = self.wiki.revisions.get(revid)
+            if revision is None:
+                badrevids[str(revid)] = {"revid": revid, "missing": ""}
+                continue
+            entry = self._revision_entry(revision, params)
+            budget -= len(entry.get("slots", {}).get("main", entry).get("*", ""))
+            if budget < 0 and i > 0:
+                response["continue"] = {"rvcontinue": str(revid), "continue": "||"}
+                break
+            self._page(pages, revision.title, revision.pageid).setdefault("revisions", []).append(entry)
+        if badrevids:
+            response["query"]["badrevids"] = badrevids
+        return response
+
+    def templates(self, params):
+        pages = {}
+        response = {"batchcomplete": "", "query": {"pages": pages}}
+        wanted = set(params.get("tltemplates", "").split("|")) if "tltemplates" in params else None
+        template = self.wiki.ns["template"] + TRANSLATION_TEMPLATES.get(self.wiki.lang, "Translated page")
+        for missing, title in enumerate(params.get("titles", "").split("|"), 1):
+            talk = self.wiki.ns["talk"]
+            article = title[len(talk):] if title.startswith(talk) else None
+            if article not in self.wiki.pages:
+                pages[str(-missing)] = {"ns": 1, "title": title, "missing": ""}
+                continue
+            page = self._page(pages, title, 10000000 + self.wiki.pageids[article], ns=1)
+            if article in self.wiki.translated and (wanted is None or template in wanted):
+                page["templates"] = [{"ns": 10, "title": template}]
+        return response
+
+    def parse(self, params):
+        revision = self.wiki.revisions.get(int(params.get("oldid", 0)))
+        if revision is None:
+            return {"error": {"code": "nosuchrevid", "info": "There is no revision with ID " + params.get("oldid", "")}}
+        return {"parse": {"title": revision.title, "pageid": revision.pageid, "revid": revision.revid,
+                          "text": {"*": self.wiki.html(revision)}}}
+
+    def compare(self, params):
+        revision = self.wiki.revisions.get(int(params.get("fromrev", 0)))
+        if revision is None:
+            return {"error": {"code": "nosuchrevid", "info": "There is no revision with ID " + params.get("fromrev", "")}}
+        #with torelative=prev, "to" is the requested revision and "from" its parent
+        previous = self.wiki.revisions.get(revision.parentid)
+        compare = {"toid": revision.pageid, "torevid": revision.revid, "tons": 0, "totitle": revision.title,
+                   "tosize": self.wiki.size(revision), "*": self.wiki.diff(previous, revision)}
+        if previous is not None:
+            compare.update({"fromid": previous.pageid, "fromrevid": previous.revid, "fromns": 0,
+                            "fromtitle": previous.title, "fromsize": self.wiki.size(previous), "prev": previous.revid})
+        return {"compare": compare}
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def make_handler(api, latency=0.0, error_rate=0.0, seed=0):
+    """Returns a request handler class answering with "api", after "latency" seconds on average, and failing with an "error_rate" probability"""
+    rng = random.Random(seed)
+    stats = Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _params(self):
+            params = parse_qs(urlparse(self.path).query)
+            if self.command == "POST":
+                length = int(self.headers.get("Content-Length", 0))
+                params.update(parse_qs(self.rfile.read(length).decode("utf-8")))
+            return {name: values[-1] for name, values in params.items()}
+
+        def _answer(self):
+            params = self._params()
+            stats[params.get("action", "") + ":" + params.get("list", params.get("prop", ""))] += 1
+            if latency:
+                time.sleep(latency * rng.uniform(0.5, 1.5))
+            roll = rng.random()
+            if roll < error_rate / 3:
+                stats["errors"] += 1
+                return self._send(503, "text/html", b"<html><body>Service Unavailable</body></html>", retry_after=1)
+            elif roll < 2 * error_rate / 3:
+                stats["errors"] += 1
+                return self._send(200, "application/json", b'{"query": {"pages"')
+            elif roll < error_rate:
+                stats["errors"] += 1
+                #like Mediawiki, the lag is reported in the error and in the Retry-After header
+                body = {"error": {"code": "maxlag", "info": "Waiting for a database server: 1 seconds lagged", "lag": 1}}
+                return self._send(200, "application/json; charset=utf-8", json.dumps(body).encode("utf-8"), retry_after=1)
+            else:
+                body = api.answer(params)
+            self._send(200, "application/json; charset=utf-8", json.dumps(body).encode("utf-8"))
+
+        def _send(self, status, content_type, body, retry_after=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            if retry_after is not None:
+                self.send_header("Retry-After", str(retry_after))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = _answer
+        do_POST = _answer
+
+        def log_message(self, format, *args):
+            pass
+
+    Handler.stats = stats
+    return Handler
+
+
+def serve(wiki, host="localhost", port=8080, latency=0.0, error_rate=0.0, max_content=8 * 1024 * 1024):
+    """Returns a started server (in a background thread); stop it with server.shutdown()"""
+    import threading
+    handler = make_handler(MockApi(wiki, max_content=max_content), latency=latency, error_rate=error_rate, seed=wiki.seed)
+    server = ThreadingServer((host, port), handler)
+    server.stats = handler.stats
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Local Mediawiki API stand-in serving a synthetic wiki')
+    parser.add_argument('--lang', type=str, default="fr", help='Language of the synthetic wiki')
+    parser.add_argument('--users', type=int, default=5, help='Number of CC0 users')
+    parser.add_argument('--contributions', type=int, default=200, help='Number of contributions per CC0 user')
+    parser.add_argument('--scale', type=int, default=1, help='Multiplies the number of contributions, e.g. 10 or 100')
+    parser.add_argument('--latency', type=float, default=0.0, help='Average latency of the responses, in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of an error response (HTTP 503, malformed JSON, API error)')
+    parser.add_argument('--max-content', type=int, default=8 * 1024 * 1024, help='Content size beyond which prop=revisions&revids=... responses are continued')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', type=str, default="localhost")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--dump', type=str, default=None, help='Write the synthetic wiki as a pages-meta-history XML dump to this file, instead of serving it')
+    args = parser.parse_args()
+
+    print("Generating the synthetic wiki...")
+    wiki = SyntheticWiki(lang=args.lang, users=args.users, contributions=args.contributions * args.scale, seed=args.seed)
+    print(len(wiki.users), "users,", len(wiki.pages), "pages,", len(wiki.revisions), "revisions")
+    if args.dump is not None:
+        wiki.write_dump(args.dump)
+        print("Dump written to", args.dump)
+        raise SystemExit
+    server = serve(wiki, host=args.host, port=args.port, latency=args.latency, error_rate=args.error_rate, max_content=args.max_content)
+    print("Serving http://{host}:{port}/w/api.php".format(host=args.host, port=args.port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        for endpoint, count in sorted(server.stats.items()):
+            print(endpoint, count)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled, per-language text normalization of the paragraphs.
+
+The rule tables use the format of utils.mapping_normalization: [literal or compiled regex, replacement] pairs.
+They are grouped in passes, and each pass is compiled once into a single regex (an alternation of its rules),
+so that a paragraph is scanned once per pass instead of once per rule. Within a pass, at each position the
+first matching rule wins, so a pass must only contain rules which don't depend on each other's results;
+rules which do (e.g. removing the parentheses, then the space they leave before a full stop) go in
+successive passes. The patterns of a pass with several rules can't use anchors or lookarounds.
+
+    normalizer = get_normalizer("fr")
+    text = normalizer(text)
+"""
+
+import re
+from functools import partial
+
+from utils import mapping_normalization, convert_roman_numbers
+
+#removing the non-breaking spaces, and the content between parentheses.
+#These rules start with a literal, which the regex engine finds faster than any alternation of them.
+PARENTHESES_PASSES = [
+  [ [ u'\u00a0', u' ' ] ],
+  #replacing by a space rather than by nothing, to ease the further string cleanup
+  [ [ re.compile(r' \([^)]+\)'), u'' ] ],
+  [ [ re.compile(r'\([^)]+\)'), u'' ] ],
+]
+
+REFERENCES_RULE = [ re.compile(r'\[\d+\]'), u'' ]
+
+#abbreviations to expand, per language. The French table is utils.mapping_normalization
+ABBREVIATIONS = {
+  "fr": mapping_normalization,
+  "en": [
+    [ u'Mr. ', u'Mister ' ],
+    [ u'Mrs. ', u'Missus ' ],
+    [ u'Dr. ', u'Doctor ' ],
+    [ u'e.g. ', u'for example ' ],
+    [ u'i.e. ', u'that is ' ],
+    [ u'%', u' per cent' ],
+    REFERENCES_RULE,
+  ],
+  "cy": [
+    [ u'e.e. ', u'er enghraifft ' ],
+    [ u'h.y. ', u'hynny yw ' ],
+    [ u'%', u' y cant' ],
+    REFERENCES_RULE,
+  ],
+}
+
+#the former mapping_specific of cleaning.py: cleanup of the punctuation left by the previous passes
+PUNCTUATION_PASSES = [
+  [ [ u'(', u'' ], [ u')', u'' ] ],
+  [ [ re.compile(r'\. $'), u'.' ] ],
+  [ [ re.compile(r' \.'), u'.' ] ],
+  [ [ u' ,  ', u', ' ] ],
+  [ [ u' , ', u', ' ] ],
+  [ [ u'  ', u' ' ] ],
+]
+
+#In French, there's a space separation between thousand units. It isn't taken into account by num2words, so just let's remove those spaces.
+NUMBER_PASSES = [
+  [ [ re.compile(r'(\d)\s+(\d)'), r'\1\2' ] ],
+  #remove references between brackets
+  [ [ re.compile(r'\[[0-9]+\]'), u'' ] ],
+]
+
+
+class Pass(object):
+    """
+    A list of rules compiled into a single regex.
+    The alternatives have no named groups, so that the regex engine can skip quickly to the positions starting with
+    one of their first characters; the rule of a match is then found from the matched text.
+    """
+
+    def __init__(self, rules):
+        self.literals = {}
+        self.patterns = []
+        alternatives = []
+        for pattern, replacement in rules:
+            if isinstance(pattern, str):
+                self.literals.setdefault(pattern, replacement)
+                alternatives.append(re.escape(pattern))
+            else:
+                self.patterns.append((pattern, replacement))
+                alternatives.append(pattern.pattern)
+        self.regex = re.compile("|".join(alternatives))
+        #a single rule is applied directly, so that its pattern can use anchors and lookarounds
+        if len(rules) == 1:
+            self.single = rules[0]
+        else:
+            self.single = None
+
+    def _replace(self, match):
+        text = match.group()
+        if text in self.literals:
+            return self.literals[text]
+        for pattern, replacement in self.patterns:
+            rule_match = pattern.fullmatch(text)
+            if rule_match:
+                return rule_match.expand(replacement)
+        return text
+
+    def __call__(self, text):
+        if self.single is not None:
+            pattern, replacement = self.single
+            if isinstance(pattern, str):
+                return text.replace(pattern, replacement)
+            return pattern.sub(replacement, text)
+        return self.regex.sub(self._replace, text)
+
+
+class Normalizer(object):
+    """
+    Applies a sequence of steps to a text. A step is either a list of rules (compiled into a Pass),
+    or a function taking and returning a text.
+    """
+
+    def __init__(self, steps):
+        self.steps = [Pass(step) if isinstance(step, list) else step for step in steps]
+
+    def __call__(self, text):
+        for step in self.steps:
+            text = step(text)
+        return text
+
+
+_normalizers = {}
+
+
+def get_normalizer(lang, kind="line"):
+    """
+    Returns the normalizer of a language, compiled on the first call.
+    "kind" is "line" for the lines added by a contributor, or "article" for the paragraphs of a rendered article
+    (only the parentheses and the numbers are cleaned up, the abbreviations are kept).
+    """
+    key = (lang, kind)
+    if key not in _normalizers:
+        if kind == "article":
+            steps = PARENTHESES_PASSES + NUMBER_PASSES
+        else:
+            steps = PARENTHESES_PASSES + [ABBREVIATIONS.get(lang, [REFERENCES_RULE]), partial(convert_roman_numbers, lang=lang)] + PUNCTUATION_PASSES + NUMBER_PASSES
+        _normalizers[key] = Normalizer(steps)
+    return _normalizers[key]
+
+
+MEASURE_UNITS = {"fr": {
+                    "mm": "millimètre",
+                    "°": "degré",
+                    "cm":"centimètre",
+                    "m.":"mètre",
+                    "km":"kilomètre",
+                    }
+                }
+COORDINATE_UNITS = {"fr": {"degree":"degré",
+                           "minute": "minute",
+                           "second": "seconde"
+                           }
+                    }
+
+_abbreviation_normalizers = {}
+
+
+def get_abbreviation_normalizer(lang):
+    """Returns the normalizer of the coordinates and measure units of a language (see cleaning.convert_abbreviations), compiled on the first call."""
+    if lang not in _abbreviation_normalizers:
+        steps = []
+        if lang in COORDINATE_UNITS:
+            steps.append([[re.compile(r'([0-9]+) ?°([0-9]+) ?\'([0-9]+) ?\"'), r"\1 {degree} \2 {minute} \3 {second}".format(**COORDINATE_UNITS[lang])]])
+            steps.append([[re.compile(r'-(\d*\.\d+|\d+)'), "moins \1"]])
+        #TODO: need to treat differently singular and plural. The only library doing that for a variety of languages is "pattern", which apparently is not compatible yet with Python 3 (but should soon)
+        for measure, full_name in MEASURE_UNITS.get(lang, {}).items():
+            #singular
+            steps.append([[re.compile(r'(\[0-1]\[,.]\d+|\[0-1]) ?{measure}'.format(measure=measure)), r"\1 {full_name}".format(full_name=full_name)]])
+            #plural
+            steps.append([[re.compile(r'(\d*\[,.]\d+|\d+) ?{measure}'.format(measure=measure)), r"\1 {full_name}".format(full_name=full_name)]])
+        _abbreviation_normalizers[lang] = Normalizer(steps)
+    return _abbreviation_normalizers[lang]
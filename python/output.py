@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Output files of the extracted sentences, one per user (see the --output-format and --compression options).
+
+A SentenceSink writes the sentences as soon as they are segmented, instead of collecting them first:
+    * the file is written as "<name>.part", and renamed to its final name once complete (os.replace is atomic), so
+      that an interrupted run never leaves a truncated file looking like a finished one,
+    * the file is only created if at least one sentence is written,
+    * "txt" files hold one sentence per line, like before,
+    * "jsonl" files hold one JSON object per sentence, with its provenance:
+          {"sentence": "...", "user": "...", "licence": "CC0", "lang": "fr", "revid": 123, "title": "...",
+           "paragraph": 2, "position": 0}
+      where "paragraph" is the position of the paragraph in the text retrieved from the revision, and "position" the
+      position of the sentence in the paragraph,
+    * the files can be compressed with gzip, or zstd (requires the zstandard package).
+"""
+
+import gzip
+import json
+import os
+
+from lazy import lazy_import
+zstandard = lazy_import("zstandard")
+
+FORMATS = ["txt", "jsonl"]
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def output_name(user, licence, output_format="txt", compression="none"):
+    """Returns the name of the output file of a user, e.g. "Jean_CC0.txt" or "Jean_CC0.jsonl.gz" """
+    return "_".join([str(user), str(licence)]) + "." + output_format + COMPRESSIONS[compression]
+
+
+def open_binary(path, compression="none"):
+    """Opens a file for writing, compressing what's written according to "compression" """
+    if compression == "gzip":
+        return gzip.open(path, "wb")
+    f = open(path, "wb")
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().stream_writer(f)
+    return f
+
+
+class SentenceSink(object):
+    """
+    Writes the sentences of a user in the "directory", see output_name.
+    The "lang" parameter is the code of the processed language, recorded in the jsonl format.
+    """
+
+    def __init__(self, directory, user, licence, lang, output_format="txt", compression="none"):
+        if output_format not in FORMATS:
+            raise ValueError("Unknown output format: {0}".format(output_format))
+        self.user = user
+        self.licence = licence
+        self.lang = lang
+        self.output_format = output_format
+        self.compression = compression
+        self.path = os.path.join(directory, output_name(user, licence, output_format, compression))
+        self.count = 0
+        self._file = None
+        self._context = None
+        self._position = 0
+
+    def write(self, sentence, context=None):
+        """
+        Writes a sentence. The optional "context" is a dictionary describing the paragraph the sentence comes from,
+        e.g. {"revid": 123, "title": "...", "paragraph": 2}. The sentences of a paragraph must be written in order.
+        """
+        if self._file is None: #the file is only created if we extract at least one sentence
+            self._file = open_binary(self.path + ".part", self.compression)
+        if self.output_format == "txt":
+            line = sentence + " \n"
+        else:
+            if context != self._context:
+                self._context = context
+                self._position = 0
+            record = {"sentence": sentence, "user": self.user, "licence": self.licence, "lang": self.lang}
+            record.update(context or {})
+            record["position"] = self._position
+            self._position += 1
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+        self._file.write(line.encode("utf8"))
+        self.count += 1
+
+    def close(self):
+        """Completes the file, and gives it its final name"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.replace(self.path + ".part", self.path)
+
+    def abort(self):
+        """Removes the incomplete file"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self.path + ".part")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Staged pipeline overlapping the network I/O, the text cleaning and the sentence segmentation (see the --pipeline option).
+
+    fetch stage  ------------>  clean stage  ------------>  segment stage
+    one thread, whose API       process pool                one thread, holding
+    client sends up to          (--clean-workers): html/    the spaCy model
+    --concurrency requests      wikitext cleaning and
+    at once                     language identification
+
+Jobs (e.g. the revisions of a user) are submitted by the main thread, which meanwhile goes on with the contributions
+of the next user. The stages are connected by bounded queues, so that a slow stage throttles the previous ones instead
+of piling up data in memory.
+
+The results of the clean stage are only handed to the "progress" function, which stores them (e.g. in the
+checkpoint): the "segment" function reads them back from there, so they're never kept twice. A job whose fetching,
+cleaning or progress fails isn't segmented, and is listed in Pipeline.failed.
+
+The metrics recorded by the clean stage in the worker processes (e.g. the rejected paragraphs) are sent back with
+the results, and merged into the metrics of the main process (see metrics.py).
+
+The worker processes are forked: the "spawn" and "forkserver" start methods would run the extractor script again in
+each of them. A process forked while another thread holds a lock (e.g. of the API client, or of the metrics export)
+inherits the lock held, and may deadlock, so the processes are all started at once, before any thread: see
+start_cleaners.
+"""
+
+import multiprocessing
+import queue
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from metrics import metrics, collect
+
+
+def keep_context(clean, payload):
+    """
+    Cleans a (context, data) payload with the "clean" function, and returns the (context, result) tuple, so that the
+    segment stage knows where each result comes from (e.g. the revision and title of a text).
+    Use functools.partial(keep_context, clean) as the "clean" function of a Pipeline.
+    """
+    context, data = payload
+    return context, clean(data)
+
+
+def _started():
+    return True
+
+
+def start_cleaners(cleaners):
+    """
+    Returns a pool of "cleaners" forked processes, all started right away. To be called before starting any thread,
+    e.g. at the start of the script.
+    """
+    pool = ProcessPoolExecutor(max_workers=cleaners, mp_context=multiprocessing.get_context("fork"))
+    #with "fork", the pool starts all its processes on the first submission, and never starts others afterwards
+    pool.submit(_started).result()
+    return pool
+
+
+class Pipeline(object):
+    """
+    The "fetch" function takes the items of a job, and yields payloads (e.g. the html of revisions).
+    The "clean" function takes a payload and returns its result. It runs in worker processes, so it must be picklable
+    (a module-level function, or a functools.partial of one).
+    The "progress" function takes the key of a job and the result of one of its payloads, in order, as soon as it is
+    cleaned, and stores it (e.g. in the checkpoint). It runs in the thread of the segment stage.
+    The "segment" function takes the key of a job, once all its results were passed to "progress".
+    The "cleaners" parameter is the number of worker processes, or a pool returned by start_cleaners.
+    The keys of the failed jobs are listed in the "failed" attribute.
+    """
+
+    def __init__(self, fetch, clean, progress, segment, cleaners=2, queue_size=64):
+        self.fetch = fetch
+        self.clean = clean
+        self.progress = progress
+        self.segment = segment
+        self.failed = []
+        self._jobs = queue.Queue(maxsize=queue_size)
+        #holds the futures of the clean stage, so its size bounds the number of payloads being cleaned
+        self._cleaned = queue.Queue(maxsize=queue_size)
+        #the processes are started before the threads of the stages
+        self._pool = start_cleaners(cleaners) if isinstance(cleaners, int) else cleaners
+        self._fetcher = threading.Thread(target=self._fetch_stage)
+        self._segmenter = threading.Thread(target=self._segment_stage)
+        self._fetcher.start()
+        self._segmenter.start()
+
+    def submit(self, key, items):
+        """Schedules a job. Blocks if too many jobs are already waiting."""
+        self._jobs.put((key, items))
+
+    def close(self):
+        """Waits until all the submitted jobs are processed"""
+        self._jobs.put(None)
+        self._fetcher.join()
+        self._segmenter.join()
+        self._pool.shutdown()
+
+    def _fetch_stage(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                self._cleaned.put(None)
+                return
+            key, items = job
+            failed = False
+            try:
+                for payload in metrics.timed("fetch", self.fetch(items)):
+                    self._cleaned.put((key, self._pool.submit(collect, self.clean, payload), False))
+            except Exception:
+                traceback.print_exc()
+                failed = True
+            self._cleaned.put((key, None, failed)) #end of the job
+
+    def _segment_stage(self):
+        failed = False
+        while True:
+            message = self._cleaned.get()
+            if message is None:
+                return
+            key, future, fetch_failed = message
+            if future is not None:
+                try:
+                    result, recorded = future.result()
+                    metrics.merge(recorded)
+                    self.progress(key, result)
+                except Exception:
+                    #the next results are still stored, so that they aren't retrieved again by a resumed run
+                    traceback.print_exc()
+                    failed = True
+                continue
+            if failed or fetch_failed:
+                self.failed.append(key)
+            else:
+                try:
+                    self.segment(key)
+                except Exception:
+                    traceback.print_exc()
+                    self.failed.append(key)
+            failed = False
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Spelling and grammar correction of the extracted sentences with LanguageTool (see the --spellcheck option).
+
+language_check.LanguageTool starts a LanguageTool server (a Java process) when it's created, so a SpellChecker
+creates it once per language and process, and reuses it for every sentence:
+    * the sentences of a batch are checked with a single request, their matches being mapped back to each sentence,
+    * the sentences are corrected until LanguageTool has no more suggestions (at most "max_rounds" times),
+    * the corrections are cached by sentence hash.
+
+The checker is created by a factory taking a language code, so that a stand-in can replace LanguageTool, e.g.
+StandInChecker to check the batching and the caching without Java:
+    checker = SpellChecker("fr", factory=lambda lang: StandInChecker({"recu": "reçu"}))
+"""
+
+import bisect
+import hashlib
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+from lazy import lazy_import
+language_check = lazy_import("language_check")
+
+#codes of the LanguageTool languages. LanguageTool doesn't support Welsh.
+LANGUAGETOOL_CODES = {"fr": "fr", "en": "en-US"}
+
+#separates the sentences of a batch, so that LanguageTool checks them as distinct paragraphs
+SEPARATOR = "\n\n"
+
+#"length" is the length of the error, and "replacements" the suggestions, the best one first
+Match = namedtuple("Match", ["offset", "length", "replacements", "rule_id"])
+
+
+def languagetool_factory(lang):
+    return language_check.LanguageTool(LANGUAGETOOL_CODES.get(lang, lang))
+
+
+def to_match(match):
+    """Converts a language_check match"""
+    return Match(match.offset, match.errorlength, match.replacements, match.ruleId)
+
+
+def apply_matches(text, matches):
+    """Replaces each error by its first suggestion, like language_check.correct. Overlapping matches are skipped."""
+    pieces = []
+    end = len(text)
+    for match in sorted(matches, key=lambda match: match.offset, reverse=True):
+        if not match.replacements or match.offset + match.length > end:
+            continue
+        pieces.append(text[match.offset + match.length:end])
+        pieces.append(match.replacements[0])
+        end = match.offset
+    pieces.append(text[:end])
+    return "".join(reversed(pieces))
+
+
+class StandInChecker(object):
+    """Stand-in for language_check.LanguageTool, suggesting the corrections of a dictionary of misspelt words"""
+
+    def __init__(self, corrections):
+        self.corrections = corrections
+        self.requests = 0
+        self._regex = re.compile(r"\b(" + "|".join(re.escape(word) for word in corrections) + r")\b") if corrections else None
+
+    def check(self, text):
+        self.requests += 1
+        if self._regex is None:
+            return []
+        return [Match(found.start(), len(found.group()), [self.corrections[found.group()]], "STAND_IN")
+                for found in self._regex.finditer(text)]
+
+
+class SpellChecker(object):
+    """
+    The "factory" parameter creates the checker of the language (by default a language_check.LanguageTool).
+    At most "cache_size" corrections are cached.
+    """
+
+    def __init__(self, lang, factory=None, cache_size=100000, max_rounds=5):
+        self.lang = lang
+        self.tool = (factory or languagetool_factory)(lang)
+        self.cache_size = cache_size
+        self.max_rounds = max_rounds
+        self.hits = 0
+        self._cache = OrderedDict()
+        #the checker may be shared by the threads processing several users (see crawl.py)
+        self._lock = threading.Lock()
+
+    def _check_batch(self, texts):
+        """Returns the list of the matches of each text, checking all the texts in a single request"""
+        matches = [[] for text in texts]
+        starts = []
+        position = 0
+        for text in texts:
+            starts.append(position)
+            position += len(text) + len(SEPARATOR)
+        for match in self.tool.check(SEPARATOR.join(texts)):
+            if not isinstance(match, Match):
+                match = to_match(match)
+            #the text containing the match, found by its offset
+            i = bisect.bisect_right(starts, match.offset) - 1
+            offset = match.offset - starts[i]
+            if offset + match.length > len(texts[i]):
+                continue #a match overlapping two sentences
+            #can't use automatic correction if there's no suggestion
+            if match.rule_id == "HUNSPELL_NO_SUGGEST_RULE":
+                continue
+            matches[i].append(match._replace(offset=offset))
+        return matches
+
+    def correct_batch(self, texts):
+        """Returns the list of the corrected texts"""
+        keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+        with self._lock:
+            corrected = [self._cache.get(key) for key in keys]
+            self.hits += sum(1 for text in corrected if text is not None)
+        pending = [i for i, text in enumerate(corrected) if text is None]
+        #the same sentence is only checked once
+        unique = OrderedDict((texts[i], texts[i]) for i in pending)
+        remaining = list(unique)
+        for _ in range(self.max_rounds):
+            if not remaining:
+                break
+            current = [unique[text] for text in remaining]
+            still_wrong = []
+            for text, value, matches in zip(remaining, current, self._check_batch(current)):
+                if matches:
+                    unique[text] = apply_matches(value, matches)
+                    still_wrong.append(text)
+            remaining = still_wrong
+        with self._lock:
+            for i in pending:
+                corrected[i] = unique[texts[i]]
+                self._remember(keys[i], corrected[i])
+        return corrected
+
+    def correct(self, text):
+        return self.correct_batch([text])[0]
+
+    def correct_stream(self, texts, batch_size=64, as_tuples=False):
+        """
+        Corrects an iterable of texts by batches, yielding the corrected texts in order.
+        If "as_tuples" is True, the texts are (text, context) tuples, and (corrected text, context) tuples are yielded.
+        """
+        if not as_tuples:
+            texts = ((text, None) for text in texts)
+        batch = []
+        for item in texts:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                for item in self._correct_items(batch, as_tuples):
+                    yield item
+                batch = []
+        if batch:
+            for item in self._correct_items(batch, as_tuples):
+                yield item
+
+    def _correct_items(self, items, as_tuples):
+        corrected = self.correct_batch([text for text, context in items])
+        if not as_tuples:
+            return corrected
+        return [(text, context) for text, (_, context) in zip(corrected, items)]
+
+    def _remember(self, key, text):
+        self._cache[key] = text
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+_checkers = {}
+_checkers_lock = threading.Lock()
+
+
+def get_checker(lang, factory=None):
+    """Returns the checker of a language, created on the first call (once per process)"""
+    with _checkers_lock:
+        if lang not in _checkers:
+            _checkers[lang] = SpellChecker(lang, factory=factory)
+        return _checkers[lang]
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Check of the translated articles: an article whose talk page uses a translation template (e.g. "Traduit de") is
+maybe not under the CC0 licence, so its content isn't retrieved.
+
+Instead of downloading each talk page and searching it for the templates, the talk pages are checked by batches of
+50 titles per request (prop=templates), the API only returning the translation templates the pages use.
+The verdicts are stored in a SQLite database, shared by all the users and the following runs.
+"""
+
+import sqlite3
+import threading
+import time
+
+from api import MAX_REVIDS_PER_QUERY
+
+
+def template_titles(template_prefix, templates):
+    """Returns the full titles of the templates, e.g. "Modèle:Traduit de" (Mediawiki capitalizes the first letter)"""
+    return [template_prefix + name[:1].upper() + name[1:] for name in templates]
+
+
+class TranslationStore(object):
+    """
+    The "path" parameter is the SQLite database file, e.g. the --cache file of Wikipedia_CC0.py.
+    The verdicts older than "max_age" seconds are checked again (never by default).
+    """
+
+    def __init__(self, path, max_age=None):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS translations (
+                                lang TEXT,
+                                title TEXT,
+                                translated INTEGER,
+                                checked REAL,
+                                PRIMARY KEY (lang, title))""")
+        self._db.commit()
+
+    def get_many(self, lang, titles):
+        """Returns the dictionary of the stored verdicts of the talk pages"""
+        verdicts = {}
+        oldest = time.time() - self.max_age if self.max_age is not None else 0
+        titles = list(titles)
+        with self._lock:
+            #SQLite limits the number of parameters of a statement
+            for i in range(0, len(titles), 500):
+                chunk = titles[i:i + 500]
+                rows = self._db.execute("SELECT title, translated FROM translations WHERE lang = ? AND checked >= ? AND title IN ({0})".format(
+                    ",".join("?" * len(chunk))), [lang, oldest] + chunk).fetchall()
+                verdicts.update((title, bool(translated)) for title, translated in rows)
+        return verdicts
+
+    def put_many(self, lang, verdicts):
+        now = time.time()
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)",
+                                 [(lang, title, int(translated), now) for title, translated in verdicts.items()])
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class TranslationChecker(object):
+    """
+    The "api" parameter is an api.ApiClient, and "talk_prefix" and "template_prefix" the namespaces of the talk pages
+    and of the templates (see Wikipedia_CC0.mapping_lang_template).
+    The "templates" parameter lists the names of the translation templates.
+    The optional "store" parameter is a TranslationStore. The verdicts are also kept in memory for the run.
+    """
+
+    def __init__(self, api, talk_prefix, template_prefix, templates, store=None, batch_size=MAX_REVIDS_PER_QUERY):
+        self.api = api
+        self.talk_prefix = talk_prefix
+        self.templates = template_titles(template_prefix, templates)
+        self.store = store
+        self.known = {}
+        self.batch_size = batch_size
+        self.requests = 0
+
+    def fetch_batch(self, talk_titles):
+        """Returns the verdicts of a batch of talk pages, or None if a request failed"""
+        query = {"action":"query", "prop":"templates", "titles":"|".join(talk_titles),
+                 "tltemplates":"|".join(self.templates), "tllimit":"max",
+                 "format":"json"}
+        verdicts = dict.fromkeys(talk_titles, False)
+        while True:
+            response = self.api.post(dict(query))
+            self.requests += 1
+            if response is None or "query" not in response:
+                return None
+            #the API returns the normalized titles
+            renamed = {entry["to"]: entry["from"] for entry in response["query"].get("normalized", [])}
+            for page in response["query"]["pages"].values():
+                if page.get("templates"):
+                    verdicts[renamed.get(page["title"], page["title"])] = True
+            if "continue" in response and "tlcontinue" in response["continue"]:
+                query.update(response["continue"])
+            else:
+                break
+        return verdicts
+
+    def check(self, titles):
+        """
+        Returns the dictionary of the verdicts (True if the article is a translation) of the articles.
+        If the talk pages of some articles couldn't be checked, these articles are considered translations
+        (let's be conservative), and they will be checked again on the next call.
+        """
+        talk_titles = {title: self.talk_prefix + title for title in titles}
+        pending = [talk for talk in sorted(set(talk_titles.values())) if talk not in self.known]
+        if pending and self.store is not None:
+            stored = self.store.get_many(self.api.lang, pending)
+            self.known.update(stored)
+            pending = [talk for talk in pending if talk not in stored]
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        for verdicts in self.api.map(batches, fetch=self.fetch_batch):
+            if verdicts is None:
+                continue
+            self.known.update(verdicts)
+            if self.store is not None:
+                self.store.put_many(self.api.lang, verdicts)
+            for talk, translated in sorted(verdicts.items()):
+                if translated:
+                    print("Translation from", talk[len(self.talk_prefix):], "excluded")
+        return {title: self.known.get(talk, True) for title, talk in talk_titles.items()}
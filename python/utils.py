@@ -1,20 +1,21 @@
-import roman
 import re
 import os
 import sys
 
-from num2words import num2words
-from typing.re import Pattern
-
 from collections import Counter
-from nltk.tokenize import word_tokenize
-from nltk.collocations import BigramCollocationFinder
-from nltk.collocations import BigramAssocMeasures
-from nltk.collocations import TrigramCollocationFinder
-from nltk.collocations import TrigramAssocMeasures
+from functools import lru_cache
 import textwrap
-import language_check
 import warnings
+
+#the heavy dependencies are only imported when first used (see lazy.py)
+from lazy import lazy_import
+roman = lazy_import("roman")
+nltk_tokenize = lazy_import("nltk.tokenize")
+nltk_collocations = lazy_import("nltk.collocations")
+#the numbers are converted to words by verbalize.py
+from verbalize import get_verbalizer
+
+Pattern = type(re.compile(""))
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 mapping_normalization = [
@@ -72,7 +73,7 @@ superscript_chars_mapping = {
 
   ' ': ' ',
 
-  # Those should be in sync with ORDINAL_REGEX
+  # Those should be in sync with verbalize.ORDINAL_REGEX
   'e': 'ieme',
   'è': 'ieme ',
   'e,': 'ieme,',
@@ -96,8 +97,6 @@ superscript_chars_mapping = {
   'eme': 'ieme',
 }
 
-ORDINAL_REGEX = re.compile("(\d+)([ieme|ier|iere]+)")
-
 subscript_chars_mapping = {
   '0': u'\u2080',
   '1': u'\u2081',
@@ -133,6 +132,11 @@ NUMS_REGEX = re.compile("(\d+,?\u00A0?\d+)|(\d+\w+)|(\d)*")
 def getNumbers(text):
     return NUMS_REGEX.split(text)
 
+#the runs of roman numeral characters, which aren't part of a word (see convert_roman_numbers)
+ROMAN_NUMERAL_REGEX = re.compile(r"(?<![A-Za-z])[XVI]+(?![A-Za-z])")
+#the numerals which are also words of a language, and aren't converted, e.g. the English pronoun "I"
+ROMAN_NUMERAL_WORDS = {"en": {"I"}, "cy": {"I"}}
+
 def getRomanNumbers(ch):
   ROMAN_CHARS = "XVI"
   ro  = ''
@@ -160,43 +164,10 @@ def getRomanNumbers(ch):
     yield ch[ros-1], '', ro
 
 def filter_numbers(inp, lang="fr"):
-  finalinp = ''
-
-  #print('filter_numbers', 'inp=', inp)
-
-  for e in getNumbers(inp):
-    if not e:
-      continue
-
-    newinp = e
-    #print('filter_numbers', 'e=', e)
-
-    try:
-      ee = ''.join(e.split())
-      if int(e) > 0:
-        #print('filter_numbers', 'INT:BEFORE', 'ee=', ee, 'newinp=', newinp)
-        newinp = num2words(int(ee), lang=lang)
-        #print('filter_numbers', 'INT:AFTER', 'ee=', ee, 'newinp=', newinp)
-    except ValueError:
-      try:
-        ee = ''.join(e.replace(',', '.').split())
-        if float(ee):
-          #print('filter_numbers', 'FLOAT:BEFORE', 'ee=', ee, 'newinp=', newinp)
-          newinp = num2words(float(ee), lang=lang)
-          #print('filter_numbers', 'FLOAT:AFTER', 'ee=', ee, 'newinp=', newinp)
-      except ValueError:
-        matches = ORDINAL_REGEX.match(e)
-        #print('filter_numbers', 'ORDINAL', 'e=', e, matches)
-        if matches:
-          newinp = num2words(int(matches.group(1)), ordinal=True, lang=lang)
-
-    finalinp += newinp
-
-    #print('filter_numbers', 'e=', e, 'newinp=', newinp, 'finalinp=', finalinp)
-
-  return finalinp
-
-def maybe_normalize(value, mapping=mapping_normalization):
+  """Converts the numbers of a text to words (see verbalize.py)"""
+  return get_verbalizer(lang)(inp)
+
+def maybe_normalize(value, mapping=mapping_normalization, lang=None):
   for norm in mapping:
     if type(norm[0]) == str:
       value = value.replace(norm[0], norm[1])
@@ -205,15 +176,36 @@ def maybe_normalize(value, mapping=mapping_normalization):
     else:
       print('UNEXPECTED', type(norm[0]), norm[0])
 
-  for ro_before, ro_after, ro in getRomanNumbers(value):
-    #print('maybe_normalize', 'ro=', ro)
-    try:
-      value = value.replace(ro_before + ro + ro_after, ro_before + str(roman.fromRoman(ro)) + ro_after)
-    except roman.InvalidRomanNumeralError as ex:
-      print(ex)
-      pass
+  return convert_roman_numbers(value, lang)
 
-  return value
+@lru_cache(maxsize=4096)
+def roman_to_int(numeral):
+  """Returns the value of a roman numeral, or None if it isn't valid (e.g. "IIII")"""
+  try:
+    return roman.fromRoman(numeral)
+  except roman.InvalidRomanNumeralError:
+    return None
+
+def convert_roman_numbers(value, lang=None):
+  """
+  Converts the roman numerals of a text to digits in a single scan, e.g. "Louis XIV." -> "Louis 14."
+  A numeral is a run of X, V and I between two characters which aren't letters (see ROMAN_NUMERAL_REGEX). The
+  numerals starting the text, the invalid ones, and the words of the language in ROMAN_NUMERAL_WORDS are kept.
+  """
+  words = ROMAN_NUMERAL_WORDS.get(lang, ())
+
+  def replace(match):
+    start, end = match.span()
+    numeral = match.group()
+    #the regex only rules out the ASCII letters around the numeral
+    if start == 0 or value[start - 1].isalpha() or (end < len(value) and value[end].isalpha()) or numeral in words:
+      return numeral
+    number = roman_to_int(numeral)
+    if number is None:
+      return numeral
+    return str(number)
+
+  return ROMAN_NUMERAL_REGEX.sub(replace, value)
 
 def maybe_translate(element, mapping):
   value = maybe_normalize(element.nodeValue)
@@ -260,10 +252,16 @@ def recursive_text(root, finaltext=""):
         finaltext += recursive_text(c)
   return finaltext
 
-def extract_sentences(arr, min_words, max_words, nlp=None):
+def extract_sentences(arr, min_words, max_words, nlp=None, profile="theatre"):
+  """ Segments the texts into sentences, and returns those having between "min_words" and "max_words" words.
+      The "profile" parameter is the filter profile applied to the sentences segmented by spaCy (see FILTER_PROFILES).
+      With the "theatre" profile, the most common nouns and collocations of each chunk of text are computed first,
+      to spot the stage directions. The other profiles skip this analysis.
+  """
+  profile = get_filter_profile(profile)
   full_text = ' '.join(arr)
   if nlp == None: #if no nlp object were passed, we use basic sentence splitting      
-    raw_sentences = (full_text).split('. ')
+    all_sentences = (full_text).split('. ')
   else: 
     #if we pass a nlp object, we use the Spacy library. See example in libretheatre.py
     #There's a 1000000 character limit in Spacy NER parser, so we need to avoid passing a too long text
@@ -271,24 +269,65 @@ def extract_sentences(arr, min_words, max_words, nlp=None):
     all_sentences = []
     for chunk in text_list:
         doc = nlp(chunk, disable=["ner", "parser"])  
-        #Retrieve a list of common nouns, pronouns, and expressions in the doc. We'll use them to spot stage directions
-        most_common_expressions = common_nouns(doc) + common_collocations(chunk)
+        most_common_expressions = []
+        if profile.needs_statistics:
+          #Retrieve a list of common nouns, pronouns, and expressions in the doc. We'll use them to spot stage directions
+          most_common_expressions = common_nouns(doc) + common_collocations(chunk)
         #Retrieve a sentence list, removing stage directions (see maybe_clean_stage_directions function )
-        raw_sentences = [maybe_clean_stage_directions(sent, most_common_expressions) for sent in doc.sents]
-        #maybe_clean_stage_directions function returns "None" when a stage direction is spotted, so we have to remove None items from the list
+        raw_sentences = [profile.filter(sent, most_common_expressions) for sent in sentences_of(doc)]
+        #the filter returns "None" when a sentence is skipped (e.g. a stage direction), so we have to remove None items from the list
         raw_sentences = [sentence for sentence in raw_sentences if sentence != None]
         all_sentences += raw_sentences
   return filter(lambda x: len(splitIntoWords(x)) >= min_words and len(splitIntoWords(x)) <= max_words, all_sentences) #raw_sentences)
 
+def extract_sentences_stream(paragraphs, min_words, max_words, nlp, batch_size=64, n_process=1, as_tuples=False, profile="theatre"):
+  """ Streaming variant of extract_sentences: segments the paragraphs one by one with nlp.pipe,
+      and yields the sentences as soon as they are produced, instead of segmenting the whole text at once.
+      Only the components needed for the segmentation are run.
+      The "profile" parameter is the filter profile (see FILTER_PROFILES). With the "theatre" profile, the statistics
+      used to spot the stage directions are updated paragraph by paragraph (see CorpusStatistics), so the first
+      sentences are filtered with the statistics of the first paragraphs only.
+      If "as_tuples" is True, the paragraphs are (text, context) tuples, and (sentence, context) tuples are yielded.
+  """
+  profile = get_filter_profile(profile)
+  statistics = CorpusStatistics() if profile.needs_statistics else None
+  #the part-of-speech tags are predicted by the "tagger" of spaCy 2, and by the "tok2vec", "morphologizer" and
+  #"attribute_ruler" of the spaCy 3 models
+  needed = ["tagger", "tok2vec", "morphologizer", "attribute_ruler", set_custom_boundaries.__name__]
+  disable = [name for name in nlp.pipe_names if name not in needed]
+  kwargs = {"n_process": n_process} if n_process > 1 else {} #n_process requires spaCy >= 2.2.2
+  if not as_tuples:
+    paragraphs = ((text, None) for text in paragraphs)
+  for doc, context in nlp.pipe(paragraphs, as_tuples=True, batch_size=batch_size, disable=disable, **kwargs):
+    most_common_expressions = []
+    if statistics is not None:
+      statistics.add(doc)
+      most_common_expressions = statistics.expressions()
+    for sent in sentences_of(doc):
+      sentence = profile.filter(sent, most_common_expressions)
+      if sentence == None:
+        continue
+      if len(splitIntoWords(sentence)) >= min_words and len(splitIntoWords(sentence)) <= max_words:
+        yield (sentence, context) if as_tuples else sentence
+
+def sentences_of(doc):
+  """ Returns the sentences of a doc. A paragraph without any verb or punctuation (e.g. a list of names) may get no
+      sentence boundary at all from set_custom_boundaries, in which case doc.sents raises a ValueError (E030):
+      the whole paragraph is then a single sentence.
+  """
+  #Doc.has_annotation is spaCy >= 3, Doc.is_sentenced spaCy 2
+  sentenced = doc.has_annotation("SENT_START") if hasattr(doc, "has_annotation") else doc.is_sentenced
+  return doc.sents if sentenced else [doc[:]]
+
 def check_output_dir(output):
   if not os.path.isdir(output):
     print('Directory does not exists', output, file=sys.stderr)
     sys.exit(1)
 
 def common_collocations(text, occurences=20):
-  tokens = word_tokenize(text)
+  tokens = nltk_tokenize.word_tokenize(text)
   final_results = []
-  for measures, collocationFinder, min_size in [(BigramAssocMeasures(), BigramCollocationFinder, 2), (TrigramAssocMeasures(), TrigramCollocationFinder, 3)]:
+  for measures, collocationFinder, min_size in [(nltk_collocations.BigramAssocMeasures(), nltk_collocations.BigramCollocationFinder, 2), (nltk_collocations.TrigramAssocMeasures(), nltk_collocations.TrigramCollocationFinder, 3)]:
     m = measures
     finder = collocationFinder.from_words(tokens, window_size=min_size)
     finder.apply_word_filter(lambda w: len(w) < 2)
@@ -297,16 +336,67 @@ def common_collocations(text, occurences=20):
     final_results += [" ".join(gram) for gram in results]
   return final_results
   
+def nouns_of(doc):
+  return [token.text for token in doc if token.is_stop != True and token.is_punct != True and token.pos_ in ["NOUN", "PROPN"]]
+
 def common_nouns(doc):
        
-  nouns = [token.text for token in doc if token.is_stop != True and token.is_punct != True and token.pos_ in ["NOUN", "PROPN"]]
+  nouns = nouns_of(doc)
   word_freq = Counter(nouns)
   word_list = [word for word, occ in word_freq.most_common(15) if occ > 2] 
   return word_list 
 
-def maybe_clean_stage_directions(sentence, most_common_expressions):
-  """ Fonction destinée à supprimer les didascalies du texte
-      et à faire quelques nettoyages divers sur les phrases
+class CorpusStatistics(object):
+  """ The most common nouns and collocations of the paragraphs seen so far, updated paragraph by paragraph:
+      the streaming counterpart of common_nouns and common_collocations, for the profiles which need them.
+      The collocations are the n-grams of spaCy's tokens with the best Student's t score, like the ones of NLTK's
+      collocation finders. The expressions are only ranked again every "refresh" paragraphs.
+  """
+
+  def __init__(self, nouns=15, collocations=20, refresh=64):
+    self.nouns = nouns
+    self.collocations = collocations
+    self.refresh = refresh
+    self.noun_counts = Counter()
+    self.word_counts = Counter()
+    self.ngram_counts = {2: Counter(), 3: Counter()}
+    self.total = 0
+    self._added = 0
+    self._expressions = []
+
+  def add(self, doc):
+    self.noun_counts.update(nouns_of(doc))
+    words = [token.text for token in doc if not token.is_space]
+    self.word_counts.update(words)
+    self.total += len(words)
+    for size, counts in self.ngram_counts.items():
+      #like the word filter of common_collocations, the n-grams with a word shorter than 2 characters are ignored
+      counts.update(ngram for ngram in zip(*[words[i:] for i in range(size)]) if min(len(word) for word in ngram) >= 2)
+    self._added += 1
+    if (self._added - 1) % self.refresh == 0:
+      self._expressions = None
+
+  def student_t(self, ngram, count):
+    expected = 1.0
+    for word in ngram:
+      expected *= self.word_counts[word]
+    expected /= self.total ** (len(ngram) - 1)
+    return (count - expected) / (count ** 0.5)
+
+  def expressions(self):
+    """Returns the most common nouns (seen more than twice) and the best collocations"""
+    if self._expressions is None:
+      nouns = [word for word, occ in self.noun_counts.most_common(self.nouns) if occ > 2]
+      collocations = []
+      for size, counts in sorted(self.ngram_counts.items()):
+        best = sorted(counts.items(), key=lambda item: -self.student_t(*item))[:self.collocations]
+        collocations += [" ".join(ngram) for ngram, count in best]
+      self._expressions = nouns + collocations
+    return self._expressions
+
+def strip_sentence(sentence):
+  """ Removes the punctuation and spaces starting a sentence (a spaCy span), and returns None if it has less than
+      4 words
   """
   #cleaning the beginning of the sentence (removing punctuations and spaces)
   while sentence[0].pos_ in ["PUNCT", "SPACE"]:
@@ -314,9 +404,18 @@ def maybe_clean_stage_directions(sentence, most_common_expressions):
     if sentence.text == "":
         break
     
-  #Don't keep sentences longer than 4 words
+  #Don't keep sentences shorter than 4 words
   if len([word for word in sentence if word.is_punct == False and word.is_space == False]) < 4: 
     return None  
+  return sentence
+
+def maybe_clean_stage_directions(sentence, most_common_expressions):
+  """ Fonction destinée à supprimer les didascalies du texte
+      et à faire quelques nettoyages divers sur les phrases
+  """
+  sentence = strip_sentence(sentence)
+  if sentence == None:
+    return None
   
   #All-caps word followed by a punctuation mark: certainly a stage direction (Example : "ALFRED, déconcerté")
   if sentence[0].is_upper and sentence[1].is_punct: 
@@ -351,6 +450,41 @@ def maybe_clean_stage_directions(sentence, most_common_expressions):
   else:
     return sentence.text
 
+class SentenceFilter(object):
+  """ A filter profile: cleans up a sentence segmented by spaCy, or returns None to skip it.
+      The profiles whose "needs_statistics" is True get the most common nouns and collocations of the text
+      (see common_nouns, common_collocations and CorpusStatistics), which are expensive to compute.
+  """
+  needs_statistics = False
+
+  def filter(self, sentence, most_common_expressions):
+    sentence = strip_sentence(sentence)
+    if sentence == None:
+      return None
+    return sentence.text
+
+class WikipediaFilter(SentenceFilter):
+  """ Encyclopedic prose: the sentences are only cleaned up, there are no stage directions to look for """
+
+class TheatreFilter(SentenceFilter):
+  """ Theatre plays: the stage directions and the names of the characters are removed (see maybe_clean_stage_directions) """
+  needs_statistics = True
+
+  def filter(self, sentence, most_common_expressions):
+    return maybe_clean_stage_directions(sentence, most_common_expressions)
+
+#the filter profiles, by name. A new kind of text gets its own SentenceFilter subclass here
+FILTER_PROFILES = {"wikipedia": WikipediaFilter,
+                   "theatre": TheatreFilter}
+
+def get_filter_profile(profile):
+  """Returns the filter of a profile, given by its name (see FILTER_PROFILES) or as a SentenceFilter"""
+  if isinstance(profile, SentenceFilter):
+    return profile
+  if profile not in FILTER_PROFILES:
+    raise ValueError("Unknown filter profile: {0}".format(profile))
+  return FILTER_PROFILES[profile]()
+
 def set_custom_boundaries(doc):
   for token in doc[:-1]:
     next_token = doc[token.i+1]  
@@ -363,12 +497,6 @@ def set_custom_boundaries(doc):
   return doc
 
 def correct_sentence(text, lang_code):
-    tool = language_check.LanguageTool(lang_code)    
-    while True:
-        matches = tool.check(text)
-        #can't use automatic correction if there's no suggestion
-        matches = [match for match in matches if match.ruleId != "HUNSPELL_NO_SUGGEST_RULE"]
-        if len(matches) == 0:
-            break        
-        text = language_check.correct(text, matches)   
-    return text
+    #the LanguageTool server of the language is only started once (see spellcheck.py)
+    from spellcheck import get_checker
+    return get_checker(lang_code).correct(text)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Validation rules of the sentences sent to Common Voice, used by Validate.py, and by the extractor before writing the
+sentences (see its --validate option).
+
+A sentence is rejected, with a reason code, if it contains:
+    * a number ("NUMBERS"),
+    * a symbol ("SYMBOLS"),
+    * an abbreviation, i.e. several capital letters ("ABBREVIATION"),
+    * too few or too many words ("TOO LONG"),
+    * a word without any letter of the alphabet ("OUT OF ALPHABET"),
+    * or if it isn't in the processed language ("LANGUAGE", only if a language is given).
+The patterns are compiled once: the numbers, the symbols and the abbreviations are found by a single scan of the
+sentence, and the words are counted and checked without splitting the sentence.
+"""
+
+import re
+
+MIN_WORDS = 1
+MAX_WORDS = 15
+
+APOSTROPHES = "'‘’ʼ"
+SEPARATORS = ",.?!\";|`"
+VALID_LETTERS = 'aáàâäbcdeéèêëfghiíìîïjklmnoóòôöpqrstuúùûüvwẃẁŵẅyýỳŷÿz'
+
+NUMBERS_REGEX = re.compile(r"[0-9]")
+SYMBOLS_REGEX = re.compile(r"[<>\+\*\\#@\^\[\]\(\)\/]")
+#two capital letters, possibly separated by dots
+ABBREVIATION_REGEX = re.compile(r"[A-Z]\.*[A-Z]")
+#any of the three above: most sentences are accepted by this single scan, and the reason of the others is then found
+CHARACTERS_REGEX = re.compile("|".join(regex.pattern for regex in [NUMBERS_REGEX, SYMBOLS_REGEX, ABBREVIATION_REGEX]))
+
+#the separators and apostrophes separate the words
+_SEPARATORS_CLASS = r"\s" + re.escape("\t" + SEPARATORS + APOSTROPHES)
+WORD_REGEX = re.compile(r"[^" + _SEPARATORS_CLASS + r"]+")
+#a word without any valid letter
+INVALID_WORD_REGEX = re.compile(r"(?<![^" + _SEPARATORS_CLASS + r"])[^" + _SEPARATORS_CLASS + VALID_LETTERS + VALID_LETTERS.upper() + r"]+(?![^" + _SEPARATORS_CLASS + r"])")
+
+
+def tokenize(sentence):
+    return WORD_REGEX.findall(sentence)
+
+
+class SentenceValidator(object):
+    """
+    The sentences must have more than "min_words" and less than "max_words" words.
+    If "lang" is given, the sentences which aren't in this language are rejected (see langident.py, and its
+    "candidates" parameter).
+    """
+
+    def __init__(self, lang=None, candidates=None, min_words=MIN_WORDS, max_words=MAX_WORDS):
+        self.lang = lang
+        self.candidates = candidates
+        self.min_words = min_words
+        self.max_words = max_words
+        self._language_filter = None
+
+    def check_text(self, sentence):
+        """Returns the reason why a sentence is rejected by the rules not depending on its language, or None"""
+        if CHARACTERS_REGEX.search(sentence):
+            if NUMBERS_REGEX.search(sentence):
+                return "NUMBERS"
+            if SYMBOLS_REGEX.search(sentence):
+                return "SYMBOLS"
+            return "ABBREVIATION"
+        count = len(WORD_REGEX.findall(sentence))
+        if not (count > self.min_words and count < self.max_words):
+            return "TOO LONG"
+        if INVALID_WORD_REGEX.search(sentence):
+            return "OUT OF ALPHABET"
+        return None
+
+    def check_batch(self, sentences):
+        """Returns the list of the reasons why the sentences are rejected (None for the accepted ones)"""
+        reasons = [self.check_text(sentence) for sentence in sentences]
+        if self.lang is not None:
+            if self._language_filter is None:
+                #imported here, so that the language identification is only required when it's used
+                from langident import get_language_filter
+                self._language_filter = get_language_filter(self.lang, self.candidates)
+            passed = [i for i, reason in enumerate(reasons) if reason is None]
+            for i, verdict in zip(passed, self._language_filter.accepts_batch([sentences[i] for i in passed])):
+                if not verdict:
+                    reasons[i] = "LANGUAGE"
+        return reasons
+
+    def check(self, sentence):
+        return self.check_batch([sentence])[0]
+
+
+_validators = {}
+
+
+def get_validator(lang=None, candidates=None):
+    """Returns the validator of a language, created on the first call (once per process)"""
+    key = (lang, tuple(candidates) if candidates else None)
+    if key not in _validators:
+        _validators[key] = SentenceValidator(lang, candidates)
+    return _validators[key]
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Verbalization of the numbers of a text, e.g. "en 1984" -> "en mille neuf cent quatre-vingt-quatre" (see
+utils.filter_numbers).
+
+    verbalizer = get_verbalizer("fr")
+    text = verbalizer(text)
+
+Compared to converting each fragment of utils.getNumbers:
+    * the numbers are found by a single scan of the text, and the rest of the text is copied as is,
+    * the conversions of num2words are cached per (language, value, ordinal): the years and counts are repeated
+      a lot across the paragraphs,
+    * the output is assembled once (re.sub), instead of by repeated concatenation.
+A number is converted like before: an integer, else a decimal number (with a comma or a dot), else an ordinal.
+
+Welsh ("cy") needs num2words >= 0.5.13. The Welsh ordinals (1af, 2il, 3ydd, 5ed, 20fed, 11eg...), thousands
+separators (1,500) and decimal numbers (1.5) are recognized, and a number num2words can't convert (e.g. the ordinals
+beyond a few hundreds) is kept as digits, instead of failing the whole text.
+"""
+
+import re
+from functools import lru_cache
+
+from lazy import lazy_import
+num2words_module = lazy_import("num2words")
+
+#the numbers found by utils.NUMS_REGEX, without its empty matches: the fragments between them are never converted
+NUMBER_REGEX = re.compile(r"\d+,?\u00A0?\d+|\d+\w+|\d")
+ORDINAL_REGEX = re.compile(r"(\d+)([ieme|ier|iere]+)")
+
+#the Welsh numbers: the ordinals (of any length), the thousands separators (a comma or a space) and the decimal dot
+#come first, so that e.g. "20fed" or "1,500" are single numbers
+WELSH_NUMBER_REGEX = re.compile(r"\d+(?:af|il|ydd|fed|ed|eg)\b|\d{1,3}(?:[,\u00A0]\d{3})+\b|\d+\.\d+|" + NUMBER_REGEX.pattern)
+
+#the numbers, ordinals and thousands separators of each language, when they differ from the default ones
+NUMBER_REGEXES = {"cy": WELSH_NUMBER_REGEX}
+ORDINAL_REGEXES = {"cy": re.compile(r"(\d+)(?:af|il|ydd|fed|ed|eg)$")}
+THOUSANDS_REGEXES = {"cy": re.compile(r"\d{1,3}(?:[,\u00A0]\d{3})+$")}
+#the languages partly supported by num2words, whose numbers which can't be converted are kept as digits
+PARTIAL_LANGUAGES = ["cy"]
+
+
+@lru_cache(maxsize=65536, typed=True)
+def number_to_words(lang, value, ordinal=False):
+    """Returns num2words' conversion of an int or a float, cached (1 and 1.0 are converted separately)"""
+    return num2words_module.num2words(value, ordinal=ordinal, lang=lang)
+
+
+class NumberVerbalizer(object):
+    """
+    Converts the numbers of the texts of a language to words.
+    """
+
+    def __init__(self, lang):
+        self.lang = lang
+        self.number_regex = NUMBER_REGEXES.get(lang, NUMBER_REGEX)
+        self.ordinal_regex = ORDINAL_REGEXES.get(lang, ORDINAL_REGEX)
+        self.thousands_regex = THOUSANDS_REGEXES.get(lang)
+        self.partial = lang in PARTIAL_LANGUAGES
+
+    def convert(self, number):
+        """Returns the words of a number found by NUMBER_REGEX (or the number itself, if it isn't converted)"""
+        digits = number
+        if self.thousands_regex is not None and self.thousands_regex.match(number):
+            digits = number.replace(",", "").replace("\u00A0", "")
+        try:
+            if int(digits) > 0:
+                return number_to_words(self.lang, int(digits))
+            return number
+        except ValueError:
+            pass
+        try:
+            value = float("".join(number.replace(",", ".").split()))
+            if value:
+                return number_to_words(self.lang, value)
+            return number
+        except ValueError:
+            pass
+        match = self.ordinal_regex.match(number)
+        if match:
+            return number_to_words(self.lang, int(match.group(1)), ordinal=True)
+        return number
+
+    def _replace(self, match):
+        number = match.group()
+        if not self.partial:
+            return self.convert(number)
+        try:
+            return self.convert(number)
+        except NotImplementedError:
+            return number
+
+    def __call__(self, text):
+        return self.number_regex.sub(self._replace, text)
+
+
+_verbalizers = {}
+
+
+def get_verbalizer(lang):
+    """Returns the verbalizer of a language, created on the first call"""
+    if lang not in _verbalizers:
+        _verbalizers[lang] = NumberVerbalizer(lang)
+    return _verbalizers[lang]
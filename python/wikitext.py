@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+In-process conversion of wikitext lines to plain text.
+
+This replaces the former double pandoc round trip of the added lines (html to plain text, then mediawiki to html,
+then lxml's text_content), which spawned two pandoc processes per line. The conversion reproduces its output:
+    * the html tags are removed but their content is kept (including the content of <ref>), except for <math>,
+    * the html entities are decoded, then the {{lien|...}} rule (French Wikipedia) is applied,
+    * the templates are removed, including the nested ones,
+    * the internal links are replaced by their label, or by their target if they have none,
+    * the external links are replaced by their label,
+    * the bold/italic quotes, headings, list prefixes, table delimiters, and magic words are removed.
+Deliberate differences with pandoc: the images are always removed (pandoc keeps the caption of an image standing
+alone on its line), and the external links without label are removed (pandoc replaces them by a number).
+
+Usage, to check the conversion against the golden set, or to compare it with pandoc on a file of wikitext lines:
+    python wikitext.py --golden ../benchmarks/wikitext_golden.json
+    python wikitext.py --compare lines.txt
+"""
+
+import re
+from html import unescape
+
+MATH_REGEX = re.compile(r"<math[^>]*>.*?</math\s*>", re.IGNORECASE | re.DOTALL)
+COMMENT_REGEX = re.compile(r"<!--.*?(?:-->|$)", re.DOTALL)
+TAG_REGEX = re.compile(r"</?([a-zA-Z][a-zA-Z0-9]*)[^<>]*>")
+#tags separating their content from the surrounding text
+BLOCK_TAGS = {"br", "p", "div", "center", "blockquote", "pre", "li", "ul", "ol", "dl", "dd", "dt", "table", "tr", "td", "th", "gallery", "poem"}
+#the {{lien}} template (French Wikipedia) keeps its content, e.g. "{{lien|Louis XIII}}"
+LIEN_REGEX = re.compile(r"{{lien\|([^}]+)}}")
+BRACES_REGEX = re.compile(r"\{{2,}|\}{2,}")
+INTERNAL_LINK_REGEX = re.compile(r"\[\[([^\[\]]*)\]\]")
+EXTERNAL_LINK_REGEX = re.compile(r"\[(?:https?:|ftp:)?//[^\s\[\]]+(?:\s+([^\[\]]*))?\]", re.IGNORECASE)
+QUOTES_REGEX = re.compile(r"'{2,}")
+HEADING_REGEX = re.compile(r"^(=+)\s*(.*?)\s*\1\s*$")
+LIST_REGEX = re.compile(r"^[*#:;]+\s*")
+TABLE_REGEX = re.compile(r"^\s*(?:\{\||\|\}|\|-|\|\+)")
+MAGIC_WORD_REGEX = re.compile(r"__[A-Z]+__")
+SPACES_REGEX = re.compile(r"[ \t\r\n]+")
+
+FILE_NAMESPACES = {"file", "image", "fichier", "delwedd", "ffeil", "media"}
+
+
+def remove_templates(text):
+    """
+    Removes the templates and template parameters ("{{{1}}}") from a wikitext, including the nested ones.
+    Unbalanced braces are kept.
+    """
+    pieces = []
+    #the lengths of the runs of opening braces not closed yet
+    opened = []
+    start = 0
+    for match in BRACES_REGEX.finditer(text):
+        run = match.group()
+        if run[0] == "{":
+            if not opened:
+                pieces.append(text[start:match.start()])
+                start = match.start()
+            opened.append(len(run))
+            continue
+        if not opened:
+            continue #orphan closing braces
+        closing = len(run)
+        while closing >= 2 and opened:
+            length = opened.pop()
+            used = 3 if length >= 3 and closing >= 3 else 2
+            closing -= used
+            if length - used >= 2:
+                opened.append(length - used)
+        if not opened:
+            start = match.end()
+    pieces.append(text[start:])
+    return "".join(pieces)
+
+
+def _tag(match):
+    return " " if match.group(1).lower() in BLOCK_TAGS else ""
+
+
+def _internal_link(match):
+    parts = match.group(1).split("|")
+    target = parts[0].strip()
+    if ":" in target and target.split(":", 1)[0].strip().lower() in FILE_NAMESPACES:
+        return ""
+    if len(parts) > 1:
+        return parts[-1]
+    return target.lstrip(":")
+
+
+def _external_link(match):
+    return match.group(1) or ""
+
+
+def remove_quotes(line):
+    """
+    Removes the bold and italic markup of a line, like Mediawiki's doQuotes: when there are both an odd number of
+    bold and italic quotes, a bold quote is in fact an apostrophe followed by an italic quote (e.g. "l'''Afrique''").
+    """
+    tokens = QUOTES_REGEX.split(line)
+    runs = QUOTES_REGEX.findall(line)
+    if not runs:
+        return line
+    for i, run in enumerate(runs):
+        if len(run) == 4:
+            tokens[i] += "'"
+            runs[i] = "'''"
+        elif len(run) > 5:
+            tokens[i] += "'" * (len(run) - 5)
+            runs[i] = "'''''"
+    italics = sum(1 for run in runs if len(run) in (2, 5))
+    bolds = sum(1 for run in runs if len(run) in (3, 5))
+    if italics % 2 == 1 and bolds % 2 == 1:
+        #Mediawiki prefers a bold quote after a single-letter word, then after a multiletter word, then after a space
+        candidates = [i for i, run in enumerate(runs) if len(run) == 3]
+        single_letter = [i for i in candidates if len(tokens[i]) >= 1 and tokens[i][-1] != " "
+                         and (len(tokens[i]) == 1 or tokens[i][-2] == " ")]
+        multiletter = [i for i in candidates if tokens[i] and tokens[i][-1] != " "]
+        chosen = (single_letter or multiletter or candidates)[0]
+        tokens[chosen] += "'"
+    return "".join(tokens)
+
+
+def convert_line(line):
+    line = line.strip()
+    if TABLE_REGEX.match(line) or set(line) == {"-"}:
+        return ""
+    heading = HEADING_REGEX.match(line)
+    if heading:
+        line = heading.group(2)
+    line = LIST_REGEX.sub("", line)
+    line = MAGIC_WORD_REGEX.sub("", line)
+    line = remove_templates(line)
+    #innermost links first, e.g. the links in the caption of an image
+    previous = None
+    while previous != line:
+        previous = line
+        line = INTERNAL_LINK_REGEX.sub(_internal_link, line)
+    line = EXTERNAL_LINK_REGEX.sub(_external_link, line)
+    return remove_quotes(line)
+
+
+def wikitext_to_plain(text):
+    """Converts wikitext (typically a line added by a contributor) to plain text, with the whitespace collapsed."""
+    #what pandoc did when reading the line as html
+    text = COMMENT_REGEX.sub("", text)
+    text = MATH_REGEX.sub("", text)
+    text = TAG_REGEX.sub(_tag, text)
+    text = unescape(text)
+    text = LIEN_REGEX.sub(r"\1", text)
+    #and when reading the result as wikitext (the decoded entities may have produced new tags)
+    text = TAG_REGEX.sub(_tag, MATH_REGEX.sub("", text))
+    text = " ".join(convert_line(line) for line in text.splitlines())
+    return SPACES_REGEX.sub(" ", text).strip()
+
+
+def wikitext_to_plain_batch(lines):
+    """Converts a list of wikitext lines, returning the list of their plain text. Duplicate lines are converted once."""
+    converted = {}
+    plain_list = []
+    for line in lines:
+        if line not in converted:
+            converted[line] = wikitext_to_plain(line)
+        plain_list.append(converted[line])
+    return plain_list
+
+
+def pandoc_to_plain(text):
+    """The former conversion, through pandoc. Raises an exception when pandoc cannot convert the line."""
+    #imported here, so that the native conversion doesn't require pandoc
+    import pypandoc
+    from lxml import html
+    text = pypandoc.convert_text(text, to="plain", format="html").replace("\r\n", " ")
+    text = LIEN_REGEX.sub(r"\1", text)
+    text = pypandoc.convert_text(text, to="html", format="mediawiki").replace("\r\n", " ")
+    return html.document_fromstring(text).text_content()
+
+
+def convert(text, engine="native"):
+    """Converts a line with the given engine ("native" or "pandoc"). Returns None if the line cannot be converted."""
+    if engine == "native":
+        return wikitext_to_plain(text)
+    try:
+        return pandoc_to_plain(text)
+    except Exception:
+        return None
+
+
+def same_text(first, second):
+    """Compares two plain texts, ignoring the whitespace differences (pandoc wraps lines)"""
+    return SPACES_REGEX.sub(" ", first or "").strip() == SPACES_REGEX.sub(" ", second or "").strip()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+    parser = argparse.ArgumentParser(description="Checks the native wikitext conversion")
+    parser.add_argument('--golden', type=str, default=None, help="JSON file of {'wikitext': ..., 'plain': ...} samples")
+    parser.add_argument('--compare', type=str, default=None, help='File of wikitext lines, converted with both pandoc and the native engine')
+    args = parser.parse_args()
+    failures = 0
+    if args.golden:
+        with open(args.golden, "r", encoding="utf-8") as f:
+            samples = json.load(f)
+        for sample in samples:
+            plain = wikitext_to_plain(sample["wikitext"])
+            if not same_text(plain, sample["plain"]):
+                failures += 1
+                print("MISMATCH", repr(sample["wikitext"]), "\n  expected", repr(sample["plain"]), "\n  got     ", repr(plain))
+        print("{ok}/{total} golden samples match".format(ok=len(samples) - failures, total=len(samples)))
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            lines = [line.rstrip("\n") for line in f if line.strip()]
+        start = time.time()
+        native = wikitext_to_plain_batch(lines)
+        native_time = time.time() - start
+        start = time.time()
+        reference = [convert(line, engine="pandoc") for line in lines]
+        pandoc_time = time.time() - start
+        different = 0
+        for line, first, second in zip(lines, native, reference):
+            if not same_text(first, second):
+                different += 1
+                print("DIFF", repr(line), "\n  native", repr(first), "\n  pandoc", repr(second))
+        print("{same}/{total} lines identical, native {native:.3f}s, pandoc {pandoc:.3f}s".format(
+            same=len(lines) - different, total=len(lines), native=native_time, pandoc=pandoc_time))
+    if failures:
+        raise SystemExit(1)